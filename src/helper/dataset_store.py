@@ -0,0 +1,171 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columns that identify or label a match and are not model features.
+feature_cols_to_drop = ["match_api_id", "result_match", "season", "stage", "date", "home_team", "away_team"]
+
+
+class SplitDataset:
+    """
+    Engineered features held once in memory in the layout split_data_for_training slices them.
+
+    Rows are sorted by (season, stage, date) as split_data_for_training sorts them, so every
+    (season, stage) is one contiguous block of rows whose bounds are precomputed. The training
+    rows (the older seasons plus the first stages of the newest one), the validation stage and the
+    test stage are then each a single row range, and split returns views of one C-contiguous
+    float32 feature matrix and of the label vector instead of copies.
+
+    save/load keep every array in its own .npy file, so load can memory-map a saved dataset.
+    source describes the input the dataset was built from and is saved with it, see read_source.
+    """
+
+    array_names = ('features', 'labels', 'group_seasons', 'group_stages', 'group_offsets')
+
+    def __init__(self, feature_names, seasons, features, labels, group_seasons, group_stages, group_offsets,
+                 source=None):
+        self.source = source
+        self.feature_names = list(feature_names)
+        self.seasons = list(seasons)
+        self.features = features
+        self.labels = labels
+        self.group_seasons = group_seasons
+        self.group_stages = group_stages
+        self.group_offsets = group_offsets
+        self.group_index = {
+            (self.seasons[season], int(stage)): i
+            for i, (season, stage) in enumerate(zip(group_seasons, group_stages))
+        }
+
+    @classmethod
+    def from_frame(cls, df_matches, source=None):
+        """
+        Builds the dataset from the engineered features.
+
+        Parameters:
+        - df_matches: DataFrame with the feature_cols_to_drop columns, a numeric (encoded) 'result_match'
+          and numeric feature columns.
+        - source: JSON serializable description of where df_matches was read from.
+
+        Returns:
+        - SplitDataset over all rows of df_matches.
+        """
+        feature_names = [column for column in df_matches.columns if column not in feature_cols_to_drop]
+        not_numeric = [column for column in feature_names + ["result_match"]
+                       if not pd.api.types.is_numeric_dtype(df_matches[column])]
+        if not_numeric:
+            raise ValueError(f"Feature and label columns must be numeric, got {not_numeric}")
+
+        df_matches = df_matches.sort_values(by=["season", "stage", "date"])
+        seasons = sorted(df_matches["season"].unique())
+
+        season_codes = np.searchsorted(np.array(seasons, dtype=object), df_matches["season"].to_numpy())
+        stages = df_matches["stage"].to_numpy(dtype=np.int64)
+        is_group_start = np.r_[True, (season_codes[1:] != season_codes[:-1]) | (stages[1:] != stages[:-1])]
+        group_starts = np.flatnonzero(is_group_start)
+
+        return cls(
+            feature_names,
+            seasons,
+            np.ascontiguousarray(df_matches[feature_names].to_numpy(dtype=np.float32)),
+            df_matches["result_match"].to_numpy(),
+            season_codes[group_starts].astype(np.int32),
+            stages[group_starts],
+            np.append(group_starts, len(df_matches)).astype(np.int64),
+            source=source,
+        )
+
+    def get_rows(self, season, stage):
+        """Row range (start, end) of one (season, stage), empty if it has no matches."""
+        i = self.group_index.get((season, int(stage)))
+        if i is None:
+            return 0, 0
+        return int(self.group_offsets[i]), int(self.group_offsets[i + 1])
+
+    def get_season_rows(self, season, max_stage=None):
+        """Row range of a season, or of its stages below max_stage."""
+        season_code = self.seasons.index(season)
+        groups = np.flatnonzero(self.group_seasons == season_code)
+        if max_stage is not None:
+            groups = groups[self.group_stages[groups] < max_stage]
+        if len(groups) == 0:
+            start = self.group_offsets[np.searchsorted(self.group_seasons, season_code)]
+            return int(start), int(start)
+        return int(self.group_offsets[groups[0]]), int(self.group_offsets[groups[-1] + 1])
+
+    def split(self, N_older_seasons=7, stage=3):
+        """
+        Train, validation and test rows as split_data_for_training selects them.
+
+        Parameters:
+        - N_older_seasons: number of seasons before the newest one in the training set.
+        - stage: test stage of the newest season; the stage before it is the validation set and
+          the earlier stages are added to the training set.
+
+        Returns:
+        - Tuple (X_trn, y_trn, X_val, y_val, X_tst, y_tst) of views of features and labels.
+        """
+        newest_season = self.seasons[-1]
+        older_seasons = self.seasons[:-1][-N_older_seasons:]
+        penultimate_stage = stage - 1
+
+        train_start, train_end = self.get_season_rows(newest_season, penultimate_stage)
+        if older_seasons:
+            train_start = self.get_season_rows(older_seasons[0])[0]
+
+        splits = []
+        for start, end in [
+            (train_start, train_end),
+            self.get_rows(newest_season, penultimate_stage),
+            self.get_rows(newest_season, stage),
+        ]:
+            splits += [self.features[start:end], self.labels[start:end]]
+        return tuple(splits)
+
+    def split_frames(self, N_older_seasons=7, stage=3):
+        """split as DataFrames and Series with the feature names, still sharing the arrays' memory."""
+        splits = self.split(N_older_seasons, stage)
+        frames = []
+        for X, y in zip(splits[::2], splits[1::2]):
+            frames += [pd.DataFrame(X, columns=self.feature_names, copy=False), pd.Series(y, name="result_match", copy=False)]
+        return tuple(frames)
+
+    def save(self, path):
+        """
+        Writes every array to path/<name>.npy and the names and source to path/metadata.json.
+
+        Arrays are written to a temporary file and renamed, so datasets memory-mapped from an older
+        save keep reading their own files. metadata.json is removed first and written last: a save
+        that fails half way leaves no dataset read_source accepts.
+        """
+        os.makedirs(path, exist_ok=True)
+        metadata_path = os.path.join(path, 'metadata.json')
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+        for name in self.array_names:
+            array_path = os.path.join(path, f"{name}.npy")
+            with open(f"{array_path}.tmp", 'wb') as f:
+                np.save(f, getattr(self, name))
+            os.replace(f"{array_path}.tmp", array_path)
+        with open(metadata_path, 'w') as f:
+            json.dump({'feature_names': self.feature_names, 'seasons': self.seasons, 'source': self.source},
+                      f, default=int)
+
+    @staticmethod
+    def read_source(path):
+        """source of the dataset saved under path, None if there is none."""
+        metadata_path = os.path.join(path, 'metadata.json')
+        if not os.path.exists(metadata_path):
+            return None
+        with open(metadata_path) as f:
+            return json.load(f).get('source')
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Loads a dataset written by save, memory-mapping the arrays unless mmap_mode is None."""
+        with open(os.path.join(path, 'metadata.json')) as f:
+            metadata = json.load(f)
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in cls.array_names]
+        return cls(metadata['feature_names'], metadata['seasons'], *arrays, source=metadata.get('source'))
@@ -1,15 +1,29 @@
+import os
+
 import pandas as pd
 
+from src.helper.dataset_store import SplitDataset, feature_cols_to_drop
+from src.loaddata import ColumnarStore
+
+# SplitDataset of every (csv_path, columns) loaded in this process, see get_split_dataset.
+split_datasets = {}
 
-def split_data_for_training(N_older_seasons=7, csv_path="data/engineered/raw_engineered_features.csv", stage=3):
-    import pandas as pd
-    import os
 
+def split_data_for_training(N_older_seasons=7, csv_path="data/engineered/raw_engineered_features.csv", stage=3,
+                            columns=None):
     script_dir = os.path.dirname(__file__)
     repo_root = os.path.abspath(os.path.join(script_dir, "..", ".."))
     full_path = os.path.join(repo_root, csv_path)
 
-    df_matches = pd.read_csv(full_path)
+    if columns is not None:
+        columns = feature_cols_to_drop + [col for col in columns if col not in feature_cols_to_drop]
+
+    if os.path.isdir(full_path):
+        # Columnar dataset written by ColumnarStore: only read the seasons used below.
+        seasons = ColumnarStore.select_training_seasons(ColumnarStore.list_seasons(full_path), N_older_seasons)
+        df_matches = ColumnarStore.read_dataset(full_path, seasons=seasons, columns=columns)
+    else:
+        df_matches = pd.read_csv(full_path, usecols=columns)
 
     df_matches = df_matches.sort_values(by=["season", "stage", "date"])
 
@@ -33,7 +47,6 @@ def split_data_for_training(N_older_seasons=7, csv_path="data/engineered/raw_eng
     df_tst = df_matches[(df_matches["season"] == newest_season) & (df_matches["stage"] == max_stage)].reset_index(
         drop=True)
 
-    feature_cols_to_drop = ["match_api_id", "result_match", "season", "stage", "date", "home_team", "away_team"]
     X_trn = df_train.drop(columns=feature_cols_to_drop)
     y_trn = df_train["result_match"]
 
@@ -43,4 +56,85 @@ def split_data_for_training(N_older_seasons=7, csv_path="data/engineered/raw_eng
     X_tst = df_tst.drop(columns=feature_cols_to_drop)
     y_tst = df_tst["result_match"]
 
-    return X_trn, y_trn, X_val, y_val, X_tst, y_tst
\ No newline at end of file
+    return X_trn, y_trn, X_val, y_val, X_tst, y_tst
+
+
+def get_source(full_path, columns):
+    """
+    Description of the engineered features a SplitDataset is built from.
+
+    Parameters:
+    - full_path: CSV file or ColumnarStore directory.
+    - columns: columns read from it, None for all.
+
+    Returns:
+    - Dict with the path, the columns and the size and latest modification time of its files.
+    """
+    if os.path.isdir(full_path):
+        files = [os.path.join(root, name) for root, _, names in os.walk(full_path) for name in names]
+    else:
+        files = [full_path]
+    stats = [os.stat(file) for file in files]
+    return {
+        'path': full_path,
+        'columns': columns,
+        'mtime_ns': max((stat.st_mtime_ns for stat in stats), default=0),
+        'size': sum(stat.st_size for stat in stats),
+    }
+
+
+def get_split_dataset(csv_path="data/engineered/raw_engineered_features.csv", columns=None, store_path=None):
+    """
+    SplitDataset of the engineered features, loaded once per process.
+
+    A dataset saved under store_path is memory-mapped if it was built from the same csv_path,
+    columns and file contents (size and modification time). Otherwise all seasons are read from
+    csv_path (a CSV file or a ColumnarStore directory) and, if store_path is given, saved there
+    for the next process.
+
+    Parameters:
+    - csv_path: engineered features, relative to the repository root.
+    - columns: feature columns to keep, all if None.
+    - store_path: directory of the saved SplitDataset, relative to the repository root.
+
+    Returns:
+    - SplitDataset shared by every call with the same arguments.
+    """
+    key = (csv_path, None if columns is None else tuple(columns), store_path)
+    if key in split_datasets:
+        return split_datasets[key]
+
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    full_path = os.path.join(repo_root, csv_path)
+    full_store_path = None if store_path is None else os.path.join(repo_root, store_path)
+    if columns is not None:
+        columns = feature_cols_to_drop + [col for col in columns if col not in feature_cols_to_drop]
+    source = get_source(full_path, columns)
+
+    if full_store_path is not None and SplitDataset.read_source(full_store_path) == source:
+        dataset = SplitDataset.load(full_store_path)
+    else:
+        if os.path.isdir(full_path):
+            df_matches = ColumnarStore.read_dataset(full_path, columns=columns)
+        else:
+            df_matches = pd.read_csv(full_path, usecols=columns)
+
+        dataset = SplitDataset.from_frame(df_matches, source=source)
+        if full_store_path is not None:
+            dataset.save(full_store_path)
+
+    split_datasets[key] = dataset
+    return dataset
+
+
+def split_data_from_store(N_older_seasons=7, csv_path="data/engineered/raw_engineered_features.csv", stage=3,
+                          columns=None, store_path=None):
+    """
+    split_data_for_training over the cached SplitDataset of get_split_dataset.
+
+    Returns the same rows and columns as split_data_for_training, with float32 features, as
+    frames sharing the memory of the cached dataset: repeated splits, e.g. for every stage of a
+    walk-forward evaluation, neither read the data again nor copy it. Do not modify them in place.
+    """
+    dataset = get_split_dataset(csv_path, columns, store_path)
+    return dataset.split_frames(N_older_seasons, stage)
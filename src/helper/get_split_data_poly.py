@@ -1,15 +1,29 @@
+import os
+
 import pandas as pd
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import PolynomialFeatures
 
+from src.loaddata import ColumnarStore
+
 
-def split_data_for_training(N_older_seasons=7):
-    import os
+def split_data_for_training(N_older_seasons=7, csv_path=os.path.join('data', 'engineered', 'raw_engineered_features.csv'),
+                            columns=None):
     script_dir = os.path.dirname(__file__)
-    csv_path = os.path.join(script_dir, '..', '..', 'data', 'engineered', 'raw_engineered_features.csv')
-    df_matches = pd.read_csv(csv_path)
+    csv_path = os.path.join(script_dir, '..', '..', csv_path)
+
+    feature_cols_to_drop = ["match_api_id", "result_match", "season", "stage", "date", "home_team", "away_team"]
+    if columns is not None:
+        columns = feature_cols_to_drop + [col for col in columns if col not in feature_cols_to_drop]
+
+    if os.path.isdir(csv_path):
+        # Columnar dataset written by ColumnarStore: only read the seasons used below.
+        seasons = ColumnarStore.select_training_seasons(ColumnarStore.list_seasons(csv_path), N_older_seasons)
+        df_matches = ColumnarStore.read_dataset(csv_path, seasons=seasons, columns=columns)
+    else:
+        df_matches = pd.read_csv(csv_path, usecols=columns)
 
     df_matches = df_matches.sort_values(by=["season", "stage", "date"])
 
@@ -33,7 +47,6 @@ def split_data_for_training(N_older_seasons=7):
     df_tst = df_matches[(df_matches["season"] == newest_season) & (df_matches["stage"] == max_stage)].reset_index(
         drop=True)
 
-    feature_cols_to_drop = ["match_api_id", "result_match", "season", "stage", "date", "home_team", "away_team"]
     X_trn = df_train.drop(columns=feature_cols_to_drop)
     y_trn = df_train["result_match"]
 
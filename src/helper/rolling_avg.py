@@ -1,81 +1,223 @@
+import numpy as np
 import pandas as pd
 
+from src.helper.window_indexer import SegmentWindowIndexer
+
+# Per-team source column -> (home column, away column, rolling mean column, rolling std column).
+rolling_columns = {
+    'goals': ('home_last_team_goal', 'away_last_team_goal', 'rolling_avg_goals', 'rolling_stability_goal'),
+    'goal_conversion_rate': ('goal_conversion_rate_home', 'goal_conversion_rate_away',
+                             'rolling_avg_goals_conversion_rate', 'rolling_stability_goals_conversion_rate'),
+    'last_team_shoton': ('home_last_team_shoton', 'away_last_team_shoton', 'rolling_avg_shoton',
+                         'rolling_stability_shoton'),
+}
+
+# Sources that are only rolled when df has their columns; the others are required.
+optional_sources = ['goal_conversion_rate', 'last_team_shoton']
+
+team_keys = ['team', 'season', 'stage', 'date']
+
+
+def get_sources(df):
+    """
+    Sources of rolling_columns to roll over df: the required ones and the optional ones whose home
+    and away columns are both in df.
+
+    Raises:
+    - KeyError if a column of a required source is missing, or only one side of an optional one.
+    """
+    sources = []
+    for source, (home, away, _, _) in rolling_columns.items():
+        missing = [column for column in [home, away] if column not in df.columns]
+        if source in optional_sources and len(missing) == 2:
+            continue
+        if missing:
+            raise KeyError(f"Missing columns {missing} for the rolling '{source}' statistics")
+        sources.append(source)
+    return sources
+
+
+def get_team_matches(df, sources):
+    """
+    Stacks the home and away rows of df into one frame sorted by team, season, stage and date.
+
+    Returns:
+    - Tuple (team_matches, order): team_matches has a fresh index and order[i] is the row of
+      team_matches[i] in the stacked frame, where row r < len(df) is the home team of df row r and
+      row len(df) + r its away team.
+    """
+    team_matches = pd.DataFrame({
+        'team': np.concatenate([df['home_team'].to_numpy(), df['away_team'].to_numpy()]),
+        'season': np.tile(df['season'].to_numpy(), 2),
+        'stage': np.tile(df['stage'].to_numpy(), 2),
+        'date': np.tile(df['date'].to_numpy(), 2),
+        **{
+            source: np.concatenate([df[rolling_columns[source][0]].to_numpy(), df[rolling_columns[source][1]].to_numpy()])
+            for source in sources
+        }
+    })
+
+    team_matches = team_matches.sort_values(by=team_keys)
+    order = team_matches.index.to_numpy()
+    return team_matches.reset_index(drop=True), order
+
+
+def get_stacked_rows(team_matches, order):
+    """
+    Row of team_matches holding the statistics of every stacked row, the first row of its
+    (team, season, stage, date) as drop_duplicates keeps it.
+    """
+    is_first = ~team_matches.duplicated(subset=team_keys).to_numpy()
+    first_rows = np.maximum.accumulate(np.where(is_first, np.arange(len(team_matches)), 0))
+    stacked_rows = np.empty(len(team_matches), dtype=np.int64)
+    stacked_rows[order] = first_rows
+    return stacked_rows
+
+
+def get_team_starts(team_matches):
+    """Position of the first row of the team of every row of the team-sorted team_matches."""
+    teams = team_matches['team'].to_numpy()
+    is_team_start = np.r_[True, teams[1:] != teams[:-1]][:len(teams)]
+    return np.maximum.accumulate(np.where(is_team_start, np.arange(len(teams)), 0))
+
 
 def calculate_rolling_avg_pandas(df, window=5):
     """
     Calculates the rolling average of goals for each team across the last 'window' matches,
     considering both home and away games.
 
+    Rolling mean and std of every source column of get_sources(df) are computed in one
+    rolling pass over the team-sorted rows, windows stopping at the first row of each team, and
+    written back to the home and away rows by position. A team with
+    several rows on the same (season, stage, date) gets the statistics of the first of them.
+
     Args:
-    df (pd.DataFrame): DataFrame with columns ['home_team', 'away_team', 'home_last_team_goal', 'away_last_team_goal']
+    df (pd.DataFrame): DataFrame with columns ['season', 'stage', 'date', 'home_team', 'away_team',
+        'home_last_team_goal', 'away_last_team_goal'] and optionally the columns of optional_sources.
     window (int): The number of last matches to include in the rolling average.
 
     Returns:
     pd.DataFrame: Original DataFrame with additional rolling average columns.
     """
+    sources = get_sources(df)
+    team_matches, order = get_team_matches(df, sources)
 
-    home_stats = df[['season', 'stage', 'date', 'home_team', 'home_last_team_goal', 'goal_conversion_rate_home',
-                     'home_last_team_shoton']].rename(
-        columns={'home_team': 'team', 'home_last_team_goal': 'goals',
-                 'goal_conversion_rate_home': 'goal_conversion_rate', 'home_last_team_shoton': 'last_team_shoton'}
-    )
-    away_stats = df[['season', 'stage', 'date', 'away_team', 'away_last_team_goal', 'goal_conversion_rate_away',
-                     'away_last_team_shoton']].rename(
-        columns={'away_team': 'team', 'away_last_team_goal': 'goals',
-                 'goal_conversion_rate_away': 'goal_conversion_rate', 'away_last_team_shoton': 'last_team_shoton'}
+    rolling = team_matches[sources].rolling(
+        SegmentWindowIndexer(window_size=window, segment_starts=get_team_starts(team_matches)), min_periods=1
     )
 
-    team_goals = pd.concat([home_stats, away_stats], ignore_index=True)
-
-    team_goals = team_goals.sort_values(by=['team', 'season', 'stage', 'date']).reset_index(drop=True)
-
-    team_goals['rolling_avg_goals'] = team_goals.groupby('team')['goals'].transform(
-        lambda x: x.rolling(window=window, min_periods=1).mean().fillna(0))
-    team_goals['rolling_stability_goal'] = team_goals.groupby('team')['goals'].transform(
-        lambda x: x.rolling(window=window, min_periods=1).std().fillna(0))
-
-    team_goals['rolling_avg_goals_conversion_rate'] = team_goals.groupby('team')['goal_conversion_rate'].transform(
-        lambda x: x.rolling(window=window, min_periods=1).mean().fillna(0))
-    team_goals['rolling_stability_goals_conversion_rate'] = team_goals.groupby('team')[
-        'goal_conversion_rate'].transform(lambda x: x.rolling(window=window, min_periods=1).std().fillna(0))
-
-    team_goals['rolling_avg_shoton'] = team_goals.groupby('team')['last_team_shoton'].transform(
-        lambda x: x.rolling(window=window, min_periods=1).mean().fillna(0))
-    team_goals['rolling_stability_shoton'] = team_goals.groupby('team')['last_team_shoton'].transform(
-        lambda x: x.rolling(window=window, min_periods=1).std().fillna(0))
-
-    team_goals = team_goals.drop_duplicates(subset=['team', 'season', 'stage', 'date'])
-
-    df = df.merge(
-        team_goals[['team', 'season', 'stage', 'date', 'rolling_avg_goals', 'rolling_stability_goal',
-                    'rolling_avg_goals_conversion_rate', 'rolling_stability_goals_conversion_rate',
-                    'rolling_avg_shoton', 'rolling_stability_shoton']],
-        left_on=['home_team', 'season', 'stage', 'date'],
-        right_on=['team', 'season', 'stage', 'date'],
-        how='left'
-    ).rename(columns={
-        'rolling_avg_goals': 'rolling_avg_goals_home',
-        'rolling_stability_goal': 'rolling_stability_goal_home',
-        'rolling_avg_goals_conversion_rate': 'rolling_avg_goals_conversion_rate_home',
-        'rolling_stability_goals_conversion_rate': 'rolling_stability_goals_conversion_rate_home',
-        'rolling_avg_shoton': 'rolling_avg_shoton_home',
-        'rolling_stability_shoton': 'rolling_stability_shoton_home',
-    }).drop(columns=['team'])
-
-    df = df.merge(
-        team_goals[['team', 'season', 'stage', 'date', 'rolling_avg_goals', 'rolling_stability_goal',
-                    'rolling_avg_goals_conversion_rate', 'rolling_stability_goals_conversion_rate',
-                    'rolling_avg_shoton', 'rolling_stability_shoton']],
-        left_on=['away_team', 'season', 'stage', 'date'],
-        right_on=['team', 'season', 'stage', 'date'],
-        how='left'
-    ).rename(columns={
-        'rolling_avg_goals': 'rolling_avg_goals_away',
-        'rolling_stability_goal': 'rolling_stability_goal_away',
-        'rolling_avg_goals_conversion_rate': 'rolling_avg_goals_conversion_rate_away',
-        'rolling_stability_goals_conversion_rate': 'rolling_stability_goals_conversion_rate_away',
-        'rolling_avg_shoton': 'rolling_avg_shoton_away',
-        'rolling_stability_shoton': 'rolling_stability_shoton_away',
-    }).drop(columns=['team'])
+    return write_rolling_stats(df, sources, team_matches, order, rolling.mean().fillna(0), rolling.std().fillna(0))
+
+
+def write_rolling_stats(df, sources, team_matches, order, rolled_mean, rolled_std):
+    """
+    Writes the rolling statistics of the team-sorted rows of get_team_matches back to the home and
+    away rows of df.
+
+    Returns:
+    - df with a fresh index and the mean and std columns of every source.
+    """
+    stacked_rows = get_stacked_rows(team_matches, order)
+
+    n_matches = len(df)
+    df = df.reset_index(drop=True)
+    for side, rows in [('home', stacked_rows[:n_matches]), ('away', stacked_rows[n_matches:])]:
+        for source in sources:
+            _, _, mean_column, std_column = rolling_columns[source]
+            df[f"{mean_column}_{side}"] = rolled_mean[source].to_numpy()[rows]
+            df[f"{std_column}_{side}"] = rolled_std[source].to_numpy()[rows]
 
     return df
+
+
+def calculate_rolling_cube(df, windows=(3, 5, 10, 20)):
+    """
+    Rolling mean and std of calculate_rolling_avg_pandas for several windows at once.
+
+    Per-team prefix sums and counts of the non-missing values are built once, so every window's
+    mean costs O(1) per row and column. A difference of prefix sums of squares loses the variance to
+    cancellation when it is small next to the values, so the std is computed in a second pass over
+    the window's values around that mean, O(window) per row and column. A window of identical values
+    gets a std of exactly 0 as in pandas. Results match calculate_rolling_avg_pandas up to floating
+    point rounding, except on windows whose spread is below about 1e-6 of the values, where pandas'
+    own online updates lose the variance.
+
+    Args:
+    df (pd.DataFrame): same input as calculate_rolling_avg_pandas.
+    windows (iterable of int): window sizes.
+
+    Returns:
+    pd.DataFrame: one row per df row (fresh index). The columns are a MultiIndex (window, column)
+    with the column names of calculate_rolling_avg_pandas, so cube[10] holds the columns that
+    calculate_rolling_avg_pandas(df, window=10) adds.
+    """
+    sources = get_sources(df)
+    team_matches, order = get_team_matches(df, sources)
+    stacked_rows = get_stacked_rows(team_matches, order)
+    team_starts = get_team_starts(team_matches)
+
+    values = team_matches[sources].to_numpy(dtype=np.float64)
+    is_known = ~np.isnan(values)
+    centers = np.array([np.nanmean(column) if is_known[:, i].any() else 0.0 for i, column in enumerate(values.T)])
+    centered = np.where(is_known, values - centers, 0)
+
+    n_rows = len(team_matches)
+    # Prefix sums restart at every team: index i + 1 holds the sum over the team's rows up to row i,
+    # index team_start holds 0 for the rows of that team.
+    prefix_sums = np.zeros((n_rows + 1, len(sources)))
+    if n_rows:
+        prefix_sums[1:] = pd.DataFrame(centered).groupby(team_starts, sort=False).cumsum().to_numpy()
+    prefix_counts = np.zeros((n_rows + 1, len(sources)), dtype=np.int64)
+    prefix_counts[1:] = np.cumsum(is_known, axis=0)
+
+    # For the last known value of the team up to every row, the last earlier known row of the team with
+    # a different value (-1 or a row of an earlier team if none). Missing values do not break a run.
+    positions = np.arange(n_rows)[:, None]
+    last_known = np.maximum.accumulate(np.where(is_known, positions, -1), axis=0)
+    last_known = np.where(last_known >= team_starts[:, None], last_known, -1)
+    previous_known = np.full_like(last_known, -1)
+    previous_known[1:] = np.where(last_known[:-1] >= team_starts[1:, None], last_known[:-1], -1)
+    previous_values = np.take_along_axis(values, np.maximum(previous_known, 0), axis=0)
+    is_break = is_known & ((previous_known < 0) | (values != previous_values))
+    run_breaks = np.maximum.accumulate(np.where(is_break, previous_known, -1), axis=0)
+
+    n_matches = len(df)
+    ends = np.arange(1, n_rows + 1)
+    cube = {}
+    for window in windows:
+        starts = np.maximum(ends - window, team_starts)
+        base = np.where((starts == team_starts)[:, None], 0, 1)
+        counts = prefix_counts[ends] - prefix_counts[starts]
+        sums = prefix_sums[ends] - base * prefix_sums[starts]
+        window_last_known = np.maximum(last_known, 0)
+        is_constant = (last_known >= starts[:, None]) & (
+            np.take_along_axis(run_breaks, window_last_known, axis=0) < starts[:, None]
+        )
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centered_mean = sums / counts
+            mean = np.where(counts > 0, centered_mean + centers, 0)
+
+            # Deviations of the window's values from its mean, (rows, window, sources), 0 outside the
+            # window; the sum of deviations corrects the rounding of the mean (corrected two-pass).
+            window_rows = ends[:, None] - 1 - np.arange(window)
+            in_window = window_rows >= starts[:, None]
+            window_values = centered[np.maximum(window_rows, 0)]
+            deviations = np.where(
+                in_window[:, :, None] & is_known[np.maximum(window_rows, 0)],
+                window_values - centered_mean[:, None, :],
+                0
+            )
+            deviation_sums = deviations.sum(axis=1)
+            variance = ((deviations ** 2).sum(axis=1) - deviation_sums ** 2 / counts) / (counts - 1)
+            std = np.where((counts > 1) & ~is_constant, np.sqrt(np.maximum(variance, 0)), 0)
+
+        for side, rows in [('home', stacked_rows[:n_matches]), ('away', stacked_rows[n_matches:])]:
+            for i, source in enumerate(sources):
+                _, _, mean_column, std_column = rolling_columns[source]
+                cube[(window, f"{mean_column}_{side}")] = mean[rows, i]
+                cube[(window, f"{std_column}_{side}")] = std[rows, i]
+
+    cube = pd.DataFrame(cube, index=pd.RangeIndex(n_matches))
+    cube.columns = cube.columns.set_names(['window', None])
+    return cube
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.helper import get_split_data
+from src.helper.dataset_store import SplitDataset
+from src.helper.get_split_data import get_split_dataset, split_data_for_training, split_data_from_store
+
+
+@pytest.fixture
+def engineered_csv(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = []
+    for season in ['2012/2013', '2013/2014', '2014/2015', '2015/2016']:
+        for stage in range(1, 6):
+            for match in range(3):
+                rows.append({
+                    'match_api_id': len(rows),
+                    'season': season,
+                    'stage': stage,
+                    'date': f"{season[:4]}-08-{stage * 3 + match:02d}",
+                    'home_team': match,
+                    'away_team': match + 10,
+                    'result_match': int(rng.integers(0, 2)),
+                    'home_points': float(rng.integers(0, 30)),
+                    'rolling_avg_goals_home': rng.random(),
+                })
+    df = pd.DataFrame(rows).sample(frac=1, random_state=1)
+    path = tmp_path / 'engineered.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    get_split_data.split_datasets.clear()
+    yield
+    get_split_data.split_datasets.clear()
+
+
+@pytest.mark.parametrize('N_older_seasons, stage', [(7, 3), (2, 5), (1, 2), (0, 4)])
+def test_split_matches_split_data_for_training(engineered_csv, N_older_seasons, stage):
+    expected = split_data_for_training(N_older_seasons, str(engineered_csv), stage)
+    result = split_data_from_store(N_older_seasons, str(engineered_csv), stage)
+
+    for X_expected, X in zip(expected[::2], result[::2]):
+        pd.testing.assert_frame_equal(X, X_expected.astype(np.float32))
+    for y_expected, y in zip(expected[1::2], result[1::2]):
+        pd.testing.assert_series_equal(y, y_expected.reset_index(drop=True))
+
+
+def test_splits_are_views(engineered_csv):
+    dataset = get_split_dataset(str(engineered_csv))
+    X_trn, y_trn, X_val, y_val, X_tst, y_tst = split_data_from_store(2, str(engineered_csv), 4)
+
+    assert dataset.features.dtype == np.float32 and dataset.features.flags['C_CONTIGUOUS']
+    for X, y in [(X_trn, y_trn), (X_val, y_val), (X_tst, y_tst)]:
+        assert np.shares_memory(X.to_numpy(), dataset.features)
+        assert np.shares_memory(y.to_numpy(), dataset.labels)
+
+
+def test_dataset_is_loaded_once(engineered_csv):
+    assert get_split_dataset(str(engineered_csv)) is get_split_dataset(str(engineered_csv))
+
+
+def test_save_load_memory_maps(engineered_csv, tmp_path):
+    store_path = str(tmp_path / 'store')
+    dataset = get_split_dataset(str(engineered_csv), store_path=store_path)
+    loaded = SplitDataset.load(store_path)
+
+    assert isinstance(loaded.features, np.memmap)
+    assert loaded.seasons == dataset.seasons
+    for expected, result in zip(dataset.split(2, 4), loaded.split(2, 4)):
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_store_is_rebuilt_for_other_columns_or_changed_source(engineered_csv, tmp_path):
+    store_path = str(tmp_path / 'store')
+    get_split_dataset(str(engineered_csv), store_path=store_path)
+
+    get_split_data.split_datasets.clear()
+    dataset = get_split_dataset(str(engineered_csv), columns=['home_points'], store_path=store_path)
+    assert dataset.feature_names == ['home_points']
+
+    get_split_data.split_datasets.clear()
+    get_split_dataset(str(engineered_csv), store_path=store_path)
+    get_split_data.split_datasets.clear()
+    df = pd.read_csv(engineered_csv)
+    df.assign(home_points=df['home_points'] + 1).to_csv(engineered_csv, index=False)
+    os.utime(engineered_csv, ns=(0, 0))
+    dataset = get_split_dataset(str(engineered_csv), store_path=store_path)
+    expected = split_data_for_training(7, str(engineered_csv), 3)
+    pd.testing.assert_frame_equal(dataset.split_frames(7, 3)[0], expected[0].astype(np.float32))
+
+    get_split_data.split_datasets.clear()
+    assert isinstance(get_split_dataset(str(engineered_csv), store_path=store_path).features, np.memmap)
+
+
+def test_rejects_non_numeric_features(engineered_csv):
+    df = pd.read_csv(engineered_csv).assign(form_home='WWDLW')
+    with pytest.raises(ValueError):
+        SplitDataset.from_frame(df)
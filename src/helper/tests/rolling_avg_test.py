@@ -1,7 +1,8 @@
+import numpy as np
 import pandas as pd
 import pytest
 
-from src.helper.rolling_avg import calculate_rolling_avg_pandas
+from src.helper.rolling_avg import calculate_rolling_avg_pandas, calculate_rolling_cube, rolling_columns
 
 
 @pytest.fixture
@@ -80,3 +81,83 @@ def test_missing_team_data():
     assert df['rolling_avg_goals_home'].notnull().all()
     assert df['rolling_avg_goals_away'].notnull().all()
 
+
+def test_rolling_stats_match_per_team_rolling(sample_data):
+    """Test all mean/std columns against a per-team rolling window over home and away matches."""
+    sample_data['goal_conversion_rate_home'] = [0.5, 0.2, 0.3, 0.1, 0.4, 0.6, 0.2, 0.3]
+    sample_data['goal_conversion_rate_away'] = [0.1, 0.3, 0.2, 0.5, 0.3, 0.2, 0.4, 0.1]
+    sample_data['home_last_team_shoton'] = [5, 3, 7, 4, 6, 2, 8, 5]
+    sample_data['away_last_team_shoton'] = [4, 6, 2, 5, 3, 7, 4, 6]
+
+    df = calculate_rolling_avg_pandas(sample_data, window=3)
+
+    home = sample_data[['season', 'stage', 'date', 'home_team', 'home_last_team_shoton']].set_axis(
+        ['season', 'stage', 'date', 'team', 'shoton'], axis=1)
+    away = sample_data[['season', 'stage', 'date', 'away_team', 'away_last_team_shoton']].set_axis(
+        ['season', 'stage', 'date', 'team', 'shoton'], axis=1)
+    team_matches = pd.concat([home, away], ignore_index=True).sort_values(['team', 'season', 'stage', 'date'])
+    rolling = team_matches.groupby('team')['shoton'].rolling(window=3, min_periods=1)
+    team_matches['mean'] = rolling.mean().reset_index(level=0, drop=True)
+    team_matches['std'] = rolling.std().reset_index(level=0, drop=True).fillna(0)
+    team_matches = team_matches.sort_index()
+
+    pd.testing.assert_series_equal(
+        df['rolling_avg_shoton_home'], team_matches['mean'].iloc[:8], check_names=False, check_index=False)
+    pd.testing.assert_series_equal(
+        df['rolling_stability_shoton_away'], team_matches['std'].iloc[8:].reset_index(drop=True), check_names=False)
+    assert [c for c in df.columns if c.startswith('rolling')] == [
+        f"{column}_{side}" for side in ['home', 'away'] for column in [
+            'rolling_avg_goals', 'rolling_stability_goal',
+            'rolling_avg_goals_conversion_rate', 'rolling_stability_goals_conversion_rate',
+            'rolling_avg_shoton', 'rolling_stability_shoton'
+        ]
+    ]
+
+
+def test_missing_required_columns_raise(sample_data):
+    """Test that missing goal columns, or one side of an optional source, raise instead of being skipped."""
+    with pytest.raises(KeyError):
+        calculate_rolling_avg_pandas(sample_data.drop(columns=['away_last_team_goal']), window=3)
+
+    with pytest.raises(KeyError):
+        calculate_rolling_cube(sample_data.assign(home_last_team_shoton=1), windows=(3,))
+
+    df = calculate_rolling_avg_pandas(sample_data, window=3)
+    assert 'rolling_avg_shoton_home' not in df.columns
+
+
+def random_matches(seed, n_matches=300, n_teams=8):
+    """
+    Matches where each team's values sit a few multiples of 1/30 above its own multiple of 1e3, so
+    values repeat, with missing values.
+    """
+    rng = np.random.default_rng(seed)
+    home_team = rng.integers(0, n_teams, n_matches)
+    df = pd.DataFrame({
+        'season': np.repeat([2014, 2015, 2016], n_matches // 3),
+        'stage': np.tile(np.arange(n_matches // 3) // 4 + 1, 3),
+        'date': pd.Timestamp('2014-08-01') + pd.to_timedelta(np.arange(n_matches), unit='D'),
+        'home_team': home_team,
+        'away_team': (home_team + rng.integers(1, n_teams, n_matches)) % n_teams,
+    })
+    levels = 1e3 * rng.integers(1, 10, n_teams)
+    for home, away, _, _ in rolling_columns.values():
+        for column, teams in [(home, df['home_team']), (away, df['away_team'])]:
+            values = levels[teams] + rng.integers(0, 6, n_matches) / 30
+            values[rng.random(n_matches) < 0.1] = np.nan
+            df[column] = values
+    return df
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_rolling_cube_matches_pandas_large_values(seed):
+    """Test the cube against calculate_rolling_avg_pandas where a sum of squares would cancel."""
+    df = random_matches(seed)
+    windows = (1, 2, 3, 5, 10)
+    cube = calculate_rolling_cube(df, windows=windows)
+
+    assert list(cube.columns.levels[0]) == list(windows)
+
+    for window in windows:
+        expected = calculate_rolling_avg_pandas(df, window=window)
+        pd.testing.assert_frame_equal(cube[window], expected[cube[window].columns], rtol=1e-7)
@@ -0,0 +1,14 @@
+import numpy as np
+from pandas.api.indexers import BaseIndexer
+
+
+class SegmentWindowIndexer(BaseIndexer):
+    """
+    Trailing rolling window of window_size rows that does not reach back past the start of the
+    row's segment (segment_starts[i] is the first row of the segment of row i).
+    """
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.segment_starts).astype(np.int64)
+        return start, end
@@ -0,0 +1,165 @@
+import glob
+import os
+
+import pandas as pd
+
+ID_COLUMNS = ['id', 'match_api_id', 'home_team', 'away_team', 'player_api_id', 'player_fifa_api_id']
+LINEUP_COLUMNS = [f"{team}_player_{i}" for team in ['home', 'away'] for i in range(1, 12)]
+DATE_COLUMNS = ['date']
+PARTITION_COLUMN = 'season'
+
+FILE_FORMATS = ('parquet', 'feather', 'csv')
+
+
+def apply_schema(df):
+    """
+    Casts a raw or engineered dataset to the explicit storage schema.
+
+    - ids ('match_api_id', 'home_team', ...) -> int32, nullable Int32 if an id is missing
+    - lineup slots ('home_player_1', ...), which can be missing -> nullable Int32
+    - 'date' -> datetime64
+    - other 64-bit integer columns -> int32, float columns -> float32, smaller types are kept
+
+    Parameters:
+    - df: DataFrame to cast. Columns not covered by the rules above are left unchanged.
+
+    Returns:
+    - The cast DataFrame.
+    """
+    dtypes = {}
+    for column in df.columns:
+        dtype = df[column].dtype
+        if column in DATE_COLUMNS:
+            continue
+        elif column in ID_COLUMNS:
+            dtypes[column] = 'Int32' if df[column].isna().any() else 'int32'
+        elif column in LINEUP_COLUMNS:
+            dtypes[column] = 'Int32'
+        elif pd.api.types.is_bool_dtype(dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(dtype) and dtype.itemsize > 4:
+            dtypes[column] = 'Int32' if df[column].isna().any() else 'int32'
+        elif pd.api.types.is_float_dtype(dtype):
+            dtypes[column] = 'float32'
+
+    df = df.astype(dtypes)
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column])
+
+    return df
+
+
+def partition_name(season):
+    """Directory name of a season partition, e.g. '2015/2016' -> 'season=2015_2016'."""
+    return f"{PARTITION_COLUMN}={str(season).replace('/', '_')}"
+
+
+def list_seasons(path):
+    """Seasons stored in a partitioned dataset directory, sorted."""
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(
+        name[len(prefix):].replace('_', '/')
+        for name in os.listdir(path)
+        if name.startswith(prefix) and os.path.isdir(os.path.join(path, name))
+    )
+
+
+def write_dataset(df, path, file_format='parquet', part=0, partition_col=PARTITION_COLUMN):
+    """
+    Writes a dataset in a columnar format, one directory per season.
+
+    The layout is path/season=2015_2016/part-00000.parquet. The season column is kept inside the
+    files as well. Part 0 replaces any parts already stored under path, later part numbers
+    append to the dataset. With file_format='csv' the frame is written to the single CSV file
+    path instead, appended for part > 0.
+
+    Parameters:
+    - df: DataFrame to write.
+    - path: dataset directory, or the CSV file for file_format='csv'.
+    - file_format: 'parquet', 'feather' or 'csv'.
+    - part: number of this part within every partition.
+    - partition_col: column to partition by, None writes a single partition.
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"file_format must be one of {FILE_FORMATS}")
+
+    if file_format == 'csv':
+        df.to_csv(path, index=False, mode='w' if part == 0 else 'a', header=part == 0)
+        return
+
+    if part == 0:
+        for file_path in glob.glob(os.path.join(path, '**', 'part-*'), recursive=True):
+            os.remove(file_path)
+
+    df = apply_schema(df)
+    if partition_col is None:
+        partitions = [('', df)]
+    else:
+        partitions = [(partition_name(season), group) for season, group in df.groupby(partition_col, sort=True)]
+
+    for name, partition in partitions:
+        partition_dir = os.path.join(path, name)
+        os.makedirs(partition_dir, exist_ok=True)
+        file_path = os.path.join(partition_dir, f"part-{part:05d}.{file_format}")
+        partition = partition.reset_index(drop=True)
+
+        if file_format == 'parquet':
+            partition.to_parquet(file_path, index=False)
+        else:
+            partition.to_feather(file_path)
+
+
+def next_part(path):
+    """Part number for the next write_dataset call that appends to the dataset at path."""
+    parts = [
+        int(os.path.basename(file_path).split('.')[0][len('part-'):])
+        for file_path in glob.glob(os.path.join(path, '**', 'part-*'), recursive=True)
+    ]
+    return max(parts) + 1 if parts else 0
+
+
+def read_dataset(path, seasons=None, columns=None):
+    """
+    Reads a dataset written by write_dataset, or a CSV file.
+
+    Only the partitions of the requested seasons and only the requested columns are read.
+    CSV files are read whole, filtered afterwards and returned with the types read_csv infers.
+
+    Parameters:
+    - path: dataset directory or CSV file.
+    - seasons: seasons to read, None reads all.
+    - columns: columns to read, None reads all.
+
+    Returns:
+    - DataFrame with the stored schema.
+    """
+    if os.path.isfile(path):
+        df = pd.read_csv(path, usecols=columns)
+        if seasons is not None:
+            df = df[df[PARTITION_COLUMN].isin(seasons)].reset_index(drop=True)
+        return df
+
+    if seasons is None:
+        partition_dirs = [os.path.join(path, partition_name(season)) for season in list_seasons(path)] or [path]
+    else:
+        partition_dirs = [os.path.join(path, partition_name(season)) for season in seasons]
+
+    frames = []
+    for partition_dir in partition_dirs:
+        for file_path in sorted(glob.glob(os.path.join(partition_dir, 'part-*'))):
+            if file_path.endswith('.parquet'):
+                frames.append(pd.read_parquet(file_path, columns=columns))
+            else:
+                frames.append(pd.read_feather(file_path, columns=columns))
+
+    if not frames:
+        return pd.DataFrame(columns=columns if columns is not None else [])
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def select_training_seasons(seasons, n_older_seasons):
+    """The newest season plus the n_older_seasons before it, as picked by split_data_for_training."""
+    seasons = sorted(seasons)
+    return seasons[:-1][-n_older_seasons:] + seasons[-1:]
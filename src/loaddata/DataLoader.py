@@ -1,104 +1,519 @@
+import json
 import os
 import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote, unquote
+
 import pandas as pd
+import ColumnarStore
 import XmlProcessor
 
-SQL_QUERY_MATCH = "SELECT m.match_api_id," \
-                  " season," \
-                  " stage," \
-                  " m.date," \
-                  " AT.team_api_id AS away_team," \
-                  " HT.team_api_id AS home_team," \
-                  " home_team_goal," \
-                  " away_team_goal," \
-                  " m.possession," \
-                  " m.shoton," \
-                  " CASE" \
-                  " WHEN m.home_team_goal > m.away_team_goal THEN 'H'" \
-                  " WHEN m.home_team_goal < m.away_team_goal THEN 'A'" \
-                  " WHEN m.home_team_goal = m.away_team_goal THEN 'D'" \
-                  " END AS result_match," \
-                  " CAST(H1.player_api_id as INT) as home_player_1," \
-                  " CAST(H2.player_api_id as INT) as home_player_2," \
-                  " CAST(H3.player_api_id as INT) as home_player_3," \
-                  " CAST(H4.player_api_id as INT) as home_player_4," \
-                  " CAST(H5.player_api_id as INT) as home_player_5," \
-                  " CAST(H6.player_api_id as INT) as home_player_6," \
-                  " CAST(H7.player_api_id as INT) as home_player_7," \
-                  " CAST(H8.player_api_id as INT) as home_player_8," \
-                  " CAST(H9.player_api_id as INT) as home_player_9," \
-                  " CAST(H10.player_api_id as INT) as home_player_10," \
-                  " CAST(H11.player_api_id as INT) as home_player_11," \
-                  " CAST(A1.player_api_id as INT) as away_player_1," \
-                  " CAST(A2.player_api_id as INT) as away_player_2," \
-                  " CAST(A3.player_api_id as INT) as away_player_3," \
-                  " CAST(A4.player_api_id as INT) as away_player_4," \
-                  " CAST(A5.player_api_id as INT) as away_player_5," \
-                  " CAST(A6.player_api_id as INT) as away_player_6," \
-                  " CAST(A7.player_api_id as INT) as away_player_7," \
-                  " CAST(A8.player_api_id as INT) as away_player_8," \
-                  " CAST(A9.player_api_id as INT) as away_player_9," \
-                  " CAST(A10.player_api_id as INT) as away_player_10," \
-                  " CAST(A11.player_api_id as INT) as away_player_11" \
-                  " FROM Match as m" \
-                  " JOIN League on League.id = m.league_id" \
-                  " LEFT JOIN Team AS HT on HT.team_api_id = m.home_team_api_id" \
-                  " LEFT JOIN Team AS AT on AT.team_api_id = m.away_team_api_id" \
-                  " LEFT JOIN Player AS H1 on H1.player_api_id = m.home_player_6" \
-                  " LEFT JOIN Player AS H2 on H2.player_api_id = m.home_player_6" \
-                  " LEFT JOIN Player AS H3 on H3.player_api_id = m.home_player_6" \
-                  " LEFT JOIN Player AS H4 on H4.player_api_id = m.home_player_6" \
-                  " LEFT JOIN Player AS H5 on H5.player_api_id = m.home_player_6" \
-                  " LEFT JOIN Player AS H6 on H6.player_api_id = m.home_player_6" \
-                  " LEFT JOIN Player AS H7 on H7.player_api_id = m.home_player_7" \
-                  " LEFT JOIN Player AS H8 on H8.player_api_id = m.home_player_8" \
-                  " LEFT JOIN Player AS H9 on H9.player_api_id = m.home_player_9" \
-                  " LEFT JOIN Player AS H10 on H10.player_api_id = m.home_player_10" \
-                  " LEFT JOIN Player AS H11 on H11.player_api_id = m.home_player_11" \
-                  " LEFT JOIN Player AS A1 on A1.player_api_id = m.away_player_6" \
-                  " LEFT JOIN Player AS A2 on A2.player_api_id = m.away_player_6" \
-                  " LEFT JOIN Player AS A3 on A3.player_api_id = m.away_player_6" \
-                  " LEFT JOIN Player AS A4 on A4.player_api_id = m.away_player_6" \
-                  " LEFT JOIN Player AS A5 on A5.player_api_id = m.away_player_6" \
-                  " LEFT JOIN Player AS A6 on A6.player_api_id = m.away_player_6" \
-                  " LEFT JOIN Player AS A7 on A7.player_api_id = m.away_player_7" \
-                  " LEFT JOIN Player AS A8 on A8.player_api_id = m.away_player_8" \
-                  " LEFT JOIN Player AS A9 on A9.player_api_id = m.away_player_9" \
-                  " LEFT JOIN Player AS A10 on A10.player_api_id = m.away_player_10" \
-                  " LEFT JOIN Player AS A11 on A11.player_api_id = m.away_player_11" \
-                  " WHERE League.name = 'England Premier League' " \
-                  " AND m.possession IS NOT NULL" \
-                  " ORDER by date"
-SQL_QUERY_PLAYERS = f"SELECT * FROM Player_Attributes"
+DEFAULT_LEAGUE = 'England Premier League'
+LEAGUE_PARTITION_PREFIX = 'league='
+
+# The league is the first query parameter of the match and lineup queries.
+SQL_SELECT_MATCH = "SELECT m.match_api_id," \
+                   " season," \
+                   " stage," \
+                   " m.date," \
+                   " AT.team_api_id AS away_team," \
+                   " HT.team_api_id AS home_team," \
+                   " home_team_goal," \
+                   " away_team_goal," \
+                   " m.possession," \
+                   " m.shoton," \
+                   " CASE" \
+                   " WHEN m.home_team_goal > m.away_team_goal THEN 'H'" \
+                   " WHEN m.home_team_goal < m.away_team_goal THEN 'A'" \
+                   " WHEN m.home_team_goal = m.away_team_goal THEN 'D'" \
+                   " END AS result_match" \
+                   " FROM Match as m" \
+                   " JOIN League on League.id = m.league_id" \
+                   " LEFT JOIN Team AS HT on HT.team_api_id = m.home_team_api_id" \
+                   " LEFT JOIN Team AS AT on AT.team_api_id = m.away_team_api_id" \
+                   " WHERE League.name = ?" \
+                   " AND m.possession IS NOT NULL"
+SQL_QUERY_MATCH = SQL_SELECT_MATCH + " ORDER by date"
+# Matches from the watermark date on, for incremental updates.
+SQL_QUERY_MATCH_SINCE = SQL_SELECT_MATCH + " AND m.date >= ? ORDER by date"
+
+LINEUP_SLOTS = [(team, i) for team in ['home', 'away'] for i in range(1, 12)]
+LINEUP_COLUMNS = [f"{team}_player_{i}" for team, i in LINEUP_SLOTS]
+
+# The lineup slots of the same matches, read in one scan of Match and unpivoted by unpivot_lineups.
+SQL_SELECT_LINEUP = "SELECT m.match_api_id, m.date, " + \
+                    ", ".join(f"CAST(m.{column} as INT) as {column}" for column in LINEUP_COLUMNS) + \
+                    " FROM Match as m" \
+                    " JOIN League on League.id = m.league_id" \
+                    " WHERE League.name = ?" \
+                    " AND m.possession IS NOT NULL"
+SQL_QUERY_LINEUP = SQL_SELECT_LINEUP + " ORDER by date"
+SQL_QUERY_LINEUP_SINCE = SQL_SELECT_LINEUP + " AND m.date >= ? ORDER by date"
+SQL_QUERY_PLAYER_IDS = "SELECT player_api_id FROM Player"
+SQL_QUERY_LEAGUES = "SELECT DISTINCT League.name" \
+                    " FROM Match as m" \
+                    " JOIN League on League.id = m.league_id" \
+                    " WHERE m.possession IS NOT NULL" \
+                    " ORDER BY League.name"
+
+# Only the attributes player_stats uses, only for players in the selected lineups
+# (temp.lineup_players, filled by create_lineup_players_table) and only snapshots
+# taken before the last selected match.
+SQL_QUERY_PLAYERS = "SELECT pa.player_api_id," \
+                    " pa.date," \
+                    " pa.overall_rating," \
+                    " pa.acceleration," \
+                    " pa.strength," \
+                    " pa.aggression" \
+                    " FROM Player_Attributes AS pa" \
+                    " JOIN temp.lineup_players AS lp ON lp.player_api_id = pa.player_api_id" \
+                    " WHERE pa.date < ?" \
+                    " ORDER BY pa.player_api_id, pa.date"
+
+SQL_CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_match_league_date ON Match (league_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_team_team_api_id ON Team (team_api_id)",
+    "CREATE INDEX IF NOT EXISTS idx_player_player_api_id ON Player (player_api_id)",
+    "CREATE INDEX IF NOT EXISTS idx_player_attributes_player_date ON Player_Attributes (player_api_id, date)",
+]
+
+# Lineup slots can be NULL, so they are read as floats; fixing the dtype keeps
+# batches read with read_chunksize consistent with a whole-table read.
+LINEUP_DTYPES = {column: 'float64' for column in LINEUP_COLUMNS}
+
+# Ratings are 0-100 and can be NULL.
+PLAYER_ATTR_DTYPES = {
+    'player_api_id': 'int32',
+    'overall_rating': 'UInt8',
+    'acceleration': 'UInt8',
+    'strength': 'UInt8',
+    'aggression': 'UInt8',
+}
 
 PATH_DB = "../../data/database.sqlite"
+RAW_DIR = "../../data/raw"
 CSV_PATH_MATCH = "../../data/raw/match_details.csv"
 CSV_PATH_PLAYER_ATTR = "../../data/raw/player_attributes.csv"
+CSV_PATH_LINEUP = "../../data/raw/match_lineups.csv"
+WATERMARK_PATH_MATCH = "../../data/raw/match_details_watermark.json"
 
 
-def table_to_csv(db_path, csv_path, query):
-    """Read a table from an SQLite database and save it to a CSV file."""
+def create_indexes(db_path):
+    """Create the indexes on the join keys of the loader queries if they do not exist yet."""
     conn = sqlite3.connect(db_path)
-    df = pd.read_sql(query, conn)
+    for statement in SQL_CREATE_INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def create_lineup_players_table(conn, lineup_query=SQL_QUERY_LINEUP, league=DEFAULT_LEAGUE):
+    """
+    Fill temp.lineup_players with the ids of all players in the lineups of league selected by lineup_query.
+
+    Returns:
+    - Date of the last selected match, the upper bound for the player attribute query.
+    """
+    df = pd.read_sql(lineup_query, conn, params=(league,), dtype=LINEUP_DTYPES)
+    player_ids = unpivot_lineups(df)['player_api_id'].dropna().unique()
+
+    conn.execute("DROP TABLE IF EXISTS temp.lineup_players")
+    conn.execute("CREATE TEMP TABLE lineup_players (player_api_id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO temp.lineup_players VALUES (?)", [(int(player_id),) for player_id in player_ids])
+
+    return df['date'].max()
+
+
+def unpivot_lineups(df, player_ids=None):
+    """
+    Turn the wide lineup slots of a batch of matches into the long lineup table.
+
+    Parameters:
+    - df: DataFrame with 'match_api_id' and the home_player_1 ... away_player_11 columns.
+    - player_ids: ids present in the Player table. Other ids are set to NaN, as a LEFT JOIN
+      on Player would do. None keeps every id.
+
+    Returns:
+    - DataFrame with columns (match_api_id, side, slot, player_api_id), 22 rows per match
+      ordered by match, side and slot. Empty slots have a NaN player_api_id.
+    """
+    n_matches = len(df)
+    player_api_id = df[LINEUP_COLUMNS].to_numpy(dtype='float64').ravel()
+
+    if player_ids is not None:
+        player_api_id[~pd.Series(player_api_id).isin(player_ids).to_numpy()] = float('nan')
+
+    return pd.DataFrame({
+        'match_api_id': df['match_api_id'].to_numpy().repeat(len(LINEUP_SLOTS)),
+        'side': [team for team, _ in LINEUP_SLOTS] * n_matches,
+        'slot': [i for _, i in LINEUP_SLOTS] * n_matches,
+        'player_api_id': player_api_id,
+    })
+
+
+def split_off_last_date(df):
+    """Split a date-ordered batch into the rows before its last date and the rows on it."""
+    is_last_date = df['date'] == df['date'].iloc[-1]
+    return df[~is_last_date].copy(), df[is_last_date].copy()
+
+
+def process_match_batches(batches, xml_processor, n_workers=1, chunk_size=5000, state=None):
+    """
+    Add the XML columns to date-ordered batches of matches, yielding each processed batch.
+
+    The rows of the last date in a batch are held back and prepended to the next batch, so one
+    date is never split across batches. The last match of every team is carried forward as
+    team state, so the previous match lookup also works across batch boundaries.
+
+    If a state dict is given, its 'team_state' entry is used as the starting team state and is
+    kept up to date while the batches are consumed.
+    """
+    state = {} if state is None else state
+    team_state = state.get('team_state')
+    pending = None
+
+    for batch in batches:
+        if pending is not None:
+            batch = pd.concat([pending, batch], ignore_index=True)
+        if batch.empty:
+            continue
 
+        ready, pending = split_off_last_date(batch)
+        if not ready.empty:
+            ready, team_state = xml_processor.process_chunk(ready, team_state, n_workers, chunk_size)
+            state['team_state'] = team_state
+            yield ready
 
-    if not os.path.exists('../../data/raw'):
-        os.makedirs('../../data/raw')
+    if pending is not None and not pending.empty:
+        pending, state['team_state'] = xml_processor.process_chunk(pending, team_state, n_workers, chunk_size)
+        yield pending
 
 
+def table_to_csv(db_path, csv_path, query, xml_backend='etree', n_workers=1, chunk_size=5000, read_chunksize=None,
+                 dtype=None, output_format='csv', watermark_path=None, league=DEFAULT_LEAGUE):
+    """
+    Read a table of one league from an SQLite database and save it to a CSV file.
+
+    For the match table, n_workers > 1 parses the XML columns in a process pool,
+    chunk_size matches per task.
+
+    With read_chunksize set, the query result is read, processed and appended to the CSV
+    read_chunksize rows at a time, so memory is bounded by the batch and not by the table.
+    The match query must then be ordered by date. Column types are inferred per batch,
+    so nullable integer columns should be fixed through dtype.
+
+    output_format 'parquet' or 'feather' writes a typed columnar dataset to the csv_path
+    directory without its extension instead, partitioned by season when the table has one.
+
+    With watermark_path set, the watermark and team state of the match table are saved there,
+    so update_match_table can continue from this build.
+
+    Returns:
+    - Tuple (rows_read, rows_written): rows returned by the query and rows written to the output.
+    """
+    conn = sqlite3.connect(db_path)
+
+    output_dir = os.path.dirname(get_output_path(csv_path, output_format))
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    params = (league,)
+    if 'player_attributes' in csv_path:
+        params = (create_lineup_players_table(conn, league=league),)
+
+    if read_chunksize is None:
+        batches = [pd.read_sql(query, conn, params=params, dtype=dtype)]
+    else:
+        batches = pd.read_sql(query, conn, params=params, chunksize=read_chunksize, dtype=dtype)
+
+    counts = {'read': 0, 'written': 0}
+    batches = count_rows(batches, counts)
+
+    state = {}
     if 'match_details' in csv_path:
-        xml_processor = XmlProcessor.XmlProcessor()
-        df = xml_processor.process_data(df)
+        xml_processor = XmlProcessor.XmlProcessor(backend=xml_backend)
+        batches = process_match_batches(batches, xml_processor, n_workers, chunk_size, state)
+    elif 'match_lineups' in csv_path:
+        player_ids = pd.read_sql(SQL_QUERY_PLAYER_IDS, conn)['player_api_id']
+        batches = (unpivot_lineups(df, player_ids) for df in batches)
+
+    watermark = None
+    for part, df in enumerate(batches):
+        write_output(df, csv_path, output_format, part)
+        counts['written'] += len(df)
+        if watermark_path is not None:
+            watermark = advance_watermark(watermark, df)
+
+    if watermark is not None:
+        save_watermark(watermark_path, watermark, state['team_state'])
+
+    conn.close()
+    return counts['read'], counts['written']
+
+
+def count_rows(batches, counts):
+    """Pass the batches through, adding their row count to counts['read']."""
+    for df in batches:
+        counts['read'] += len(df)
+        yield df
+
+
+def get_output_path(csv_path, output_format):
+    """The CSV file itself, or the dataset directory next to it for columnar formats."""
+    return csv_path if output_format == 'csv' else os.path.splitext(csv_path)[0]
+
+
+def write_output(df, csv_path, output_format, part):
+    """Write one processed batch as part number part of the output."""
+    partition_col = ColumnarStore.PARTITION_COLUMN if ColumnarStore.PARTITION_COLUMN in df.columns else None
+    ColumnarStore.write_dataset(df, get_output_path(csv_path, output_format), output_format, part=part,
+                                partition_col=partition_col)
+
+
+def read_output(csv_path, output_format):
+    """Read back everything written by write_output."""
+    output_path = get_output_path(csv_path, output_format)
+    if output_format == 'csv':
+        return pd.read_csv(output_path)
+    return ColumnarStore.read_dataset(output_path)
+
+
+def advance_watermark(watermark, df):
+    """
+    Move the watermark past a processed batch of matches.
+
+    The watermark holds the latest processed date and the ids of the matches processed on that
+    date, so matches added later for the same date are still picked up by an update.
+    """
+    if df.empty:
+        return watermark
 
+    last_date = df['date'].max()
+    last_ids = df.loc[df['date'] == last_date, 'match_api_id'].tolist()
 
-    df.to_csv(csv_path, index=False)
+    if watermark is not None and watermark['date'] == last_date:
+        last_ids = watermark['match_api_ids'] + last_ids
+    elif watermark is not None and watermark['date'] > last_date:
+        return watermark
 
+    return {'date': last_date, 'match_api_ids': [int(match_id) for match_id in last_ids]}
+
+
+def save_watermark(watermark_path, watermark, team_state):
+    """Store the watermark together with the team state needed to process newer matches."""
+    with open(watermark_path, 'w') as f:
+        json.dump({**watermark, 'team_state': json.loads(team_state.to_json(orient='records'))}, f)
+
+
+def load_watermark(watermark_path):
+    """Return (watermark, team_state) saved by save_watermark, or (None, None) if there is none."""
+    if not os.path.exists(watermark_path):
+        return None, None
+
+    with open(watermark_path) as f:
+        saved = json.load(f)
+
+    team_state = pd.DataFrame(saved.pop('team_state'), columns=XmlProcessor.team_state_columns)
+    return saved, team_state
+
+
+def update_match_table(db_path=PATH_DB, csv_path=CSV_PATH_MATCH, watermark_path=WATERMARK_PATH_MATCH,
+                       xml_backend='etree', output_format='csv', lineup_path=None, league=DEFAULT_LEAGUE):
+    """
+    Process only the matches added since the last run and append them to the stored dataset.
+
+    The SQL query only returns matches from the watermark date on. Their XML columns are computed
+    from the saved team state, which holds the last known match of every team. Without a saved
+    watermark the whole table is built instead. With lineup_path set, the lineup table is
+    kept in step with the match table.
+
+    Returns:
+    - Number of matches added.
+    """
+    watermark, team_state = load_watermark(watermark_path)
+    if watermark is None:
+        table_to_csv(db_path, csv_path, SQL_QUERY_MATCH, xml_backend=xml_backend,
+                     output_format=output_format, watermark_path=watermark_path, league=league)
+        if lineup_path is not None:
+            table_to_csv(db_path, lineup_path, SQL_QUERY_LINEUP, dtype=LINEUP_DTYPES, output_format=output_format,
+                         league=league)
+        return len(read_output(csv_path, output_format))
+
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql(SQL_QUERY_MATCH_SINCE, conn, params=(league, watermark['date']))
+    df = df[~df['match_api_id'].isin(watermark['match_api_ids'])].reset_index(drop=True)
+
+    if not df.empty and lineup_path is not None:
+        df_lineup = pd.read_sql(SQL_QUERY_LINEUP_SINCE, conn, params=(league, watermark['date']), dtype=LINEUP_DTYPES)
+        df_lineup = df_lineup[df_lineup['match_api_id'].isin(df['match_api_id'])]
+        player_ids = pd.read_sql(SQL_QUERY_PLAYER_IDS, conn)['player_api_id']
+        part = 1 if output_format == 'csv' else ColumnarStore.next_part(get_output_path(lineup_path, output_format))
+        write_output(unpivot_lineups(df_lineup, player_ids), lineup_path, output_format, part)
     conn.close()
 
+    if df.empty:
+        return 0
+
+    xml_processor = XmlProcessor.XmlProcessor(backend=xml_backend)
+    df, team_state = xml_processor.process_chunk(df, team_state)
+
+    output_path = get_output_path(csv_path, output_format)
+    part = 1 if output_format == 'csv' else ColumnarStore.next_part(output_path)
+    write_output(df, csv_path, output_format, part)
+    save_watermark(watermark_path, advance_watermark(watermark, df), team_state)
+
+    return len(df)
+
+
+def verify_match_table(db_path=PATH_DB, csv_path=CSV_PATH_MATCH, output_format='csv', xml_backend='etree',
+                       league=DEFAULT_LEAGUE):
+    """
+    Check an incrementally updated match table against a full rebuild.
+
+    The full rebuild is written to a temporary directory. Rows are compared sorted by date and
+    match_api_id, since updates append late matches of an already processed date at the end.
+
+    Raises:
+    - ValueError if the stored table differs from the rebuild.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rebuild_path = os.path.join(tmp_dir, os.path.basename(csv_path))
+        table_to_csv(db_path, rebuild_path, SQL_QUERY_MATCH, xml_backend=xml_backend, output_format=output_format,
+                     league=league)
+        expected = read_output(rebuild_path, output_format)
+
+    stored = read_output(csv_path, output_format)
+    expected = expected.sort_values(['date', 'match_api_id']).reset_index(drop=True)
+    stored = stored.sort_values(['date', 'match_api_id']).reset_index(drop=True)
+
+    if not expected.equals(stored):
+        raise ValueError(f"Match table at {csv_path} differs from a full rebuild")
+
+
+def verify_xml_backends(db_path=PATH_DB, query=SQL_SELECT_MATCH, sample_size=1000, league=DEFAULT_LEAGUE):
+    """
+    Run both XML backends on a random sample of real matches and raise if they disagree.
+
+    The sample is drawn with ORDER BY RANDOM() over the whole league, so it spreads over all
+    seasons instead of only covering the oldest matches.
+
+    Returns:
+    - Number of matches checked.
+    """
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql(f"{query} ORDER BY RANDOM() LIMIT {int(sample_size)}", conn, params=(league,))
+    conn.close()
+
+    match_features = XmlProcessor.XmlProcessor(backend='verify').extract_match_features(df)
+    return len(match_features)
+
+
+def execute_data_loader(n_workers=1, chunk_size=5000, read_chunksize=None, output_format='csv'):
+    create_indexes(PATH_DB)
+    table_to_csv(PATH_DB, CSV_PATH_MATCH, SQL_QUERY_MATCH, n_workers=n_workers, chunk_size=chunk_size,
+                 read_chunksize=read_chunksize, output_format=output_format, watermark_path=WATERMARK_PATH_MATCH)
+    table_to_csv(PATH_DB, CSV_PATH_LINEUP, SQL_QUERY_LINEUP, read_chunksize=read_chunksize, dtype=LINEUP_DTYPES,
+                 output_format=output_format)
+    table_to_csv(PATH_DB, CSV_PATH_PLAYER_ATTR, SQL_QUERY_PLAYERS, read_chunksize=read_chunksize,
+                 dtype=PLAYER_ATTR_DTYPES, output_format=output_format)
+
+
+def list_leagues(db_path=PATH_DB):
+    """Names of the leagues with matches the loader selects, sorted."""
+    conn = sqlite3.connect(db_path)
+    leagues = pd.read_sql(SQL_QUERY_LEAGUES, conn)['name'].tolist()
+    conn.close()
+    return leagues
+
+
+def league_partition_name(league):
+    """
+    Directory name of a league partition, e.g. 'England Premier League' -> 'league=England_Premier_League'.
+
+    Spaces become '_' and '_', '%', '/' and non-ASCII characters are percent-encoded, so
+    league_from_partition_name gives back the exact league name.
+    """
+    return f"{LEAGUE_PARTITION_PREFIX}{quote(league, safe=' ').replace('_', '%5F').replace(' ', '_')}"
+
+
+def league_from_partition_name(name):
+    """League of a partition directory name written by league_partition_name."""
+    return unquote(name[len(LEAGUE_PARTITION_PREFIX):].replace('_', ' '))
+
+
+def list_league_partitions(raw_dir=RAW_DIR):
+    """Leagues with a partition directory in raw_dir, sorted."""
+    return sorted(
+        league_from_partition_name(name)
+        for name in os.listdir(raw_dir)
+        if name.startswith(LEAGUE_PARTITION_PREFIX) and os.path.isdir(os.path.join(raw_dir, name))
+    )
+
+
+def get_league_paths(raw_dir, league):
+    """Output paths of the tables of one league, in its partition directory of raw_dir."""
+    league_dir = os.path.join(raw_dir, league_partition_name(league))
+    return {
+        'match_details': os.path.join(league_dir, 'match_details.csv'),
+        'match_lineups': os.path.join(league_dir, 'match_lineups.csv'),
+        'player_attributes': os.path.join(league_dir, 'player_attributes.csv'),
+        'watermark': os.path.join(league_dir, 'match_details_watermark.json'),
+    }
+
+
+def execute_league_loader(league, db_path=PATH_DB, raw_dir=RAW_DIR, n_workers=1, chunk_size=5000, read_chunksize=None,
+                          output_format='csv'):
+    """
+    Build the match, lineup and player attribute tables of one league in its partition directory.
+
+    Returns:
+    - Tuple (rows_read, rows_written) summed over the three tables.
+    """
+    paths = get_league_paths(raw_dir, league)
+    counts = [
+        table_to_csv(db_path, paths['match_details'], SQL_QUERY_MATCH, n_workers=n_workers, chunk_size=chunk_size,
+                     read_chunksize=read_chunksize, output_format=output_format, watermark_path=paths['watermark'],
+                     league=league),
+        table_to_csv(db_path, paths['match_lineups'], SQL_QUERY_LINEUP, read_chunksize=read_chunksize,
+                     dtype=LINEUP_DTYPES, output_format=output_format, league=league),
+        table_to_csv(db_path, paths['player_attributes'], SQL_QUERY_PLAYERS, read_chunksize=read_chunksize,
+                     dtype=PLAYER_ATTR_DTYPES, output_format=output_format, league=league),
+    ]
+    return sum(read for read, _ in counts), sum(written for _, written in counts)
+
+
+def execute_multi_league_loader(leagues=None, n_workers=None, db_path=PATH_DB, raw_dir=RAW_DIR, read_chunksize=None,
+                                output_format='csv', chunk_size=5000, xml_workers=1):
+    """
+    Build the tables of several leagues in a process pool, one league per task.
+
+    Leagues share no team state, so every task runs the single league loader on its own SQLite
+    connection and writes to its own partition directory, see get_league_paths. Player attributes
+    are selected per league, so a player of two leagues appears in both partitions.
+
+    Parameters:
+    - leagues: league names, all leagues of list_leagues if None.
+    - n_workers: number of processes, one per league (up to the CPU count) if None.
+    - chunk_size: matches per XML parsing task, see table_to_csv.
+    - xml_workers: processes parsing the match XML within each league, e.g. to split one big league
+      when there are fewer leagues than CPUs.
+
+    Returns:
+    - Dict of league -> (rows_read, rows_written), in the order of leagues.
+    """
+    create_indexes(db_path)
+    leagues = list_leagues(db_path) if leagues is None else list(leagues)
+    if not leagues:
+        return {}
+
+    n_workers = min(len(leagues), os.cpu_count() or 1) if n_workers is None else n_workers
+    tasks = [(league, db_path, raw_dir, xml_workers, chunk_size, read_chunksize, output_format) for league in leagues]
+    if n_workers <= 1:
+        return {league: execute_league_loader(*task) for league, task in zip(leagues, tasks)}
 
-def execute_data_loader():
-    table_to_csv(PATH_DB, CSV_PATH_MATCH, SQL_QUERY_MATCH)
-    table_to_csv(PATH_DB, CSV_PATH_PLAYER_ATTR, SQL_QUERY_PLAYERS)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return dict(zip(leagues, executor.map(execute_league_loader, *zip(*tasks))))
 
 
 if __name__ == "__main__":
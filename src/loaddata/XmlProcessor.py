@@ -1,16 +1,44 @@
+import re
 import xml.etree.cElementTree as et
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
 
-column_mappings = {
+column_mappings = [
     ('shoton', 'team', 'home'),
     ('shoton', 'team', 'away'),
     ('possession', 'homepos', 'home'),
     ('possession', 'awaypos', 'away')
+]
+
+match_feature_columns = ['home_shoton', 'away_shoton', 'homepos', 'awaypos']
+
+team_state_columns = ['match_api_id', 'date', 'home_team', 'away_team'] + match_feature_columns
+
+xml_backends = ('etree', 'stream', 'verify')
+
+# Start and end tags may carry whitespace (and the start tag attributes), as XML allows.
+team_tag_pattern = re.compile(r'<team(?:\s[^>]*)?>([^<]*)</team\s*>')
+value_tag_patterns = {
+    tag: re.compile(rf'<{tag}(?:\s[^>]*)?>([^<]*)</{tag}\s*>')
+    for tag in ['homepos', 'awaypos']
 }
 
 class XmlProcessor:
 
+    def __init__(self, backend='etree'):
+        """
+        Initializes the XmlProcessor with the backend used to read match event XML.
+
+        Parameters:
+        - backend: 'etree' builds an ElementTree per blob, 'stream' scans the XML text for the few
+          tags we need without building a tree, 'verify' runs both and raises on any difference.
+        """
+        if backend not in xml_backends:
+            raise ValueError(f"backend must be one of {xml_backends}")
+        self.backend = backend
+
     def get_team_id(self, match_row, team):
         if team in 'home':
             team_id = match_row['home_team']
@@ -18,46 +46,311 @@ class XmlProcessor:
             team_id = match_row['away_team']
         return team_id
 
-    def get_xml_from_last_match(self, column, match_row, team_id, df):
-        match_date = match_row['date']
-        mask_team_matches = (df['home_team'].eq(team_id)) | (df['away_team'].eq(team_id))
-        team_matches = df.loc[mask_team_matches]
-        sorted_team_matches = team_matches.sort_values(by='date', ascending=False)
-        last_match = sorted_team_matches.loc[sorted_team_matches['date'].lt(match_date)].head(1)
-        path = last_match.squeeze()[column]
-        return path
-
-    def process_xml(self, match_row, column, xml_col, team, df):
-        team_id = self.get_team_id(match_row, team)
-        path = self.get_xml_from_last_match(column, match_row, team_id, df)
-
-        if path is not None and isinstance(path, str):
-            row_list = []
-            root = et.fromstring(path)
-            row_elements = root.findall('.//{}'.format(xml_col))
-
-            if len(row_elements) == 0:
-                return 0
-
-            for row in row_elements:
-                row_list.append(int(row.text))
-
-            if xml_col == 'team':
-                return len(list(filter(lambda val: int(team_id) == val, row_list)))
-            else:
-                return row_list[-1]
+    def get_team_date_keys(self, df):
+        """
+        Encodes every (team, date) pair of the match table as a single sortable int64 key.
+
+        The first len(df) keys belong to the home teams, the last len(df) keys to the away teams.
+
+        Parameters:
+        - df: DataFrame with 'home_team', 'away_team' and 'date' columns.
+
+        Returns:
+        - Tuple (keys, base) where key // base is the team code and key % base the date rank.
+        """
+        team_codes, _ = pd.factorize(pd.concat([df['home_team'], df['away_team']], ignore_index=True))
+        _, date_ranks = np.unique(pd.to_datetime(df['date']).to_numpy(), return_inverse=True)
+
+        base = len(df) + 1
+        keys = team_codes.astype(np.int64) * base + np.tile(date_ranks, 2)
+        return keys, base
+
+    def build_team_timeline(self, df):
+        """
+        Builds a per-team timeline index over the match table.
+
+        Every match appears twice in the timeline, once for its home team and once for its away team.
+        Entries are sorted by team and date, so the matches of one team form a contiguous,
+        date-sorted block of row positions.
+
+        Parameters:
+        - df: DataFrame with 'home_team', 'away_team' and 'date' columns.
+
+        Returns:
+        - Tuple (keys, base, sorted_keys, sorted_positions) consumed by get_last_match_positions.
+        """
+        keys, base = self.get_team_date_keys(df)
+        positions = np.tile(np.arange(len(df)), 2)
+
+        order = np.argsort(keys, kind='stable')
+        return keys, base, keys[order], positions[order]
+
+    def get_last_match_positions(self, df, team, timeline=None):
+        """
+        Finds, for every match, the row position of the previous match of its home or away team.
+
+        The previous match is the latest match of the same team (played home or away)
+        with a date strictly before the current match date.
+
+        Parameters:
+        - df: DataFrame with 'home_team', 'away_team' and 'date' columns.
+        - team: 'home' or 'away', which team of each match to look up.
+        - timeline: Optional index from build_team_timeline, reused across calls.
+
+        Returns:
+        - Array of row positions into df, -1 where the team has no earlier match.
+        """
+        if timeline is None:
+            timeline = self.build_team_timeline(df)
+        keys, base, sorted_keys, sorted_positions = timeline
+
+        n_matches = len(df)
+        query_keys = keys[:n_matches] if team in 'home' else keys[n_matches:]
+
+        # Everything left of the insertion point is an earlier (team, date) key;
+        # the entry just before it is the last match only if it belongs to the same team.
+        idx = np.searchsorted(sorted_keys, query_keys, side='left') - 1
+        safe_idx = np.maximum(idx, 0)
+        same_team = (idx >= 0) & (sorted_keys[safe_idx] // base == query_keys // base)
+
+        return np.where(same_team, sorted_positions[safe_idx], -1)
+
+    def parse_match_xml(self, shoton, possession, home_team, away_team):
+        """
+        Reads the shoton and possession XML of one match with the configured backend.
+
+        Returns:
+        - Tuple (home_shoton, away_shoton, homepos, awaypos), see parse_match_xml_etree.
+        """
+        if self.backend == 'etree':
+            return self.parse_match_xml_etree(shoton, possession, home_team, away_team)
+        if self.backend == 'stream':
+            return self.parse_match_xml_stream(shoton, possession, home_team, away_team)
+
+        etree_values = self.parse_match_xml_etree(shoton, possession, home_team, away_team)
+        stream_values = self.parse_match_xml_stream(shoton, possession, home_team, away_team)
+        if etree_values != stream_values:
+            raise ValueError(
+                f"XML backends disagree for match {home_team} vs {away_team}: "
+                f"etree={etree_values}, stream={stream_values}"
+            )
+        return etree_values
+
+    def parse_match_xml_etree(self, shoton, possession, home_team, away_team):
+        """
+        Parses the shoton and possession XML of one match, each blob exactly once.
+
+        Parameters:
+        - shoton: shoton XML string of the match (or a missing value).
+        - possession: possession XML string of the match (or a missing value).
+        - home_team: home team id of the match.
+        - away_team: away team id of the match.
+
+        Returns:
+        - Tuple (home_shoton, away_shoton, homepos, awaypos) with the shots on target of each team
+          and the last recorded home/away possession, 0 where the XML has no value.
+        """
+        home_shoton, away_shoton, homepos, awaypos = 0, 0, 0, 0
+
+        if isinstance(shoton, str):
+            root = et.fromstring(shoton)
+            for row in root.findall('.//team'):
+                team_id = int(row.text)
+                if team_id == int(home_team):
+                    home_shoton += 1
+                elif team_id == int(away_team):
+                    away_shoton += 1
+
+        if isinstance(possession, str):
+            root = et.fromstring(possession)
+            homepos_elements = root.findall('.//homepos')
+            awaypos_elements = root.findall('.//awaypos')
+            if len(homepos_elements) > 0:
+                homepos = int(homepos_elements[-1].text)
+            if len(awaypos_elements) > 0:
+                awaypos = int(awaypos_elements[-1].text)
+
+        return home_shoton, away_shoton, homepos, awaypos
+
+    def scan_last_value(self, xml, tag):
+        """
+        Returns the integer text of the last <tag> element in the XML string, 0 if there is none.
+        """
+        pattern = value_tag_patterns.get(tag) or re.compile(rf'<{tag}(?:\s[^>]*)?>([^<]*)</{tag}\s*>')
+        values = pattern.findall(xml)
+        return int(values[-1]) if values else 0
+
+    def parse_match_xml_stream(self, shoton, possession, home_team, away_team):
+        """
+        Reads the same values as parse_match_xml_etree by scanning the XML text.
+
+        Only the <team> ids under shoton and the last <homepos>/<awaypos> are read,
+        so no element tree is allocated for the blob.
+        """
+        home_shoton, away_shoton, homepos, awaypos = 0, 0, 0, 0
+
+        if isinstance(shoton, str):
+            home_id, away_id = int(home_team), int(away_team)
+            for text in team_tag_pattern.findall(shoton):
+                team_id = int(text)
+                if team_id == home_id:
+                    home_shoton += 1
+                elif team_id == away_id:
+                    away_shoton += 1
+
+        if isinstance(possession, str):
+            homepos = self.scan_last_value(possession, 'homepos')
+            awaypos = self.scan_last_value(possession, 'awaypos')
+
+        return home_shoton, away_shoton, homepos, awaypos
+
+    def extract_match_values(self, shoton, possession, home_team, away_team):
+        """
+        Parses a batch of matches and returns their XML derived values as an int64 array
+        of shape (n_matches, len(match_feature_columns)).
+        """
+        records = [
+            self.parse_match_xml(*match)
+            for match in zip(shoton, possession, home_team, away_team)
+        ]
+        return np.array(records, dtype=np.int64).reshape(len(records), len(match_feature_columns))
+
+    def extract_match_features(self, df, n_workers=1, chunk_size=5000):
+        """
+        Builds the compact per-match table of XML derived values, parsing every match once.
+
+        With n_workers > 1 the matches are split into chunks of chunk_size rows and parsed in a
+        process pool. Chunks are collected in submission order, so the result does not depend
+        on the number of workers.
+
+        Parameters:
+        - df: DataFrame with 'match_api_id', 'home_team', 'away_team', 'shoton' and 'possession' columns.
+        - n_workers: Number of worker processes, 1 parses in the current process.
+        - chunk_size: Number of matches sent to a worker per task.
+
+        Returns:
+        - DataFrame indexed by match_api_id with columns from match_feature_columns.
+        """
+        columns = [df[column].tolist() for column in ['shoton', 'possession', 'home_team', 'away_team']]
+
+        if n_workers > 1 and len(df) > chunk_size:
+            starts = range(0, len(df), chunk_size)
+            chunks = [[column[start:start + chunk_size] for column in columns] for start in starts]
+
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                values = np.concatenate(list(executor.map(extract_match_values, [self.backend] * len(chunks), chunks)))
+        else:
+            values = self.extract_match_values(*columns)
+
+        return pd.DataFrame(
+            values,
+            index=pd.Index(df['match_api_id'], name='match_api_id'),
+            columns=match_feature_columns
+        )
+
+    def process_xml(self, df, match_features, column, xml_col, team, timeline=None):
+        """
+        Joins the XML derived value of each team's previous match onto the match table.
+
+        Parameters:
+        - df: DataFrame with 'match_api_id', 'home_team', 'away_team' and 'date' columns.
+        - match_features: per-match table from extract_match_features.
+        - column: source XML column, 'shoton' or 'possession'.
+        - xml_col: XML tag to read, 'team', 'homepos' or 'awaypos'.
+        - team: 'home' or 'away', which team of each match to look up.
+        - timeline: Optional index from build_team_timeline, reused across calls.
+
+        Returns:
+        - int64 array aligned with df, 0 where the team has no earlier match.
+        """
+        last_positions = self.get_last_match_positions(df, team, timeline)
+        has_last_match = last_positions >= 0
+        last_rows = df.iloc[np.maximum(last_positions, 0)]
+
+        last_features = match_features.reindex(last_rows['match_api_id'].to_numpy())
+
+        if xml_col == 'team':
+            team_ids = df[f"{team}_team"].to_numpy()
+            played_home = last_rows['home_team'].to_numpy() == team_ids
+            values = np.where(played_home, last_features['home_shoton'], last_features['away_shoton'])
         else:
-            return 0
+            values = last_features[xml_col].to_numpy()
+
+        return np.where(has_last_match, values, 0).astype(np.int64)
+
+    def get_team_state(self, matches, match_features):
+        """
+        Collects the last match of every team together with its XML derived values.
+
+        This is all the history the previous match lookup needs, so it can be carried from one
+        batch of matches to the next instead of keeping the whole match table around.
+
+        Parameters:
+        - matches: DataFrame with 'match_api_id', 'date', 'home_team' and 'away_team' columns.
+        - match_features: per-match table from extract_match_features covering those matches.
+
+        Returns:
+        - DataFrame with team_state_columns, one row per distinct last match.
+        """
+        matches = matches[['match_api_id', 'date', 'home_team', 'away_team']].reset_index(drop=True)
+        dates = pd.to_datetime(matches['date'])
+
+        team_matches = pd.DataFrame({
+            'team': pd.concat([matches['home_team'], matches['away_team']], ignore_index=True),
+            'date': pd.concat([dates, dates], ignore_index=True),
+            'position': np.tile(np.arange(len(matches)), 2)
+        })
+        last_positions = team_matches.sort_values('date', kind='stable').groupby('team')['position'].last()
+
+        team_state = matches.iloc[np.unique(last_positions.to_numpy())].reset_index(drop=True)
+        team_features = match_features.reindex(team_state['match_api_id'].to_numpy()).reset_index(drop=True)
+
+        return pd.concat([team_state, team_features], axis=1)[team_state_columns]
+
+    def process_chunk(self, df, team_state=None, n_workers=1, chunk_size=5000):
+        """
+        Adds the previous match XML columns to a batch of matches, continuing from team_state.
+
+        Every match in df must be played strictly after the matches in team_state, which holds when
+        batches are read in date order and never split one date across two batches.
+
+        Parameters:
+        - df: DataFrame with the raw match columns, including 'shoton' and 'possession'.
+        - team_state: Result of get_team_state for all earlier batches, None for the first batch.
+        - n_workers: Number of worker processes for the XML extraction.
+        - chunk_size: Number of matches sent to a worker per task.
+
+        Returns:
+        - Tuple (df, team_state): the processed batch and the state to pass with the next batch.
+        """
+        match_features = self.extract_match_features(df, n_workers, chunk_size)
+        matches = df[['match_api_id', 'date', 'home_team', 'away_team']]
+
+        if team_state is not None and len(team_state) > 0:
+            match_features = pd.concat([team_state.set_index('match_api_id')[match_feature_columns], match_features])
+            matches = pd.concat([team_state[matches.columns], matches], ignore_index=True)
+        else:
+            matches = matches.reset_index(drop=True)
+
+        timeline = self.build_team_timeline(matches)
+        n_history = len(matches) - len(df)
 
-    def process_data(self, df):
         for column_mapping in column_mappings:
             column, xml_col, team = column_mapping
 
             new_col_name = f"{team}_{column}"
-            df[new_col_name] = df.apply(lambda row: self.process_xml(row, column, xml_col, team, df), axis=1)
+            df[new_col_name] = self.process_xml(matches, match_features, column, xml_col, team, timeline)[n_history:]
 
         unique_columns = list(set([x[0] for x in column_mappings]))
         shoton, possession = [col for col in unique_columns if col == 'shoton' or col == 'possession']
         df.drop([shoton, possession], axis=1, inplace=True)
 
+        return df, self.get_team_state(matches, match_features)
+
+    def process_data(self, df, n_workers=1, chunk_size=5000):
+        df, _ = self.process_chunk(df, n_workers=n_workers, chunk_size=chunk_size)
         return df
+
+def extract_match_values(backend, chunk):
+    """Process pool entry point: parses one chunk of matches with a fresh XmlProcessor."""
+    return XmlProcessor(backend=backend).extract_match_values(*chunk)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.loaddata import ColumnarStore
+
+
+class TestColumnarStore(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pd.DataFrame({
+            'match_api_id': [1, 2, 3, 4],
+            'season': ['2014/2015', '2014/2015', '2015/2016', '2015/2016'],
+            'stage': [1, 2, 1, 2],
+            'date': ['2014-08-16', '2014-08-23', '2015-08-08', '2015-08-15'],
+            'home_team': [1111, 2222, 1111, 2222],
+            'away_team': [2222, 1111, 2222, 1111],
+            'home_player_1': [10.0, None, 10.0, 12.0],
+            'rolling_avg_goals_home': [0.5, 1.5, 2.0, 1.0],
+        })
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'matches')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_apply_schema(self):
+        result = ColumnarStore.apply_schema(self.data)
+
+        self.assertEqual(result['match_api_id'].dtype, 'int32')
+        self.assertEqual(result['home_player_1'].dtype, 'Int32')
+        self.assertEqual(result['rolling_avg_goals_home'].dtype, 'float32')
+        self.assertTrue(pd.api.types.is_datetime64_dtype(result['date']))
+
+    def test_write_partitions_by_season(self):
+        for file_format in ['parquet', 'feather']:
+            ColumnarStore.write_dataset(self.data, self.path, file_format)
+
+            self.assertEqual(ColumnarStore.list_seasons(self.path), ['2014/2015', '2015/2016'])
+            self.assertEqual(len(ColumnarStore.read_dataset(self.path)), 4)
+
+    def test_read_selected_seasons_and_columns(self):
+        ColumnarStore.write_dataset(self.data, self.path, 'parquet')
+
+        result = ColumnarStore.read_dataset(self.path, seasons=['2015/2016'], columns=['match_api_id', 'stage'])
+
+        self.assertEqual(list(result.columns), ['match_api_id', 'stage'])
+        self.assertEqual(list(result['match_api_id']), [3, 4])
+
+    def test_write_parts_appends(self):
+        ColumnarStore.write_dataset(self.data.iloc[:3], self.path, 'parquet', part=0)
+        ColumnarStore.write_dataset(self.data.iloc[3:], self.path, 'parquet', part=1)
+
+        self.assertEqual(list(ColumnarStore.read_dataset(self.path)['match_api_id']), [1, 2, 3, 4])
+
+        ColumnarStore.write_dataset(self.data.iloc[:1], self.path, 'parquet', part=0)
+        self.assertEqual(list(ColumnarStore.read_dataset(self.path)['match_api_id']), [1])
+
+    def test_csv_option(self):
+        csv_path = self.path + '.csv'
+        ColumnarStore.write_dataset(self.data, csv_path, 'csv')
+
+        result = ColumnarStore.read_dataset(csv_path, seasons=['2014/2015'])
+        self.assertEqual(list(result['match_api_id']), [1, 2])
+
+    def test_select_training_seasons(self):
+        seasons = ['2012/2013', '2015/2016', '2013/2014', '2014/2015']
+
+        self.assertEqual(ColumnarStore.select_training_seasons(seasons, 2), ['2013/2014', '2014/2015', '2015/2016'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import MockDataLoader
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import DataLoader
+
+
+def create_mock_database(db_path, matches, league_id=1):
+    """Write the mock matches of one league into an SQLite file with the tables used by the loader queries."""
+    matches = matches.rename(columns={'home_team': 'home_team_api_id', 'away_team': 'away_team_api_id'})
+    matches = matches.assign(
+        league_id=league_id,
+        season='2008/2009',
+        stage=range(1, len(matches) + 1),
+        home_team_goal=1,
+        away_team_goal=0,
+    )
+    for team in ['home', 'away']:
+        for i in range(1, 12):
+            matches[f"{team}_player_{i}"] = matches[f"{team}_team_api_id"] * 100 + i
+
+    conn = sqlite3.connect(db_path)
+    pd.DataFrame({'id': [1, 2], 'name': ['England Premier League', 'Spain LIGA BBVA']}).to_sql(
+        'League', conn, index=False, if_exists='replace')
+    pd.DataFrame({'team_api_id': [1111, 2222]}).to_sql('Team', conn, index=False, if_exists='replace')
+    player_ids = sorted(set(matches.filter(like='_player_').to_numpy().ravel()))
+    pd.DataFrame({'player_api_id': player_ids}).to_sql('Player', conn, index=False, if_exists='replace')
+    pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'player_api_id': [111101, 111101, 222201, 999999],
+        'date': ['2008-02-22 00:00:00', '2009-08-30 00:00:00', '2007-08-30 00:00:00', '2007-08-30 00:00:00'],
+        'overall_rating': [67, 70, None, 80],
+        'potential': [71, 72, 73, 81],
+        'acceleration': [60, 61, 62, 63],
+        'strength': [70, 71, 72, 73],
+        'aggression': [50, 51, 52, 53],
+    }).to_sql('Player_Attributes', conn, index=False, if_exists='replace')
+    matches.to_sql('Match', conn, index=False, if_exists='append')
+    conn.close()
+
+
+class TestDataLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.data = MockDataLoader.MockDataLoader().load_data().sort_values('date').reset_index(drop=True)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'database.sqlite')
+        self.csv_path = os.path.join(self.tmp_dir.name, 'raw', 'match_details.csv')
+        self.watermark_path = os.path.join(self.tmp_dir.name, 'watermark.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_streamed_table_matches_full_read(self):
+        create_mock_database(self.db_path, self.data)
+        streamed_path = os.path.join(self.tmp_dir.name, 'raw', 'match_details_streamed.csv')
+
+        DataLoader.table_to_csv(self.db_path, self.csv_path, DataLoader.SQL_QUERY_MATCH)
+        DataLoader.table_to_csv(self.db_path, streamed_path, DataLoader.SQL_QUERY_MATCH, read_chunksize=1)
+
+        self.assertTrue(pd.read_csv(self.csv_path).equals(pd.read_csv(streamed_path)))
+
+    def test_lineup_table(self):
+        create_mock_database(self.db_path, self.data)
+        DataLoader.create_indexes(self.db_path)
+        lineup_path = os.path.join(self.tmp_dir.name, 'raw', 'match_lineups.csv')
+
+        DataLoader.table_to_csv(self.db_path, lineup_path, DataLoader.SQL_QUERY_LINEUP, dtype=DataLoader.LINEUP_DTYPES)
+        lineups = pd.read_csv(lineup_path)
+
+        self.assertEqual(list(lineups.columns), ['match_api_id', 'side', 'slot', 'player_api_id'])
+        self.assertEqual(len(lineups), 22 * len(self.data))
+
+        first_match = lineups[lineups['match_api_id'] == 3]
+        self.assertEqual(list(first_match['player_api_id'].iloc[:11]), [222201 + i for i in range(11)])
+        self.assertEqual(list(first_match['player_api_id'].iloc[11:]), [111101 + i for i in range(11)])
+
+    def test_player_attributes_pushdown(self):
+        create_mock_database(self.db_path, self.data)
+        DataLoader.create_indexes(self.db_path)
+        player_attr_path = os.path.join(self.tmp_dir.name, 'raw', 'player_attributes.csv')
+
+        DataLoader.table_to_csv(self.db_path, player_attr_path, DataLoader.SQL_QUERY_PLAYERS,
+                                dtype=DataLoader.PLAYER_ATTR_DTYPES)
+        player_attr = pd.read_csv(player_attr_path)
+
+        self.assertEqual(list(player_attr.columns),
+                         ['player_api_id', 'date', 'overall_rating', 'acceleration', 'strength', 'aggression'])
+        self.assertEqual(list(player_attr['player_api_id']), [111101, 222201])
+        self.assertTrue(player_attr['overall_rating'].isna().iloc[1])
+
+    def test_update_match_table_appends_new_matches(self):
+        create_mock_database(self.db_path, self.data.iloc[:2])
+
+        lineup_path = os.path.join(self.tmp_dir.name, 'raw', 'match_lineups.csv')
+
+        added = DataLoader.update_match_table(self.db_path, self.csv_path, self.watermark_path, lineup_path=lineup_path)
+        self.assertEqual(added, 2)
+
+        create_mock_database(self.db_path, self.data.iloc[2:])
+        self.assertEqual(DataLoader.update_match_table(self.db_path, self.csv_path, self.watermark_path,
+                                                       lineup_path=lineup_path), 1)
+        self.assertEqual(DataLoader.update_match_table(self.db_path, self.csv_path, self.watermark_path,
+                                                       lineup_path=lineup_path), 0)
+
+        DataLoader.verify_match_table(self.db_path, self.csv_path)
+        self.assertEqual(len(pd.read_csv(self.csv_path)), 3)
+        self.assertEqual(len(pd.read_csv(lineup_path)), 3 * 22)
+
+    def test_league_partition_name_round_trip(self):
+        leagues = ['England Premier League', 'Serie_A League', 'Ligue 1 50% / 50%', 'Österreich Bundesliga']
+        names = [DataLoader.league_partition_name(league) for league in leagues]
+
+        self.assertEqual(names[0], 'league=England_Premier_League')
+        self.assertEqual([DataLoader.league_from_partition_name(name) for name in names], leagues)
+        self.assertTrue(all('/' not in name for name in names))
+
+    def test_verify_xml_backends(self):
+        create_mock_database(self.db_path, self.data)
+
+        self.assertEqual(DataLoader.verify_xml_backends(self.db_path, sample_size=2), 2)
+        self.assertEqual(DataLoader.verify_xml_backends(self.db_path), len(self.data))
+
+        with mock.patch.object(DataLoader.XmlProcessor.XmlProcessor, 'parse_match_xml_stream',
+                               lambda *args: (0, 0, 0, 0)):
+            with self.assertRaises(ValueError):
+                DataLoader.verify_xml_backends(self.db_path)
+
+    def test_multi_league_loader_partitions_by_league(self):
+        create_mock_database(self.db_path, self.data)
+        create_mock_database(self.db_path, self.data.assign(match_api_id=self.data['match_api_id'] + 1000), league_id=2)
+        raw_dir = os.path.join(self.tmp_dir.name, 'raw')
+
+        self.assertEqual(DataLoader.list_leagues(self.db_path), ['England Premier League', 'Spain LIGA BBVA'])
+        counts = DataLoader.execute_multi_league_loader(n_workers=2, db_path=self.db_path, raw_dir=raw_dir)
+
+        self.assertEqual(list(counts), ['England Premier League', 'Spain LIGA BBVA'])
+        self.assertEqual(DataLoader.list_league_partitions(raw_dir), ['England Premier League', 'Spain LIGA BBVA'])
+
+        DataLoader.table_to_csv(self.db_path, self.csv_path, DataLoader.SQL_QUERY_MATCH)
+        england = pd.read_csv(DataLoader.get_league_paths(raw_dir, 'England Premier League')['match_details'])
+        spain = pd.read_csv(DataLoader.get_league_paths(raw_dir, 'Spain LIGA BBVA')['match_details'])
+
+        self.assertTrue(england.equals(pd.read_csv(self.csv_path)))
+        self.assertEqual(sorted(spain['match_api_id']), sorted(self.data['match_api_id'] + 1000))
+        lineups = pd.read_csv(DataLoader.get_league_paths(raw_dir, 'Spain LIGA BBVA')['match_lineups'])
+        self.assertEqual(len(lineups), 22 * len(self.data))
+        self.assertEqual(counts['Spain LIGA BBVA'][0], 2 * len(self.data) + 2)
+
+    def test_multi_league_loader_parses_xml_in_parallel(self):
+        create_mock_database(self.db_path, self.data)
+        raw_dir = os.path.join(self.tmp_dir.name, 'raw')
+        parallel_dir = os.path.join(self.tmp_dir.name, 'raw_parallel')
+
+        DataLoader.execute_multi_league_loader(['England Premier League'], db_path=self.db_path, raw_dir=raw_dir)
+        DataLoader.execute_multi_league_loader(['England Premier League'], db_path=self.db_path, raw_dir=parallel_dir,
+                                               chunk_size=1, xml_workers=2)
+
+        expected = DataLoader.get_league_paths(raw_dir, 'England Premier League')['match_details']
+        result = DataLoader.get_league_paths(parallel_dir, 'England Premier League')['match_details']
+        self.assertTrue(pd.read_csv(result).equals(pd.read_csv(expected)))
+
+
+if __name__ == '__main__':
+    unittest.main()
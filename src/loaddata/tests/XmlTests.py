@@ -1,5 +1,7 @@
 import unittest
 
+import pandas as pd
+
 import MockDataLoader
 from src.loaddata.XmlProcessor import XmlProcessor
 
@@ -32,6 +34,74 @@ class TestXmlProcessor(unittest.TestCase):
         self.assertTrue(result.head(1)['away_possession'][0] == 42)
         self.assertFalse('possession' in result.columns)
 
+    def test_last_match_positions(self):
+        home_positions = self.xml_processor.get_last_match_positions(self.data, 'home')
+        away_positions = self.xml_processor.get_last_match_positions(self.data, 'away')
+
+        self.assertEqual(list(home_positions), [2, 0, -1])
+        self.assertEqual(list(away_positions), [2, 0, -1])
+
+    def test_extract_match_features(self):
+        match_features = self.xml_processor.extract_match_features(self.data)
+
+        self.assertEqual(list(match_features.index), [1, 2, 3])
+        self.assertEqual(match_features.loc[1, 'homepos'], 52)
+        self.assertEqual(match_features.loc[1, 'awaypos'], 48)
+        self.assertEqual(match_features.loc[3, 'home_shoton'], 5)
+        self.assertEqual(match_features.loc[3, 'away_shoton'], 3)
+
+    def test_stream_backend_matches_etree(self):
+        etree_features = XmlProcessor(backend='etree').extract_match_features(self.data)
+        stream_features = XmlProcessor(backend='stream').extract_match_features(self.data)
+
+        self.assertTrue(etree_features.equals(stream_features))
+
+    def test_verify_backend(self):
+        expected = self.xml_processor.process_data(self.data.copy())
+        result = XmlProcessor(backend='verify').process_data(self.data.copy())
+
+        self.assertTrue(expected.equals(result))
+
+    def test_verify_backend_raises_on_mismatch(self):
+        processor = XmlProcessor(backend='verify')
+        processor.parse_match_xml_stream = lambda *args: (0, 0, 0, 0)
+
+        with self.assertRaises(ValueError):
+            processor.extract_match_features(self.data)
+
+    def test_parallel_extraction_is_ordered(self):
+        expected = self.xml_processor.extract_match_features(self.data)
+        result = self.xml_processor.extract_match_features(self.data, n_workers=2, chunk_size=1)
+
+        self.assertTrue(expected.equals(result))
+
+    def test_process_chunk_carries_team_state(self):
+        data = self.data.sort_values('date').reset_index(drop=True)
+        expected = self.xml_processor.process_data(data.copy())
+
+        first, team_state = self.xml_processor.process_chunk(data.iloc[:1].copy())
+        second, _ = self.xml_processor.process_chunk(data.iloc[1:].copy(), team_state)
+        result = pd.concat([first, second])
+
+        self.assertEqual(len(team_state), 1)
+        self.assertTrue(expected.equals(result))
+
+    def test_stream_backend_allows_whitespace_in_tags(self):
+        shoton = '<shoton><value><team>1111</team\n></value><value><team >2222</team></value>' \
+                 '<value><team>1111</team   ></value></shoton>'
+        possession = '<possession><value><homepos>55</homepos\n><awaypos>45</awaypos ></value>' \
+                     '<value><homepos >60</homepos\n  ><awaypos>40</awaypos\t></value></possession>'
+
+        etree_values = XmlProcessor(backend='etree').parse_match_xml(shoton, possession, 1111, 2222)
+        stream_values = XmlProcessor(backend='stream').parse_match_xml(shoton, possession, 1111, 2222)
+
+        self.assertEqual(etree_values, (2, 1, 60, 40))
+        self.assertEqual(stream_values, etree_values)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            XmlProcessor(backend='lxml')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,281 @@
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.helper import rolling_avg, window_indexer
+from src.playerstats import player_attribute_index, player_stats
+from src.shiftdata import shift_data
+from src.shiftdata.shift_data import ShiftDataPreprocessor
+from src.standings import standings
+from src.standings.standings import get_standings
+
+
+def hash_frame(df):
+    """Content hash of a DataFrame: columns, dtypes, index and values."""
+    digest = hashlib.sha1()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    One step of a FeaturePipeline.
+
+    Parameters:
+    - name: name of the stage and of its output.
+    - function: called as function(*inputs, **params), returns a DataFrame.
+    - inputs: names of the pipeline inputs or earlier stages passed to function, in order.
+    - params: default keyword arguments of function, JSON serializable.
+    - dependencies: other modules whose code function runs, e.g. [standings].
+    """
+
+    def __init__(self, name, function, inputs, params=None, dependencies=()):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.params = dict(params or {})
+        self.dependencies = list(dependencies)
+
+    def get_code_hash(self):
+        """
+        Hash of the source of the module defining function and of the dependencies.
+
+        The whole module is hashed because function usually calls helpers defined next to it. A
+        function whose module source is not available, e.g. one defined interactively, is hashed
+        on its own source.
+        """
+        digest = hashlib.sha1()
+        try:
+            digest.update(inspect.getsource(inspect.getmodule(self.function)).encode())
+        except (OSError, TypeError):
+            digest.update(inspect.getsource(self.function).encode())
+        for dependency in self.dependencies:
+            digest.update(inspect.getsource(dependency).encode())
+        return digest.hexdigest()
+
+
+class FeaturePipeline:
+    """
+    Runs stages in order and caches every stage output on disk.
+
+    The cache key of a stage hashes its code (see Stage.get_code_hash), its parameters and the keys of
+    its inputs, where the key of a pipeline input is the hash of its content. Changing a parameter or
+    the code of a stage or of its dependencies therefore only invalidates that stage and the stages
+    downstream of it, and a stage whose key is cached is loaded without loading or computing anything
+    upstream of it.
+
+    Outputs are stored as cache_dir/<stage>/<key>.parquet.
+    """
+
+    def __init__(self, stages, cache_dir=None):
+        names = set()
+        for stage in stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage name '{stage.name}'")
+            names.add(stage.name)
+
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        self.stage_status = {}
+
+    def get_stage_keys(self, input_keys, params):
+        """Cache key of every stage, given the keys of the pipeline inputs and the parameter overrides."""
+        keys = dict(input_keys)
+        for name, stage in self.stages.items():
+            missing = [input_name for input_name in stage.inputs if input_name not in keys]
+            if missing:
+                raise ValueError(f"Stage '{name}' needs {missing}, which are neither inputs nor earlier stages")
+
+            payload = {
+                'stage': name,
+                'code': stage.get_code_hash(),
+                'params': {**stage.params, **params.get(name, {})},
+                'inputs': [keys[input_name] for input_name in stage.inputs],
+            }
+            keys[name] = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+        return keys
+
+    def get_cache_path(self, name, key):
+        return os.path.join(self.cache_dir, name, f"{key}.parquet")
+
+    def run(self, inputs, params=None, targets=None):
+        """
+        Computes or loads the target stages.
+
+        Parameters:
+        - inputs: dict of input name -> DataFrame.
+        - params: dict of stage name -> parameter overrides.
+        - targets: stages to return, all stages if None.
+
+        Returns:
+        - dict of stage name -> DataFrame for the targets. stage_status records for every stage that
+          was needed whether it was 'cached' or 'computed'.
+        """
+        params = params or {}
+        for name in params:
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage '{name}'")
+
+        keys = self.get_stage_keys({name: hash_frame(df) for name, df in inputs.items()}, params)
+        results = dict(inputs)
+        self.stage_status = {}
+
+        def resolve(name):
+            if name in results:
+                return results[name]
+
+            stage = self.stages[name]
+            cache_path = self.get_cache_path(name, keys[name]) if self.cache_dir is not None else None
+            if cache_path is not None and os.path.exists(cache_path):
+                results[name] = pd.read_parquet(cache_path)
+                self.stage_status[name] = 'cached'
+                return results[name]
+
+            stage_inputs = [resolve(input_name) for input_name in stage.inputs]
+            results[name] = stage.function(*stage_inputs, **{**stage.params, **params.get(name, {})})
+            self.stage_status[name] = 'computed'
+
+            if cache_path is not None:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                results[name].to_parquet(cache_path)
+
+            return results[name]
+
+        targets = list(self.stages) if targets is None else targets
+        return {name: resolve(name) for name in targets}
+
+
+def prepare_matches(match_details, match_lineups):
+    """Joins the lineups onto the match details and sorts the matches by season and date."""
+    matches = match_details.merge(player_stats.lineups_to_wide(match_lineups), on='match_api_id', how='left')
+    matches['date'] = pd.to_datetime(matches['date'])
+    return matches.sort_values(by=['season', 'date'])
+
+
+def add_points(matches):
+    """Adds the points of both teams before kickoff and encodes result_match as 1 for a home win."""
+    matches = matches.copy()
+    matches[['points_home', 'points_away']] = get_standings(matches)[['points_home', 'points_away']]
+    matches['result_match'] = (matches['result_match'] == 'H').astype(int)
+    return matches
+
+
+def compute_player_stats(matches, player_attributes, n_previous=10):
+    """Rating columns of all lineup slots, see player_stats.get_player_stats."""
+    player_attributes = player_attributes.assign(date=pd.to_datetime(player_attributes['date']))
+    return player_stats.get_player_stats(matches, player_attributes, player_stats.players_cols, n_previous)
+
+
+def merge_player_stats(matches, match_player_stats):
+    """Replaces the lineup columns by the player ratings and drops matches with missing ratings."""
+    df = pd.merge(matches, match_player_stats, how='left', on='match_api_id')
+    df = df.drop(columns=player_stats.players_cols)
+    matching_columns = [col for col in df.columns if 'player_rating' in col] + \
+                       [col for col in df.columns if 'aggression_rating' in col] + \
+                       [col for col in df.columns if 'strength_rating' in col] + \
+                       [col for col in df.columns if 'acceleration_rating' in col]
+    return df.dropna(subset=matching_columns)
+
+
+def shift_match_features(df, features_to_shift=('team_goal', 'team_shoton', 'team_possession')):
+    """Adds the previous match values of both teams, see ShiftDataPreprocessor."""
+    preprocessor = ShiftDataPreprocessor(df)
+    home_df = preprocessor.select_and_rename_columns('home_')
+    away_df = preprocessor.select_and_rename_columns('away_')
+    preprocessor.concatenate_teams(home_df, away_df)
+    team_df_shifted = preprocessor.shift_features(list(features_to_shift))
+    return preprocessor.merge_shifted_features(team_df_shifted)
+
+
+def add_team_ratings(df_final):
+    """Sorts the matches by date and adds the mean player ratings per team and the goal conversion rates."""
+    df_ = df_final.sort_values(['date'], kind='stable')
+
+    for rating in ['strength', 'aggression', 'acceleration']:
+        df_[f'team_{rating}_home'] = df_[df_.filter(like=f'{rating}_rating_home').columns].mean(axis=1)
+        df_[f'team_{rating}_away'] = df_[df_.filter(like=f'{rating}_rating_away').columns].mean(axis=1)
+        df_[f'{rating}_difference'] = df_[f'team_{rating}_home'] - df_[f'team_{rating}_away']
+
+    for side in ['home', 'away']:
+        df_[f'goal_conversion_rate_{side}'] = np.where(
+            df_[f'{side}_last_team_shoton'] <= 0,
+            0,
+            df_[f'{side}_last_team_goal'] / df_[f'{side}_last_team_shoton']
+        )
+
+    return df_
+
+
+def drop_player_ratings(df_):
+    """Drops the per-slot rating columns once the team features are built from them."""
+    columns_to_drop = [
+        column
+        for rating in ['strength', 'aggression', 'overall', 'acceleration']
+        for side in ['home', 'away']
+        for column in df_.filter(like=f'{rating}_rating_{side}').columns
+    ]
+    return df_.drop(columns_to_drop, axis=1)
+
+
+def add_team_features(df_final, rolling_window=10):
+    """Averages the player ratings per team, adds conversion rates and the rolling team statistics."""
+    df_ = add_team_ratings(df_final)
+    df_ = rolling_avg.calculate_rolling_avg_pandas(df_, rolling_window)
+    return drop_player_ratings(df_)
+
+
+# (home column, away column, difference column); the ratio column replaces 'diff' by 'ratio'.
+columns_to_compare = [
+    ('rolling_avg_goals_home', 'rolling_avg_goals_away', 'rolling_avg_goals_diff'),
+    ('rolling_stability_goal_home', 'rolling_stability_goal_away', 'rolling_stability_goal_diff'),
+    ('rolling_avg_goals_conversion_rate_home', 'rolling_avg_goals_conversion_rate_away', 'rolling_avg_goals_conversion_rate_diff'),
+    ('rolling_stability_goals_conversion_rate_home', 'rolling_stability_goals_conversion_rate_away', 'rolling_stability_goals_conversion_rate_diff'),
+    ('rolling_avg_shoton_home', 'rolling_avg_shoton_away', 'rolling_avg_shoton_diff'),
+    ('rolling_stability_shoton_home', 'rolling_stability_shoton_away', 'rolling_stability_shoton_diff'),
+    ('points_home', 'points_away', 'points_diff'),
+]
+
+
+def add_comparisons(df_):
+    """Adds home minus away differences and home / away ratios (0 when the away value is 0)."""
+    df_ = df_.copy()
+    for home_col, away_col, diff_col in columns_to_compare:
+        df_[diff_col] = df_[home_col] - df_[away_col]
+
+    for home_col, away_col, ratio_col in columns_to_compare:
+        ratio_col = ratio_col.replace("diff", "ratio")
+        df_[ratio_col] = np.where(
+            df_[away_col] == 0,
+            0,
+            df_[home_col] / df_[away_col]
+        )
+
+    return df_
+
+
+def build_preprocessing_pipeline(cache_dir=None):
+    """
+    The feature engineering of preprocessing.ipynb as a FeaturePipeline.
+
+    Inputs are 'match_details', 'match_lineups' and 'player_attributes' as written by the data loader,
+    the final features are the output of the 'preprocessed' stage.
+    """
+    return FeaturePipeline([
+        Stage('matches', prepare_matches, ['match_details', 'match_lineups'], dependencies=[player_stats]),
+        Stage('points', add_points, ['matches'], dependencies=[standings]),
+        Stage('player_stats', compute_player_stats, ['matches', 'player_attributes'], {'n_previous': 10},
+              dependencies=[player_stats, player_attribute_index]),
+        Stage('player_features', merge_player_stats, ['points', 'player_stats'], dependencies=[player_stats]),
+        Stage('shifted', shift_match_features, ['player_features'],
+              {'features_to_shift': ['team_goal', 'team_shoton', 'team_possession']},
+              dependencies=[shift_data, window_indexer]),
+        Stage('team_features', add_team_features, ['shifted'], {'rolling_window': 10},
+              dependencies=[rolling_avg, window_indexer]),
+        Stage('preprocessed', add_comparisons, ['team_features']),
+    ], cache_dir=cache_dir)
@@ -0,0 +1,374 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.helper.get_split_data import split_data_for_training
+from src.pipeline.feature_pipeline import build_preprocessing_pipeline
+from src.pipeline.streaming_pipeline import iter_season_partitions, stream_features
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+STAGES = ['ingest', 'features', 'split', 'train']
+
+# Model of models/xgboost_model.ipynb.
+XGB_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 3,
+    'learning_rate': 0.1,
+    'random_state': 42,
+    'eval_metric': 'logloss',
+}
+
+
+def get_paths(data_dir):
+    """Files read and written by the stages, all under data_dir."""
+    return {
+        'db': os.path.join(data_dir, 'database.sqlite'),
+        'raw': os.path.join(data_dir, 'raw'),
+        'match_details': os.path.join(data_dir, 'raw', 'match_details.csv'),
+        'match_lineups': os.path.join(data_dir, 'raw', 'match_lineups.csv'),
+        'player_attributes': os.path.join(data_dir, 'raw', 'player_attributes.csv'),
+        'watermark': os.path.join(data_dir, 'raw', 'match_details_watermark.json'),
+        'cache': os.path.join(data_dir, 'cache', 'pipeline'),
+        'preprocessed': os.path.join(data_dir, 'preprocessed'),
+        'features': os.path.join(data_dir, 'preprocessed', 'preprocessed_1.csv'),
+        'model': os.path.join(data_dir, 'models', 'xgboost_model.json'),
+    }
+
+
+def import_data_loader():
+    """DataLoader imports its sibling modules by name, like its tests do."""
+    loaddata_dir = os.path.join(REPO_ROOT, 'src', 'loaddata')
+    if loaddata_dir not in sys.path:
+        sys.path.insert(0, loaddata_dir)
+    import DataLoader
+    return DataLoader
+
+
+def get_path_bytes(path):
+    """Size of a file, or of all files below a directory, 0 if it does not exist."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def reset_peak_rss():
+    """Resets the peak RSS of this process where Linux allows it, see proc(5) clear_refs."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def get_peak_rss():
+    """Peak RSS of this process in bytes since the last reset_peak_rss."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Without procfs only the peak over the process lifetime is known, in kB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_cpu_time():
+    """CPU time of this process and its finished worker processes."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def get_leagues(args, paths):
+    """Leagues selected with --leagues, None for the single league layout of the data loader."""
+    if not args.leagues:
+        return None
+    if args.leagues != ['all']:
+        return args.leagues
+
+    DataLoader = import_data_loader()
+    if os.path.exists(paths['db']):
+        return DataLoader.list_leagues(paths['db'])
+    return DataLoader.list_league_partitions(paths['raw'])
+
+
+def run_ingest(args, paths, state):
+    """Builds the raw match, lineup and player attribute tables from the SQLite database."""
+    DataLoader = import_data_loader()
+    leagues = get_leagues(args, paths)
+
+    if leagues is not None:
+        counts = DataLoader.execute_multi_league_loader(leagues, n_workers=args.n_workers, db_path=paths['db'],
+                                                        raw_dir=paths['raw'], read_chunksize=args.read_chunksize,
+                                                        output_format=args.output_format, chunk_size=args.chunk_size,
+                                                        xml_workers=args.xml_workers)
+        return {
+            'rows_in': sum(rows_read for rows_read, _ in counts.values()),
+            'rows_out': sum(rows_written for _, rows_written in counts.values()),
+            'outputs': [os.path.join(paths['raw'], DataLoader.league_partition_name(league)) for league in leagues],
+            'leagues': len(leagues),
+        }
+
+    DataLoader.create_indexes(paths['db'])
+
+    rows_in, rows_out = 0, 0
+    for query, path, kwargs in [
+        (DataLoader.SQL_QUERY_MATCH, paths['match_details'],
+         {'n_workers': args.n_workers or 1, 'chunk_size': args.chunk_size, 'watermark_path': paths['watermark']}),
+        (DataLoader.SQL_QUERY_LINEUP, paths['match_lineups'], {'dtype': DataLoader.LINEUP_DTYPES}),
+        (DataLoader.SQL_QUERY_PLAYERS, paths['player_attributes'], {'dtype': DataLoader.PLAYER_ATTR_DTYPES}),
+    ]:
+        rows_read, rows_written = DataLoader.table_to_csv(paths['db'], path, query, read_chunksize=args.read_chunksize,
+                                                          output_format=args.output_format, **kwargs)
+        rows_in += rows_read
+        rows_out += rows_written
+
+    outputs = [DataLoader.get_output_path(paths[name], args.output_format)
+               for name in ['match_details', 'match_lineups', 'player_attributes']]
+    return {'rows_in': rows_in, 'rows_out': rows_out, 'outputs': outputs}
+
+
+def build_features(raw_paths, features_path, output_format='csv', cache_dir=None, rolling_window=10, streaming=False):
+    """
+    Runs the preprocessing pipeline on the raw tables of one league and writes its features CSV.
+
+    Returns:
+    - Dict with 'rows_in', 'rows_out' and, without streaming, the 'stage_status' of the pipeline.
+    """
+    DataLoader = import_data_loader()
+    inputs = {
+        name: DataLoader.read_output(raw_paths[name], output_format)
+        for name in ['match_details', 'match_lineups', 'player_attributes']
+    }
+    os.makedirs(os.path.dirname(features_path), exist_ok=True)
+    rows_in = sum(len(df_input) for df_input in inputs.values())
+
+    if streaming:
+        partitions = iter_season_partitions(inputs['match_details'], inputs['match_lineups'])
+        rows_out = 0
+        for part, df in enumerate(stream_features(partitions, inputs['player_attributes'], rolling_window=rolling_window)):
+            df.to_csv(features_path, index=False, mode='w' if part == 0 else 'a', header=part == 0)
+            rows_out += len(df)
+        return {'rows_in': rows_in, 'rows_out': rows_out}
+
+    pipeline = build_preprocessing_pipeline(cache_dir=cache_dir)
+    params = {'team_features': {'rolling_window': rolling_window}}
+    df = pipeline.run(inputs, params=params, targets=['preprocessed'])['preprocessed']
+    df.to_csv(features_path, index=False)
+
+    return {'rows_in': rows_in, 'rows_out': len(df), 'stage_status': pipeline.stage_status}
+
+
+def concatenate_csv(paths, output_path):
+    """Writes the CSV files at paths, which share one header, one after another to output_path."""
+    with open(output_path, 'w') as output:
+        for i, path in enumerate(paths):
+            with open(path) as f:
+                header = f.readline()
+                if i == 0:
+                    output.write(header)
+                for line in f:
+                    output.write(line)
+
+
+def run_features(args, paths, state):
+    """
+    Runs the preprocessing pipeline on the raw tables and writes the features CSV.
+
+    With --leagues every league gets its own features file, built in a process pool, one league per
+    task, since leagues share no team or table state. The training features are all leagues together.
+    """
+    cache_dir = None if args.no_cache else paths['cache']
+    leagues = get_leagues(args, paths)
+
+    if leagues is None:
+        result = build_features(paths, paths['features'], args.output_format, cache_dir, args.rolling_window,
+                                args.streaming)
+        state['features_rows'] = result['rows_out']
+        return {**result, 'outputs': [paths['features']]}
+
+    DataLoader = import_data_loader()
+    features_paths = [
+        os.path.join(paths['preprocessed'], DataLoader.league_partition_name(league), os.path.basename(paths['features']))
+        for league in leagues
+    ]
+    tasks = [
+        (DataLoader.get_league_paths(paths['raw'], league), features_path, args.output_format, cache_dir,
+         args.rolling_window, args.streaming)
+        for league, features_path in zip(leagues, features_paths)
+    ]
+    n_workers = args.n_workers or min(len(leagues), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = list(executor.map(build_features, *zip(*tasks)))
+
+    concatenate_csv(features_paths, paths['features'])
+    state['features_rows'] = sum(result['rows_out'] for result in results)
+
+    return {
+        'rows_in': sum(result['rows_in'] for result in results),
+        'rows_out': state['features_rows'],
+        'outputs': features_paths + [paths['features']],
+        'leagues': {league: result['rows_out'] for league, result in zip(leagues, results)},
+    }
+
+
+def run_split(args, paths, state):
+    """Splits the features into train, validation and test sets, kept in memory for training."""
+    state['split'] = split_data_for_training(args.n_older_seasons, paths['features'], args.stage)
+    X_trn, y_trn, X_val, y_val, X_tst, y_tst = state['split']
+
+    return {
+        'rows_in': state.get('features_rows'),
+        'rows_out': len(X_trn) + len(X_val) + len(X_tst),
+        'output_bytes': int(sum(np.sum(part.memory_usage(deep=True)) for part in state['split'])),
+        'rows': {'train': len(X_trn), 'validation': len(X_val), 'test': len(X_tst)},
+    }
+
+
+def run_train(args, paths, state):
+    """Fits the XGBoost model on the split and saves it."""
+    from sklearn.metrics import f1_score
+    from xgboost import XGBClassifier
+
+    if 'split' not in state:
+        state['split'] = split_data_for_training(args.n_older_seasons, paths['features'], args.stage)
+    X_trn, y_trn, X_val, y_val, X_tst, y_tst = state['split']
+
+    model = XGBClassifier(**XGB_PARAMS)
+    model.fit(X_trn, y_trn, eval_set=[(X_trn, y_trn), (X_val, y_val)], verbose=False)
+    y_pred = model.predict(X_tst)
+
+    os.makedirs(os.path.dirname(paths['model']), exist_ok=True)
+    model.save_model(paths['model'])
+
+    return {
+        'rows_in': len(X_trn) + len(X_val),
+        'rows_out': len(y_pred),
+        'outputs': [paths['model']],
+        'f1_test': float(f1_score(y_tst, y_pred)),
+    }
+
+
+stage_functions = {
+    'ingest': run_ingest,
+    'features': run_features,
+    'split': run_split,
+    'train': run_train,
+}
+
+
+def profile_stage(name, function, *args):
+    """
+    Runs one stage and measures it.
+
+    Parameters:
+    - name: stage name.
+    - function: stage function returning a dict with 'rows_in', 'rows_out' and either 'outputs'
+      (paths written) or 'output_bytes', plus stage specific details.
+
+    Returns:
+    - Report dict with the stage name, wall time, CPU time, peak RSS, rows in and out, output bytes
+      and the stage details. Peak RSS is that of the main process, CPU time includes worker processes.
+      rows_in is None when the stage cannot tell, e.g. split reading features of an earlier run.
+    """
+    reset_peak_rss()
+    cpu_start = get_cpu_time()
+    wall_start = time.perf_counter()
+
+    result = function(*args)
+
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = get_cpu_time() - cpu_start
+    peak_rss = get_peak_rss()
+
+    outputs = result.pop('outputs', [])
+    output_bytes = result.pop('output_bytes', None)
+    if output_bytes is None:
+        output_bytes = sum(get_path_bytes(path) for path in outputs)
+
+    report = {
+        'stage': name,
+        'wall_time_s': round(wall_time, 6),
+        'cpu_time_s': round(cpu_time, 6),
+        'peak_rss_bytes': peak_rss,
+        'rows_in': result.pop('rows_in'),
+        'rows_out': result.pop('rows_out'),
+        'output_bytes': output_bytes,
+    }
+    if result:
+        report['details'] = result
+    return report
+
+
+def run_pipeline(args):
+    """Runs the selected stages in pipeline order and returns their reports."""
+    unknown = [stage for stage in args.stages if stage not in stage_functions]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown}, choose from {STAGES}")
+
+    paths = get_paths(args.data_dir)
+    state = {}
+    reports = []
+    for name in STAGES:
+        if name not in args.stages:
+            continue
+        logging.info(f"Running stage '{name}'.")
+        reports.append(profile_stage(name, stage_functions[name], args, paths, state))
+        logging.info(f"Stage '{name}' took {reports[-1]['wall_time_s']:.1f} s.")
+
+    return reports
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the football features and train the model.")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES,
+                        help="stages to run, always in pipeline order (default: all)")
+    parser.add_argument('--data-dir', default=os.path.join(REPO_ROOT, 'data'),
+                        help="directory holding database.sqlite and the outputs")
+    parser.add_argument('--report', default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument('--output-format', default='csv', choices=['csv', 'parquet', 'feather'],
+                        help="format of the raw tables")
+    parser.add_argument('--leagues', nargs='+', default=None,
+                        help="build these leagues, or 'all', each in its own league= partition (default: the "
+                             "single league layout of the data loader)")
+    parser.add_argument('--n-workers', type=int, default=None,
+                        help="processes parsing the match XML (default: 1), or with --leagues leagues built at "
+                             "once (default: one per league)")
+    parser.add_argument('--xml-workers', type=int, default=1,
+                        help="with --leagues, processes parsing the match XML within each league")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="matches per XML parsing task")
+    parser.add_argument('--read-chunksize', type=int, default=None, help="rows read from SQLite at a time")
+    parser.add_argument('--rolling-window', type=int, default=10, help="window of the rolling team statistics")
+    parser.add_argument('--no-cache', action='store_true', help="recompute every feature stage")
+    parser.add_argument('--streaming', action='store_true',
+                        help="build the features one season at a time, without the stage cache")
+    parser.add_argument('--n-older-seasons', type=int, default=7, help="older seasons in the training set")
+    parser.add_argument('--stage', type=int, default=3, help="stage of the newest season used as test set")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    args = parse_args(argv)
+    report = json.dumps({'stages': run_pipeline(args)}, indent=2)
+
+    if args.report is None:
+        print(report)
+    else:
+        with open(args.report, 'w') as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
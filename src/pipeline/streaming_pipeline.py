@@ -0,0 +1,318 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.helper import rolling_avg
+from src.pipeline.feature_pipeline import (
+    add_comparisons,
+    add_points,
+    add_team_ratings,
+    drop_player_ratings,
+    merge_player_stats,
+    prepare_matches,
+)
+from src.playerstats.player_stats import get_player_ratings, impute_player_ids, players_cols
+from src.shiftdata.shift_data import ShiftDataPreprocessor
+
+# get_player_stats always imputes missing ids from the team's last 10 matches on the same side.
+N_IMPUTE = 10
+
+
+class RollingMeanState:
+    """
+    Accumulators of pandas' rolling mean for one series, updated one value at a time.
+
+    add and remove repeat the steps of pandas' roll_mean kernel (Kahan summation, the count of
+    negative values and the run of repeated values), so a window moved forward here ends with
+    exactly the floats pandas has after moving over the same values.
+
+    This mirrors the private roll_mean of pandas 2.2.x (pandas/_libs/window/aggregations.pyx), so
+    bit-identity only holds for the pandas version pinned in requirements.txt.
+    test_team_rolling_state_matches_pandas fails when a pandas upgrade changes the kernel.
+    """
+
+    def __init__(self, first_value):
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = first_value
+
+    def add(self, value):
+        if value != value:
+            return
+        self.nobs += 1
+        y = value - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct += 1
+        self.num_consecutive_same_value = self.num_consecutive_same_value + 1 if value == self.prev_value else 1
+        self.prev_value = value
+
+    def remove(self, value):
+        if value != value:
+            return
+        self.nobs -= 1
+        y = -value - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct -= 1
+
+    def value(self):
+        """Mean of the window with min_periods=1, NaN for a window without values."""
+        if self.nobs == 0:
+            return math.nan
+        if self.num_consecutive_same_value >= self.nobs:
+            return self.prev_value
+        result = self.sum_x / self.nobs
+        if (self.neg_ct == 0 and result < 0) or (self.neg_ct == self.nobs and result > 0):
+            return 0.0
+        return result
+
+
+class RollingVarState:
+    """
+    Accumulators of pandas' rolling variance (Welford with Kahan summation), see RollingMeanState.
+
+    Mirrors the private roll_var of pandas 2.2.x (pandas/_libs/window/aggregations.pyx), with the
+    same version caveat as RollingMeanState.
+    """
+
+    def __init__(self, first_value):
+        self.nobs = 0.0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = first_value
+
+    def add(self, value):
+        if value != value:
+            return
+        self.nobs += 1
+        self.num_consecutive_same_value = self.num_consecutive_same_value + 1 if value == self.prev_value else 1
+        self.prev_value = value
+        prev_mean = self.mean_x - self.compensation_add
+        y = value - self.compensation_add
+        t = y - self.mean_x
+        self.compensation_add = t + self.mean_x - y
+        self.mean_x = self.mean_x + t / self.nobs
+        self.ssqdm_x = self.ssqdm_x + (value - prev_mean) * (value - self.mean_x)
+
+    def remove(self, value):
+        if value != value:
+            return
+        self.nobs -= 1
+        if self.nobs:
+            prev_mean = self.mean_x - self.compensation_remove
+            y = value - self.compensation_remove
+            t = y - self.mean_x
+            self.compensation_remove = t + self.mean_x - y
+            self.mean_x = self.mean_x - t / self.nobs
+            self.ssqdm_x = self.ssqdm_x - (value - prev_mean) * (value - self.mean_x)
+        else:
+            self.mean_x = 0.0
+            self.ssqdm_x = 0.0
+
+    def std(self):
+        """Sample standard deviation of the window with min_periods=1, NaN below two values."""
+        if self.nobs <= 1:
+            return math.nan
+        if self.num_consecutive_same_value >= self.nobs:
+            return 0.0
+        variance = self.ssqdm_x / (self.nobs - 1)
+        return math.sqrt(variance) if variance >= 0 else 0.0
+
+
+class TeamRollingState:
+    """
+    Trailing window of the last window_size values of one team, with the accumulators pandas keeps
+    for it when rolling over the team's rows with SegmentWindowIndexer and min_periods=1.
+    """
+
+    def __init__(self, window_size, with_std=True):
+        self.window_size = window_size
+        self.with_std = with_std
+        self.values = deque()
+        self.mean = None
+        self.var = None
+
+    def push(self, value):
+        """Moves the window over the team's next value."""
+        if self.mean is None or self.window_size == 1:
+            # pandas starts new accumulators when a window shares no row with the previous one.
+            self.values = deque([value])
+            self.mean = RollingMeanState(value)
+            self.var = RollingVarState(value) if self.with_std else None
+        else:
+            if len(self.values) == self.window_size:
+                removed = self.values.popleft()
+                self.mean.remove(removed)
+                if self.with_std:
+                    self.var.remove(removed)
+            self.values.append(value)
+        self.mean.add(value)
+        if self.with_std:
+            self.var.add(value)
+
+
+class StreamingState:
+    """
+    What the streaming pipeline carries from one season to the next.
+
+    - lineup_history: the matches among the last N_IMPUTE of their home team or of their away team,
+      with the original lineups, to impute missing player ids of the next season.
+    - last_values / shift_states: per team the features of its last match and the rolling mean
+      used to fill missing previous match values.
+    - rolling_states: per team and rolling_avg source the window of calculate_rolling_avg_pandas.
+    """
+
+    def __init__(self):
+        self.lineup_history = None
+        self.last_values = {}
+        self.shift_states = {}
+        self.rolling_states = {}
+        self.last_season = None
+        self.last_date = None
+
+
+def iter_season_partitions(match_details, match_lineups):
+    """
+    Splits the raw tables into seasons, oldest first.
+
+    Returns:
+    - Generator of (match_details, match_lineups) of one season, rows in their original order.
+    """
+    for season in sorted(match_details['season'].unique()):
+        season_matches = match_details[match_details['season'] == season]
+        yield season_matches, match_lineups[match_lineups['match_api_id'].isin(season_matches['match_api_id'])]
+
+
+def update_lineup_history(matches):
+    """Rows of matches that are among the last N_IMPUTE of their home team or their away team."""
+    is_recent = (
+        (matches.groupby('home_team').cumcount(ascending=False) < N_IMPUTE)
+        | (matches.groupby('away_team').cumcount(ascending=False) < N_IMPUTE)
+    )
+    return matches[is_recent].reset_index(drop=True)
+
+
+def stream_player_stats(matches, player_attributes, state, n_previous):
+    """compute_player_stats for one season, imputing from the season and the carried lineup history."""
+    lineups = matches[['match_api_id', 'date', 'home_team', 'away_team'] + players_cols]
+    if state.lineup_history is not None:
+        lineups = pd.concat([state.lineup_history, lineups], ignore_index=True)
+    n_history = len(lineups) - len(matches)
+
+    imputed, _ = impute_player_ids(lineups, players_cols)
+    state.lineup_history = update_lineup_history(lineups)
+
+    imputed = imputed.iloc[n_history:].reset_index(drop=True)
+    # Ratings of a player only depend on his own snapshots.
+    player_ids = pd.unique(imputed[players_cols].to_numpy().ravel())
+    player_attributes = player_attributes[player_attributes['player_api_id'].isin(player_ids)]
+    return get_player_ratings(imputed, player_attributes, players_cols, n_previous)
+
+
+def stream_shift_features(df, state, features_to_shift, window_size=5):
+    """shift_match_features for one season, continuing the shifted values and fill windows of every team."""
+    preprocessor = ShiftDataPreprocessor(df)
+    home_df = preprocessor.select_and_rename_columns('home_')
+    away_df = preprocessor.select_and_rename_columns('away_')
+    team_df = preprocessor.concatenate_teams(home_df, away_df)
+
+    teams = team_df['team'].to_numpy()
+    values = team_df[list(features_to_shift)].to_numpy(dtype=np.float64)
+    filled = np.empty_like(values)
+
+    for i, team in enumerate(teams):
+        shifted = state.last_values.get(team)
+        if shifted is None:
+            shifted = np.full(len(features_to_shift), np.nan)
+            state.shift_states[team] = [TeamRollingState(window_size, with_std=False) for _ in features_to_shift]
+
+        for j, feature_state in enumerate(state.shift_states[team]):
+            is_missing = np.isnan(shifted[j]) or shifted[j] == 0
+            feature_state.push(np.nan if is_missing else shifted[j])
+            filled[i, j] = feature_state.mean.value() if is_missing else shifted[j]
+        state.last_values[team] = values[i]
+
+    shifted_df = team_df.copy()
+    for j, feature in enumerate(features_to_shift):
+        shifted_df[f"{feature}_shifted"] = filled[:, j]
+
+    keep = ~(np.isnan(filled) | (filled == 0)).any(axis=1)
+    return preprocessor.merge_shifted_features(shifted_df[keep])
+
+
+def stream_rolling_avg(df, state, window):
+    """calculate_rolling_avg_pandas for one season, continuing the rolling window of every team."""
+    sources = rolling_avg.get_sources(df)
+    team_matches, order = rolling_avg.get_team_matches(df, sources)
+
+    rolled_mean = np.empty((len(team_matches), len(sources)))
+    rolled_std = np.empty((len(team_matches), len(sources)))
+    values = team_matches[sources].to_numpy(dtype=np.float64)
+
+    for i, team in enumerate(team_matches['team'].to_numpy()):
+        team_states = state.rolling_states.setdefault(team, {})
+        for j, source in enumerate(sources):
+            source_state = team_states.setdefault(source, TeamRollingState(window))
+            source_state.push(values[i, j])
+            rolled_mean[i, j] = source_state.mean.value()
+            rolled_std[i, j] = source_state.var.std()
+
+    rolled_mean = pd.DataFrame(rolled_mean, columns=sources).fillna(0)
+    rolled_std = pd.DataFrame(rolled_std, columns=sources).fillna(0)
+    return rolling_avg.write_rolling_stats(df, sources, team_matches, order, rolled_mean, rolled_std)
+
+
+def stream_features(partitions, player_attributes, n_previous=10,
+                    features_to_shift=('team_goal', 'team_shoton', 'team_possession'), rolling_window=10,
+                    state=None):
+    """
+    The preprocessing pipeline one season at a time.
+
+    Every feature only looks back in time, so each season is computed from its own matches and
+    a small per-team state carried over from the seasons before it: the recent lineups, the last
+    match values and the rolling windows, see StreamingState. Memory is bounded by one season and
+    the number of teams, and concatenating the yielded frames with ignore_index=True gives exactly
+    the 'preprocessed' output of build_preprocessing_pipeline for the same parameters.
+
+    Parameters:
+    - partitions: iterable of (match_details, match_lineups) of one season each, oldest first,
+      e.g. iter_season_partitions. Seasons must not overlap in time.
+    - player_attributes: the player attributes table, read whole.
+    - n_previous, features_to_shift, rolling_window: parameters of the pipeline stages.
+    - state: StreamingState to continue from, a new one if None.
+
+    Returns:
+    - Generator of the preprocessed frame of every season.
+    """
+    state = StreamingState() if state is None else state
+    player_attributes = player_attributes.assign(date=pd.to_datetime(player_attributes['date']))
+
+    for match_details, match_lineups in partitions:
+        matches = prepare_matches(match_details, match_lineups)
+        seasons = matches['season'].unique()
+        if len(seasons) != 1:
+            raise ValueError(f"A partition must hold one season, got {list(seasons)}")
+        if state.last_season is not None and (
+                seasons[0] <= state.last_season or matches['date'].min() <= state.last_date):
+            raise ValueError(f"Season {seasons[0]} does not follow season {state.last_season}")
+        state.last_season = seasons[0]
+        state.last_date = matches['date'].max()
+
+        df = merge_player_stats(add_points(matches), stream_player_stats(matches, player_attributes, state, n_previous))
+        df = stream_shift_features(df, state, features_to_shift)
+        df = stream_rolling_avg(add_team_ratings(df), state, rolling_window)
+        yield add_comparisons(drop_player_ratings(df))
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def raw_inputs():
+    rng = np.random.default_rng(0)
+    n_matches, n_teams = 60, 6
+    home_team = rng.integers(0, n_teams, n_matches)
+    match_details = pd.DataFrame({
+        'match_api_id': np.arange(n_matches),
+        'season': np.where(np.arange(n_matches) < 30, '2014/2015', '2015/2016'),
+        'stage': np.arange(n_matches) % 30 // 3 + 1,
+        'date': (pd.Timestamp('2014-08-01') + pd.to_timedelta(np.arange(n_matches) * 4, 'D')).strftime('%Y-%m-%d'),
+        'home_team': home_team,
+        'away_team': (home_team + rng.integers(1, n_teams, n_matches)) % n_teams,
+        'home_team_goal': rng.integers(0, 4, n_matches),
+        'away_team_goal': rng.integers(0, 4, n_matches),
+        'home_shoton': rng.integers(0, 8, n_matches).astype(float),
+        'away_shoton': rng.integers(0, 8, n_matches).astype(float),
+        'home_possession': rng.uniform(30, 70, n_matches).round(),
+    })
+    match_details['away_possession'] = 100 - match_details['home_possession']
+    match_details['result_match'] = np.select(
+        [match_details['home_team_goal'] > match_details['away_team_goal'],
+         match_details['home_team_goal'] < match_details['away_team_goal']],
+        ['H', 'A'], 'D'
+    )
+
+    match_lineups = pd.DataFrame([
+        {'match_api_id': match, 'side': side, 'slot': slot,
+         'player_api_id': float(1000 * (team + 1) + slot)}
+        for match, home, away in match_details[['match_api_id', 'home_team', 'away_team']].itertuples(index=False)
+        for side, team in [('home', home), ('away', away)]
+        for slot in range(1, 12)
+    ])
+
+    player_ids = match_lineups['player_api_id'].unique()
+    player_attributes = pd.DataFrame({
+        'player_api_id': np.repeat(player_ids, 2),
+        'date': np.tile(['2014-01-01', '2015-01-01'], len(player_ids)),
+        'overall_rating': rng.integers(50, 90, 2 * len(player_ids)),
+        'acceleration': rng.integers(50, 90, 2 * len(player_ids)),
+        'strength': rng.integers(50, 90, 2 * len(player_ids)),
+        'aggression': rng.integers(50, 90, 2 * len(player_ids)),
+    })
+
+    return {'match_details': match_details, 'match_lineups': match_lineups, 'player_attributes': player_attributes}
+
+
+@pytest.fixture
+def multi_season_inputs():
+    """Four seasons in shuffled order, with missing lineup slots, shots and possession values."""
+    rng = np.random.default_rng(1)
+    n_teams = 8
+    matches = []
+    for i in range(4):
+        for stage in range(1, 2 * (n_teams - 1) + 1):
+            teams = rng.permutation(n_teams) * 7 + 100
+            for home_team, away_team in zip(teams[::2], teams[1::2]):
+                matches.append({
+                    'season': f'{2010 + i}/{2011 + i}',
+                    'stage': stage,
+                    'date': (pd.Timestamp(f'{2010 + i}-08-01') + pd.Timedelta(days=7 * stage + int(rng.integers(0, 2))))
+                    .strftime('%Y-%m-%d'),
+                    'home_team': home_team,
+                    'away_team': away_team,
+                })
+
+    match_details = pd.DataFrame(matches)
+    n_matches = len(match_details)
+    match_details.insert(0, 'match_api_id', np.arange(n_matches))
+    match_details['home_team_goal'] = rng.integers(0, 5, n_matches)
+    match_details['away_team_goal'] = rng.integers(0, 5, n_matches)
+    match_details['home_shoton'] = rng.choice([0, 1, 2, 3, 5, 8, np.nan], n_matches)
+    match_details['away_shoton'] = rng.choice([0, 1, 2, 3, 4, np.nan], n_matches)
+    match_details['home_possession'] = rng.choice([0, 33.3, 47.1, 55.5, 61.9, np.nan], n_matches)
+    match_details['away_possession'] = 100 - match_details['home_possession']
+    match_details['result_match'] = np.select(
+        [match_details['home_team_goal'] > match_details['away_team_goal'],
+         match_details['home_team_goal'] < match_details['away_team_goal']],
+        ['H', 'A'], 'D'
+    )
+    match_details = match_details.sample(frac=1, random_state=1).reset_index(drop=True)
+
+    match_lineups = pd.DataFrame([
+        {'match_api_id': match, 'side': side, 'slot': slot,
+         'player_api_id': np.nan if rng.random() < 0.05 else float(team * 100 + rng.integers(0, 14))}
+        for match, home, away in match_details[['match_api_id', 'home_team', 'away_team']].itertuples(index=False)
+        for side, team in [('home', home), ('away', away)]
+        for slot in range(1, 12)
+    ])
+
+    player_ids = match_lineups['player_api_id'].dropna().unique()
+    n_snapshots = 6
+    player_attributes = pd.DataFrame({
+        'player_api_id': np.repeat(player_ids, n_snapshots),
+        'date': np.tile(pd.date_range('2009-01-01', '2014-06-01', periods=n_snapshots).strftime('%Y-%m-%d'), len(player_ids)),
+        **{
+            attribute: rng.integers(40, 90, n_snapshots * len(player_ids)).astype(float)
+            for attribute in ['overall_rating', 'acceleration', 'strength', 'aggression']
+        }
+    })
+
+    return {'match_details': match_details, 'match_lineups': match_lineups, 'player_attributes': player_attributes}
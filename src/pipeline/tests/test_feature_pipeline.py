@@ -0,0 +1,112 @@
+import importlib
+import linecache
+
+import pandas as pd
+import pytest
+
+from src.pipeline.feature_pipeline import FeaturePipeline, Stage, build_preprocessing_pipeline, hash_frame
+
+
+def add_column(df, value=1):
+    return df.assign(b=df['a'] + value)
+
+
+def multiply_column(df, factor=2):
+    return df.assign(c=df['b'] * factor)
+
+
+@pytest.fixture
+def toy_pipeline(tmp_path):
+    return FeaturePipeline([
+        Stage('added', add_column, ['raw'], {'value': 1}),
+        Stage('multiplied', multiply_column, ['added'], {'factor': 2}),
+    ], cache_dir=str(tmp_path))
+
+
+def test_hash_frame_depends_on_values_and_dtypes():
+    df = pd.DataFrame({'a': [1, 2, 3]})
+
+    assert hash_frame(df) == hash_frame(df.copy())
+    assert hash_frame(df) != hash_frame(df.assign(a=[1, 2, 4]))
+    assert hash_frame(df) != hash_frame(df.astype(float))
+
+
+def test_second_run_is_cached(toy_pipeline):
+    raw = pd.DataFrame({'a': [1, 2, 3]})
+
+    first = toy_pipeline.run({'raw': raw})
+    assert toy_pipeline.stage_status == {'added': 'computed', 'multiplied': 'computed'}
+
+    second = toy_pipeline.run({'raw': raw})
+    assert toy_pipeline.stage_status == {'added': 'cached', 'multiplied': 'cached'}
+    pd.testing.assert_frame_equal(second['multiplied'], first['multiplied'])
+
+
+def test_param_change_only_invalidates_downstream(toy_pipeline):
+    raw = pd.DataFrame({'a': [1, 2, 3]})
+    toy_pipeline.run({'raw': raw})
+
+    result = toy_pipeline.run({'raw': raw}, params={'multiplied': {'factor': 3}})
+
+    assert toy_pipeline.stage_status == {'added': 'cached', 'multiplied': 'computed'}
+    assert result['multiplied']['c'].tolist() == [6, 9, 12]
+
+
+def test_input_change_invalidates_all_stages(toy_pipeline):
+    toy_pipeline.run({'raw': pd.DataFrame({'a': [1, 2, 3]})})
+
+    result = toy_pipeline.run({'raw': pd.DataFrame({'a': [1, 2, 4]})}, targets=['added'])
+
+    assert toy_pipeline.stage_status == {'added': 'computed'}
+    assert result['added']['b'].tolist() == [2, 3, 5]
+
+
+def test_dependency_change_changes_code_hash(tmp_path, monkeypatch):
+    module_path = tmp_path / 'stage_dependency.py'
+    module_path.write_text("def offset():\n    return 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    dependency = importlib.import_module('stage_dependency')
+    stage = Stage('added', add_column, ['raw'], dependencies=[dependency])
+    before = stage.get_code_hash()
+
+    module_path.write_text("def offset():\n    return 2\n")
+    linecache.checkcache(str(module_path))
+
+    assert stage.get_code_hash() != before
+    assert Stage('added', add_column, ['raw']).get_code_hash() != before
+
+
+def test_unknown_stage_input_raises():
+    pipeline = FeaturePipeline([Stage('added', add_column, ['missing'])])
+
+    with pytest.raises(ValueError):
+        pipeline.run({'raw': pd.DataFrame({'a': [1]})})
+
+
+def test_preprocessing_pipeline_cached_run_matches(tmp_path, raw_inputs):
+    pipeline = build_preprocessing_pipeline(cache_dir=str(tmp_path))
+    uncached = build_preprocessing_pipeline().run(raw_inputs, targets=['preprocessed'])['preprocessed']
+
+    first = pipeline.run(raw_inputs, targets=['preprocessed'])['preprocessed']
+    assert set(pipeline.stage_status.values()) == {'computed'}
+
+    second = pipeline.run(raw_inputs, targets=['preprocessed'])['preprocessed']
+    assert pipeline.stage_status == {'preprocessed': 'cached'}
+
+    assert len(uncached) > 0
+    assert 'rolling_avg_goals_diff' in uncached.columns
+    pd.testing.assert_frame_equal(first, uncached)
+    pd.testing.assert_frame_equal(second, uncached)
+
+
+def test_preprocessing_pipeline_rolling_window_change(tmp_path, raw_inputs):
+    pipeline = build_preprocessing_pipeline(cache_dir=str(tmp_path))
+    pipeline.run(raw_inputs, targets=['preprocessed'])
+
+    result = pipeline.run(raw_inputs, params={'team_features': {'rolling_window': 5}}, targets=['preprocessed'])['preprocessed']
+
+    assert pipeline.stage_status == {'shifted': 'cached', 'team_features': 'computed', 'preprocessed': 'computed'}
+    expected = build_preprocessing_pipeline().run(
+        raw_inputs, params={'team_features': {'rolling_window': 5}}, targets=['preprocessed']
+    )['preprocessed']
+    pd.testing.assert_frame_equal(result, expected)
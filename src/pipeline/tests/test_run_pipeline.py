@@ -0,0 +1,101 @@
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.pipeline import run_pipeline
+from src.pipeline.feature_pipeline import build_preprocessing_pipeline
+
+
+def write_raw_tables(data_dir, raw_inputs):
+    os.makedirs(os.path.join(data_dir, 'raw'))
+    paths = run_pipeline.get_paths(data_dir)
+    for name, df in raw_inputs.items():
+        df.to_csv(paths[name], index=False)
+    return paths
+
+
+def test_profile_stage_report(tmp_path):
+    output_path = tmp_path / 'out.bin'
+
+    def stage():
+        np.ones(10 ** 6).tofile(output_path)
+        return {'rows_in': 3, 'rows_out': 2, 'outputs': [str(output_path)], 'note': 'x'}
+
+    report = run_pipeline.profile_stage('dummy', stage)
+
+    assert report['stage'] == 'dummy'
+    assert report['rows_in'] == 3
+    assert report['rows_out'] == 2
+    assert report['output_bytes'] == 8 * 10 ** 6
+    assert report['peak_rss_bytes'] >= 8 * 10 ** 6
+    assert report['wall_time_s'] >= 0
+    assert report['cpu_time_s'] >= 0
+    assert report['details'] == {'note': 'x'}
+
+
+def test_features_and_split_stages(tmp_path, raw_inputs):
+    paths = write_raw_tables(str(tmp_path), raw_inputs)
+    report_path = tmp_path / 'report.json'
+
+    run_pipeline.main(['--stages', 'split', 'features', '--data-dir', str(tmp_path), '--report', str(report_path),
+                       '--n-older-seasons', '1', '--stage', '3'])
+
+    reports = json.loads(report_path.read_text())['stages']
+    assert [report['stage'] for report in reports] == ['features', 'split']
+
+    features, split = reports
+    assert features['rows_in'] == sum(len(df) for df in raw_inputs.values())
+    assert features['output_bytes'] == os.path.getsize(paths['features'])
+    assert set(features['details']['stage_status'].values()) == {'computed'}
+    assert split['rows_in'] == features['rows_out']
+    assert split['rows_out'] == sum(split['details']['rows'].values())
+    assert split['details']['rows']['test'] == 3
+
+
+def test_features_stage_uses_cache(tmp_path, raw_inputs):
+    write_raw_tables(str(tmp_path), raw_inputs)
+    args = run_pipeline.parse_args(['--stages', 'features', '--data-dir', str(tmp_path)])
+
+    run_pipeline.run_pipeline(args)
+    report, = run_pipeline.run_pipeline(args)
+
+    assert report['details']['stage_status'] == {'preprocessed': 'cached'}
+
+
+def test_streaming_features_stage_matches_batch(tmp_path, multi_season_inputs):
+    paths = write_raw_tables(str(tmp_path), multi_season_inputs)
+
+    run_pipeline.main(['--stages', 'features', '--data-dir', str(tmp_path), '--no-cache', '--report', str(tmp_path / 'batch.json')])
+    batch = open(paths['features']).read()
+    run_pipeline.main(['--stages', 'features', '--data-dir', str(tmp_path), '--streaming', '--report', str(tmp_path / 'stream.json')])
+
+    assert open(paths['features']).read() == batch
+    assert json.loads((tmp_path / 'stream.json').read_text())['stages'][0]['rows_out'] == batch.count('\n') - 1
+
+
+def test_multi_league_features(tmp_path, raw_inputs, multi_season_inputs):
+    data_dir = str(tmp_path)
+    DataLoader = run_pipeline.import_data_loader()
+    league_inputs = {'England Premier League': raw_inputs, 'Spain LIGA BBVA': multi_season_inputs}
+    for league, inputs in league_inputs.items():
+        league_paths = DataLoader.get_league_paths(os.path.join(data_dir, 'raw'), league)
+        os.makedirs(os.path.dirname(league_paths['match_details']))
+        for name, df in inputs.items():
+            df.to_csv(league_paths[name], index=False)
+
+    args = run_pipeline.parse_args(['--stages', 'features', '--data-dir', data_dir, '--leagues', 'all', '--no-cache'])
+    report, = run_pipeline.run_pipeline(args)
+
+    paths = run_pipeline.get_paths(data_dir)
+    combined = pd.read_csv(paths['features'])
+    assert report['rows_out'] == len(combined) == sum(report['details']['leagues'].values())
+    assert list(report['details']['leagues']) == list(league_inputs)
+
+    for league, inputs in league_inputs.items():
+        league_features = os.path.join(paths['preprocessed'], DataLoader.league_partition_name(league), 'preprocessed_1.csv')
+        expected = build_preprocessing_pipeline().run(inputs, targets=['preprocessed'])['preprocessed']
+        assert report['details']['leagues'][league] == len(expected)
+        pd.testing.assert_frame_equal(pd.read_csv(league_features), pd.read_csv(io.StringIO(expected.to_csv(index=False))))
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.helper.window_indexer import SegmentWindowIndexer
+from src.pipeline.feature_pipeline import build_preprocessing_pipeline
+from src.pipeline.streaming_pipeline import StreamingState, TeamRollingState, iter_season_partitions, stream_features
+
+
+@pytest.mark.parametrize('window_size', [1, 3, 10])
+def test_team_rolling_state_matches_pandas(window_size):
+    """Canary for the pandas 2.2.x window kernels that RollingMeanState and RollingVarState mirror."""
+    rng = np.random.default_rng(window_size)
+    values = rng.choice([0, 1 / 3, 2 / 7, 0.1, -1.25, 2.0, 2.0, 2.0, np.nan], 300)
+    rolling = pd.Series(values).rolling(
+        SegmentWindowIndexer(window_size=window_size, segment_starts=np.zeros(len(values), dtype=np.int64)),
+        min_periods=1
+    )
+
+    state = TeamRollingState(window_size)
+    means, stds = [], []
+    for value in values:
+        state.push(value)
+        means.append(state.mean.value())
+        stds.append(state.var.std())
+
+    np.testing.assert_array_equal(means, rolling.mean().to_numpy())
+    np.testing.assert_array_equal(stds, rolling.std().to_numpy())
+
+
+@pytest.mark.parametrize('rolling_window', [1, 10])
+def test_stream_features_matches_batch(multi_season_inputs, rolling_window):
+    params = {'team_features': {'rolling_window': rolling_window}}
+    expected = build_preprocessing_pipeline().run(multi_season_inputs, params=params, targets=['preprocessed'])
+
+    partitions = iter_season_partitions(multi_season_inputs['match_details'], multi_season_inputs['match_lineups'])
+    seasons = list(stream_features(partitions, multi_season_inputs['player_attributes'], rolling_window=rolling_window))
+
+    assert len(seasons) == 4
+    pd.testing.assert_frame_equal(pd.concat(seasons, ignore_index=True), expected['preprocessed'], check_exact=True)
+
+
+def test_stream_features_resumes_from_state(multi_season_inputs):
+    partitions = list(iter_season_partitions(multi_season_inputs['match_details'], multi_season_inputs['match_lineups']))
+    player_attributes = multi_season_inputs['player_attributes']
+    expected = list(stream_features(partitions, player_attributes))
+
+    state = StreamingState()
+    first = list(stream_features(partitions[:2], player_attributes, state=state))
+    rest = list(stream_features(partitions[2:], player_attributes, state=state))
+
+    for result, expected_season in zip(first + rest, expected):
+        pd.testing.assert_frame_equal(result, expected_season, check_exact=True)
+
+
+def test_stream_features_rejects_unordered_seasons(multi_season_inputs):
+    partitions = list(iter_season_partitions(multi_season_inputs['match_details'], multi_season_inputs['match_lineups']))
+
+    with pytest.raises(ValueError):
+        list(stream_features(partitions[::-1], multi_season_inputs['player_attributes']))
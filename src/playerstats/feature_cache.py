@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.playerstats.player_attribute_index import PlayerAttributeIndex
+from src.playerstats.player_stats import get_player_ratings, impute_player_ids, rating_columns
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class PlayerFeatureCache:
+    """
+    On-disk cache of the per-match rating columns built by get_player_stats.
+
+    Every match gets a key hashed from its id, date, imputed lineup, the content of the attribute
+    snapshots each player's ratings are averaged over, the requested slots and n_previous. A
+    match is only recomputed when that key is not stored yet, so new attribute snapshots or lineup
+    fixes invalidate exactly the matches they feed into.
+
+    Results are stored in Parquet segments named after the hash of their keys, one row per match
+    keyed by 'cache_key'. manifest.json records the size and last use of each segment, and the least
+    recently used segments are removed once the cache grows past max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 ** 2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.n_cached = 0
+        self.n_computed = 0
+        os.makedirs(path, exist_ok=True)
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return {'clock': 0, 'segments': {}}
+
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def save_manifest(self):
+        with open(os.path.join(self.path, MANIFEST_NAME), 'w') as f:
+            json.dump(self.manifest, f)
+
+    def segment_path(self, name):
+        return os.path.join(self.path, f"{name}.parquet")
+
+    def touch(self, name):
+        self.manifest['clock'] += 1
+        self.manifest['segments'][name]['last_used'] = self.manifest['clock']
+
+    @staticmethod
+    def get_match_keys(df_matches, index, players, n_previous=10):
+        """
+        Content key of every match, computed from already imputed player ids.
+
+        Returns:
+        - uint64 array, one key per row of df_matches.
+        """
+        config = hashlib.sha1(json.dumps([list(players), n_previous]).encode()).digest()
+        dates = pd.to_datetime(df_matches['date']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+        key_inputs = {
+            'config': np.full(len(df_matches), int.from_bytes(config[:8], 'little'), dtype=np.uint64),
+            'match_api_id': df_matches['match_api_id'].to_numpy(dtype=np.int64),
+            'date': dates,
+        }
+        for player in players:
+            player_ids = df_matches[player].to_numpy(dtype=np.float64)
+            key_inputs[player] = player_ids
+            key_inputs[f"window_{player}"] = index.window_hashes(player_ids, dates, n_previous)
+
+        return pd.util.hash_pandas_object(pd.DataFrame(key_inputs), index=False).to_numpy()
+
+    def lookup(self, keys):
+        """Stored rows of the given keys, indexed by cache_key."""
+        frames = []
+        for name in list(self.manifest['segments']):
+            segment_path = self.segment_path(name)
+            if not os.path.exists(segment_path):
+                del self.manifest['segments'][name]
+                continue
+
+            stored_keys = pd.read_parquet(segment_path, columns=['cache_key'])['cache_key']
+            is_needed = stored_keys.isin(keys).to_numpy()
+            if is_needed.any():
+                frames.append(pd.read_parquet(segment_path)[is_needed])
+                self.touch(name)
+
+        if not frames:
+            return pd.DataFrame(index=pd.Index([], dtype=np.uint64, name='cache_key'))
+
+        return pd.concat(frames, ignore_index=True).set_index('cache_key')
+
+    def store(self, df):
+        """Writes df (with a 'cache_key' column) as a new segment and evicts old segments."""
+        name = hashlib.sha1(np.sort(df['cache_key'].to_numpy()).tobytes()).hexdigest()
+        segment_path = self.segment_path(name)
+        df.to_parquet(segment_path, index=False)
+
+        self.manifest['segments'][name] = {'bytes': os.path.getsize(segment_path), 'rows': len(df)}
+        self.touch(name)
+        self.evict(keep=name)
+
+    def evict(self, keep=None):
+        """Removes least recently used segments until the cache fits in max_bytes."""
+        segments = self.manifest['segments']
+        total_bytes = sum(segment['bytes'] for segment in segments.values())
+
+        for name in sorted(segments, key=lambda name: segments[name]['last_used']):
+            if total_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+
+            total_bytes -= segments.pop(name)['bytes']
+            if os.path.exists(self.segment_path(name)):
+                os.remove(self.segment_path(name))
+
+    def get_player_stats(self, df_matches, df_player_attr, players, n_previous=10):
+        """
+        Same result as get_player_stats, computing only the matches missing from the cache.
+
+        Parameters:
+        - df_matches: match table with 'match_api_id', 'date', the team columns and the players columns.
+        - df_player_attr: player attributes DataFrame or PlayerAttributeIndex.
+        - players: slot columns to rate.
+        - n_previous: number of snapshots to average.
+
+        Returns:
+        - DataFrame with 'match_api_id' and the rating columns, one row per match in df_matches order.
+        """
+        df_matches, _ = impute_player_ids(df_matches, players, n_previous=10)
+        if not isinstance(df_player_attr, PlayerAttributeIndex):
+            df_player_attr = PlayerAttributeIndex.from_frame(df_player_attr)
+
+        columns = ['match_api_id'] + [f"{column}_{player}" for player in players for column in rating_columns.values()]
+        keys = self.get_match_keys(df_matches, df_player_attr, players, n_previous)
+
+        stored = self.lookup(keys)
+        is_cached = np.isin(keys, stored.index.to_numpy())
+        self.n_cached = int(is_cached.sum())
+        self.n_computed = len(keys) - self.n_cached
+
+        if self.n_computed:
+            computed = get_player_ratings(df_matches[~is_cached], df_player_attr, players, n_previous)
+            computed.insert(0, 'cache_key', keys[~is_cached])
+            computed = computed.drop_duplicates('cache_key')
+            self.store(computed)
+            computed = computed.set_index('cache_key')
+            stored = pd.concat([stored, computed]) if len(stored) else computed
+
+        self.save_manifest()
+        logging.info(f"Player features: {self.n_cached} matches from cache, {self.n_computed} computed.")
+
+        stored = stored[~stored.index.duplicated()]
+        return stored.reindex(keys)[columns].reset_index(drop=True)
@@ -0,0 +1,163 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Offset that keeps second timestamps from 1902 to 2106 positive in 32 bits.
+SECONDS_OFFSET = 2 ** 31
+
+
+class PlayerAttributeIndex:
+    """
+    Compact per-player store of attribute snapshots for fast "mean of the last N snapshots
+    before a date" queries.
+
+    Snapshots are kept in CSR layout: all arrays are sorted by (player_api_id, date) and the
+    snapshots of the i-th player in player_ids are rows offsets[i]:offsets[i + 1]. Prefix sums
+    and prefix counts of the non-missing values turn every window mean into two lookups, and the
+    wrapping prefix sum of row hashes gives a content fingerprint of every window the same way.
+    Dates are compared at one second resolution, finer than the daily snapshots.
+
+    The index only holds numpy arrays, so it pickles cheaply, and save/load keeps every array
+    in its own .npy file so worker processes can memory-map one shared copy.
+    """
+
+    attributes = ('overall_rating', 'acceleration', 'strength', 'aggression')
+    array_names = ('player_ids', 'offsets', 'dates', 'keys', 'values', 'prefix_sums', 'prefix_counts', 'prefix_hashes')
+
+    def __init__(self, player_ids, offsets, dates, keys, values, prefix_sums, prefix_counts, prefix_hashes):
+        self.player_ids = player_ids
+        self.offsets = offsets
+        self.dates = dates
+        self.keys = keys
+        self.values = values
+        self.prefix_sums = prefix_sums
+        self.prefix_counts = prefix_counts
+        self.prefix_hashes = prefix_hashes
+
+    @classmethod
+    def from_frame(cls, df_player_attr):
+        """
+        Builds the index from a player attributes DataFrame.
+
+        Parameters:
+        - df_player_attr: DataFrame with 'player_api_id', 'date' and the attributes columns.
+
+        Returns:
+        - PlayerAttributeIndex over all rows of df_player_attr.
+        """
+        player_api_id = df_player_attr['player_api_id'].to_numpy(dtype=np.int64)
+        dates = pd.to_datetime(df_player_attr['date']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+        order = np.lexsort((dates, player_api_id))
+        player_api_id = player_api_id[order]
+        dates = dates[order]
+
+        values = np.column_stack([
+            df_player_attr[attribute].to_numpy(dtype=np.float32, na_value=np.nan)[order]
+            for attribute in cls.attributes
+        ]).reshape(len(order), len(cls.attributes))
+
+        player_ids, starts = np.unique(player_api_id, return_index=True)
+        offsets = np.append(starts, len(player_api_id)).astype(np.int64)
+
+        is_known = ~np.isnan(values)
+        prefix_sums = np.zeros((len(order) + 1, len(cls.attributes)), dtype=np.float64)
+        prefix_sums[1:] = np.cumsum(np.where(is_known, values, 0), axis=0, dtype=np.float64)
+        prefix_counts = np.zeros((len(order) + 1, len(cls.attributes)), dtype=np.int32)
+        prefix_counts[1:] = np.cumsum(is_known, axis=0, dtype=np.int32)
+
+        row_hashes = pd.util.hash_pandas_object(
+            pd.DataFrame(np.column_stack([player_api_id, dates, values.view(np.int32)])), index=False
+        ).to_numpy()
+        prefix_hashes = np.zeros(len(order) + 1, dtype=np.uint64)
+        prefix_hashes[1:] = np.cumsum(row_hashes, dtype=np.uint64)
+
+        player_ranks = np.repeat(np.arange(len(player_ids), dtype=np.int64), np.diff(offsets))
+        keys = cls.make_keys(player_ranks, dates)
+
+        return cls(player_ids, offsets, dates, keys, values, prefix_sums, prefix_counts, prefix_hashes)
+
+    @staticmethod
+    def make_keys(player_ranks, dates):
+        """Single sortable int64 key per (player rank, date in ns), at one second resolution."""
+        seconds = np.floor_divide(dates, 10 ** 9) + SECONDS_OFFSET
+        return (player_ranks << 32) | seconds
+
+    def window_bounds(self, player_ids, dates, n_previous=10):
+        """
+        Locates the last n_previous snapshots strictly before each date.
+
+        Returns:
+        - Tuple (is_known, window_starts, window_ends): is_known marks the players present in the
+          index, the bounds are rows of the index for those players only.
+        """
+        player_ids = np.asarray(player_ids, dtype=np.float64)
+        dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+        ranks = np.searchsorted(self.player_ids, np.nan_to_num(player_ids, nan=-1))
+        safe_ranks = np.minimum(ranks, len(self.player_ids) - 1)
+        is_known = (
+            ~np.isnan(player_ids)
+            & (ranks < len(self.player_ids))
+            & (self.player_ids[safe_ranks] == player_ids)
+        ) if len(self.player_ids) else np.zeros(len(player_ids), dtype=bool)
+
+        ranks = ranks[is_known]
+        window_ends = np.searchsorted(self.keys, self.make_keys(ranks, dates[is_known]), side='left')
+        window_starts = np.maximum(self.offsets[ranks], window_ends - n_previous)
+
+        return is_known, window_starts, window_ends
+
+    def query(self, player_ids, dates, n_previous=10):
+        """
+        Mean of the last n_previous snapshots strictly before each date, for many players at once.
+
+        Parameters:
+        - player_ids: player ids, NaN for unknown players.
+        - dates: query dates, anything pd.to_datetime accepts.
+        - n_previous: number of snapshots to average.
+
+        Returns:
+        - float64 array of shape (len(player_ids), len(attributes)), NaN where there is no snapshot.
+        """
+        is_known, window_starts, window_ends = self.window_bounds(player_ids, dates, n_previous)
+        result = np.full((len(is_known), len(self.attributes)), np.nan)
+
+        sums = self.prefix_sums[window_ends] - self.prefix_sums[window_starts]
+        counts = self.prefix_counts[window_ends] - self.prefix_counts[window_starts]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[is_known] = np.where(counts > 0, sums / counts, np.nan)
+
+        return result
+
+    def window_hashes(self, player_ids, dates, n_previous=10):
+        """
+        Content fingerprint of the snapshots query averages, 0 where there is none.
+
+        Two windows holding the same snapshot rows get the same uint64 hash.
+        """
+        is_known, window_starts, window_ends = self.window_bounds(player_ids, dates, n_previous)
+        result = np.zeros(len(is_known), dtype=np.uint64)
+        result[is_known] = self.prefix_hashes[window_ends] - self.prefix_hashes[window_starts]
+        return result
+
+    def mean_last_n(self, player_id, match_date, n_previous=10):
+        """
+        Same result as get_player_overall_rating_from_previous_N_last_ for one player.
+
+        Returns:
+        - Tuple (overall_rating, acceleration, strength, aggression) means.
+        """
+        return tuple(self.query([player_id], [match_date], n_previous)[0])
+
+    def save(self, path):
+        """Writes every array to path/<name>.npy."""
+        os.makedirs(path, exist_ok=True)
+        for name in self.array_names:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Loads an index written by save, memory-mapping the arrays unless mmap_mode is None."""
+        return cls(*[np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in cls.array_names])
@@ -1,7 +1,35 @@
+import logging
+
 import numpy as np
 import pandas as pd
 
+from src.playerstats.player_attribute_index import PlayerAttributeIndex
+
+players_cols = ['{}_player_{}'.format(team, i) for team in ['home', 'away'] for i in range(1, 12)]
+
+# Player_Attributes column -> prefix of the per-slot column built from it.
+rating_columns = {
+    'overall_rating': 'overall_rating',
+    'acceleration': 'acceleration_rating',
+    'strength': 'strength_rating',
+    'aggression': 'aggression_rating',
+}
+
+
+def lineups_to_wide(df_lineups):
+    """
+    Pivots the long lineup table (match_api_id, side, slot, player_api_id) written by the data loader
+    into one row per match with the home_player_1 ... away_player_11 columns used below.
+    """
+    wide = df_lineups.pivot(index='match_api_id', columns=['side', 'slot'], values='player_api_id')
+    wide.columns = ['{}_player_{}'.format(side, slot) for side, slot in wide.columns]
+    return wide.reindex(columns=players_cols).reset_index()
+
+
 def get_player_overall_rating_from_previous_N_last_(player_id, match_date, df_player_attr,n_previous=10):
+    if isinstance(df_player_attr, PlayerAttributeIndex):
+        return df_player_attr.mean_last_n(player_id, match_date, n_previous)
+
     filtered = df_player_attr[
         (df_player_attr['player_api_id'] == player_id) &
         (df_player_attr['date'] < match_date)
@@ -50,6 +78,88 @@ def get_player_id_for_team_(
     return fallback_id
 
 
+def impute_player_ids(df_matches, players, n_previous=10):
+    """
+    Batch version of get_player_id_for_team_ that fills every missing player id at once.
+
+    Matches are sorted by (team, date) separately for the home and away sides. For each missing
+    slot the window is the team's previous n_previous matches on the same side played strictly
+    earlier, and the fallback is the most frequent id of that slot in the window. Ties are broken
+    by value_counts().idxmax() over the window, most recent match first, exactly as
+    get_player_id_for_team_ breaks them. Only the original ids are used to build the windows,
+    never imputed ones.
+
+    Parameters:
+    - df_matches: DataFrame with 'date', 'home_team', 'away_team' and the players columns.
+    - players: slot columns to fill, e.g. players_cols.
+    - n_previous: number of previous matches to take the mode over.
+
+    Returns:
+    - Tuple (df_matches with a fresh index and the slots filled as float64, number of slots imputed).
+    """
+    df_matches = df_matches.reset_index(drop=True).copy()
+    n_matches = len(df_matches)
+    dates = pd.to_datetime(df_matches['date']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    positions = np.arange(n_matches)
+    lags = np.arange(1, n_previous + 1)
+    n_imputed = 0
+    n_missing = 0
+
+    for team_type in ['home', 'away']:
+        team_players = [player for player in players if ('home' if 'home' in player else 'away') == team_type]
+        if not team_players or n_matches == 0:
+            continue
+
+        teams = df_matches[f"{team_type}_team"].to_numpy()
+        order = np.lexsort((dates, teams))
+        sorted_teams = teams[order]
+        sorted_dates = dates[order]
+
+        # First row of each team, and first row of each (team, date): rows before it in the team
+        # segment are the matches played strictly earlier.
+        is_team_start = np.r_[True, sorted_teams[1:] != sorted_teams[:-1]]
+        is_date_start = is_team_start | np.r_[True, sorted_dates[1:] != sorted_dates[:-1]]
+        team_starts = np.maximum.accumulate(np.where(is_team_start, positions, 0))
+        window_ends = np.maximum.accumulate(np.where(is_date_start, positions, 0))
+
+        for player in team_players:
+            values = df_matches[player].to_numpy(dtype=np.float64)[order]
+            missing = np.flatnonzero(np.isnan(values))
+            if len(missing) == 0:
+                continue
+
+            # Window rows, most recent first, NaN outside the team segment.
+            window_positions = window_ends[missing][:, None] - lags
+            window = np.where(
+                window_positions >= team_starts[missing][:, None],
+                values[np.maximum(window_positions, 0)],
+                np.nan
+            )
+            counts = (window[:, :, None] == window[:, None, :]).sum(axis=2)
+            fallback_ids = window[np.arange(len(missing)), counts.argmax(axis=1)]
+
+            # value_counts sorts tied counts in its own order, so rows where several ids share
+            # the highest count are resolved by value_counts itself.
+            is_tied = (
+                (counts == counts.max(axis=1, keepdims=True))
+                & (window != fallback_ids[:, None])
+                & ~np.isnan(window)
+            ).any(axis=1)
+            for i in np.flatnonzero(is_tied):
+                fallback_ids[i] = pd.Series(window[i]).value_counts().idxmax()
+
+            values[missing] = fallback_ids
+            filled = np.empty(n_matches)
+            filled[order] = values
+            df_matches[player] = filled
+
+            n_missing += len(missing)
+            n_imputed += int(np.count_nonzero(~np.isnan(fallback_ids)))
+
+    logging.info(f"Imputed {n_imputed} of {n_missing} missing player ids.")
+    return df_matches, n_imputed
+
+
 def get_player_stat(match_row, df_matches, df_player_attr, players):
     player_stats_dict = {}
     match_date = match_row['date']
@@ -83,3 +193,119 @@ def get_player_stat(match_row, df_matches, df_player_attr, players):
         player_stats_dict[aggression_rating_col_name] = aggression_rating if not np.isnan(aggression_rating) else np.nan
 
     return player_stats_dict
+
+
+def get_lineup_ratings(df_lineups, df_player_attr, n_previous=10):
+    """
+    As-of join of player ratings onto lineup rows, the batch form of
+    get_player_overall_rating_from_previous_N_last_.
+
+    Every attribute is first averaged over a rolling window of the last n_previous snapshots of
+    each player. Each lineup row then takes the window ending at the player's last snapshot
+    strictly before the row's date.
+
+    Parameters:
+    - df_lineups: DataFrame with 'date' and 'player_api_id' columns, one row per (match, slot),
+      e.g. the long lineup table written by the data loader joined with the match dates.
+    - df_player_attr: player attributes with 'player_api_id', 'date' and the rating_columns keys,
+      or a PlayerAttributeIndex built from them.
+    - n_previous: number of snapshots to average.
+
+    Returns:
+    - df_lineups with one column per rating_columns value, NaN where no snapshot exists.
+    """
+    if isinstance(df_player_attr, PlayerAttributeIndex):
+        means = df_player_attr.query(df_lineups['player_api_id'], df_lineups['date'], n_previous)
+        lineups = df_lineups.copy()
+        for attribute, column in rating_columns.items():
+            lineups[column] = means[:, PlayerAttributeIndex.attributes.index(attribute)]
+        return lineups
+
+    attributes = list(rating_columns)
+
+    snapshots = df_player_attr[['player_api_id', 'date'] + attributes].copy()
+    snapshots['player_api_id'] = snapshots['player_api_id'].astype('float64')
+    snapshots['date'] = pd.to_datetime(snapshots['date'])
+    snapshots[attributes] = snapshots[attributes].astype('float64')
+    snapshots = snapshots.sort_values(['player_api_id', 'date'], kind='stable').reset_index(drop=True)
+
+    rolling_means = (
+        snapshots
+        .groupby('player_api_id')[attributes]
+        .rolling(window=n_previous, min_periods=1)
+        .mean()
+        .reset_index(level=0, drop=True)
+        .reindex(snapshots.index)
+    )
+    snapshots = snapshots[['player_api_id', 'date']].copy()
+    for attribute, column in rating_columns.items():
+        snapshots[column] = rolling_means[attribute].to_numpy()
+    snapshots = snapshots.sort_values('date', kind='stable')
+
+    lineups = df_lineups.copy()
+    lineups['_position'] = np.arange(len(lineups))
+    lineups['_player_api_id'] = lineups['player_api_id'].astype('float64')
+    lineups['_date'] = pd.to_datetime(lineups['date'])
+
+    known = lineups[lineups['_player_api_id'].notna()].sort_values('_date', kind='stable')
+    joined = pd.merge_asof(
+        known[['_position', '_player_api_id', '_date']],
+        snapshots.rename(columns={'player_api_id': '_player_api_id', 'date': '_date'}),
+        on='_date',
+        by='_player_api_id',
+        allow_exact_matches=False
+    )
+
+    for column in rating_columns.values():
+        values = np.full(len(lineups), np.nan)
+        values[joined['_position'].to_numpy()] = joined[column].to_numpy()
+        lineups[column] = values
+
+    return lineups.drop(columns=['_position', '_player_api_id', '_date'])
+
+
+def get_player_ratings(df_matches, df_player_attr, players, n_previous=10):
+    """
+    Rating columns of get_player_stat for matches whose player ids are already filled in.
+
+    Parameters:
+    - df_matches: DataFrame with 'match_api_id', 'date' and the players columns.
+    - df_player_attr: player attributes DataFrame or PlayerAttributeIndex.
+    - players: slot columns to rate.
+    - n_previous: number of snapshots to average.
+
+    Returns:
+    - DataFrame with 'match_api_id' and one column per (rating, slot), in df_matches order.
+    """
+    n_matches = len(df_matches)
+
+    df_lineups = pd.DataFrame({
+        'player': np.repeat(players, n_matches),
+        'date': np.tile(df_matches['date'].to_numpy(), len(players)),
+        'player_api_id': np.concatenate([df_matches[player].to_numpy(dtype='float64') for player in players]) if players else [],
+    })
+    ratings = get_lineup_ratings(df_lineups, df_player_attr, n_previous)
+
+    player_stats = {'match_api_id': df_matches['match_api_id'].to_numpy()}
+    for i, player in enumerate(players):
+        player_ratings = ratings.iloc[i * n_matches:(i + 1) * n_matches]
+        for column in rating_columns.values():
+            player_stats[f"{column}_{player}"] = player_ratings[column].to_numpy()
+
+    return pd.DataFrame(player_stats)
+
+
+def get_player_stats(df_matches, df_player_attr, players, n_previous=10):
+    """
+    Batch version of get_player_stat for the whole match table.
+
+    Missing player ids are filled with impute_player_ids, which picks the same fallback ids as
+    get_player_id_for_team_ including ties, then all (match, slot) ratings are computed at once by
+    get_player_ratings.
+
+    Returns:
+    - DataFrame with 'match_api_id' and the same rating columns as get_player_stat, one row per match
+      in df_matches order.
+    """
+    df_matches, _ = impute_player_ids(df_matches, players, n_previous=10)
+    return get_player_ratings(df_matches, df_player_attr, players, n_previous)
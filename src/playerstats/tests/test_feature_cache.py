@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.playerstats.feature_cache import PlayerFeatureCache
+from src.playerstats.player_stats import get_player_stats
+
+players = ['home_player_1', 'away_player_1']
+
+
+@pytest.fixture
+def df_matches():
+    return pd.DataFrame({
+        'match_api_id': [2001, 2002, 2003],
+        'date': pd.to_datetime(['2010-06-05', '2010-07-10', '2010-07-11']),
+        'home_team': [3001, 3001, 3002],
+        'away_team': [4001, 4002, 4002],
+        'home_player_1': [1001, np.nan, 1003],
+        'away_player_1': [1002, 1002, np.nan],
+    })
+
+
+@pytest.fixture
+def df_player_attr():
+    return pd.DataFrame({
+        'player_api_id': [1001, 1001, 1002, 1003, 1002],
+        'date': pd.to_datetime(['2010-01-01', '2010-06-01', '2010-03-01', '2010-01-15', '2010-07-01']),
+        'overall_rating': [60, 65, 70, 75, 72],
+        'acceleration': [61, 66, 71, 76, 73],
+        'strength': [62, 67, 72, 77, 74],
+        'aggression': [63, 68, 73, 78, 75],
+    })
+
+
+def test_cache_matches_get_player_stats(df_matches, df_player_attr, tmp_path):
+    expected = get_player_stats(df_matches, df_player_attr, players)
+
+    first = PlayerFeatureCache(tmp_path).get_player_stats(df_matches, df_player_attr, players)
+    cache = PlayerFeatureCache(tmp_path)
+    second = cache.get_player_stats(df_matches, df_player_attr, players)
+
+    pd.testing.assert_frame_equal(first, expected)
+    pd.testing.assert_frame_equal(second, expected)
+    assert (cache.n_cached, cache.n_computed) == (3, 0)
+
+
+def test_cache_recomputes_only_changed_matches(df_matches, df_player_attr, tmp_path):
+    cache = PlayerFeatureCache(tmp_path)
+    cache.get_player_stats(df_matches, df_player_attr, players)
+
+    # The 2010-07-01 snapshot of player 1002 only feeds the 2010-07-10 and 2010-07-11 matches.
+    df_player_attr.loc[4, 'strength'] = 90
+    result = cache.get_player_stats(df_matches, df_player_attr, players)
+
+    pd.testing.assert_frame_equal(result, get_player_stats(df_matches, df_player_attr, players))
+    assert (cache.n_cached, cache.n_computed) == (1, 2)
+
+
+def test_cache_evicts_least_recently_used(df_matches, df_player_attr, tmp_path):
+    cache = PlayerFeatureCache(tmp_path, max_bytes=1)
+    cache.get_player_stats(df_matches.iloc[:1], df_player_attr, players)
+    cache.get_player_stats(df_matches, df_player_attr, players)
+
+    assert len(cache.manifest['segments']) == 1
+    assert len(list(tmp_path.glob('*.parquet'))) == 1
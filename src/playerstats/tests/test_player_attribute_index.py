@@ -0,0 +1,92 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.playerstats.player_attribute_index import PlayerAttributeIndex
+from src.playerstats.player_stats import (
+    get_player_overall_rating_from_previous_N_last_,
+    get_player_stats
+)
+
+
+@pytest.fixture
+def df_player_attr():
+    data = {
+        'player_api_id': [1001, 1001, 1002, 1003, 1001, 1002],
+        'date': pd.to_datetime([
+            '2010-01-01',
+            '2010-06-01',
+            '2010-03-01',
+            '2010-01-15',
+            '2010-07-01',
+            '2010-05-01'
+        ]),
+        'overall_rating': [60, 65, 70, 75, 68, np.nan],
+        'acceleration': [61, 66, 71, 76, 69, 72],
+        'strength': [62, 67, 72, 77, 70, 73],
+        'aggression': [63, 68, 73, 78, 71, 74],
+    }
+    return pd.DataFrame(data)
+
+
+@pytest.mark.parametrize('player_id, match_date', [
+    (1001, '2010-06-15'),
+    (1001, '2010-06-01'),
+    (1001, '2011-01-01'),
+    (1002, '2010-06-01'),
+    (1003, '2010-01-01'),
+    (9999, '2010-06-01'),
+])
+def test_mean_last_n_matches_dataframe_lookup(df_player_attr, player_id, match_date):
+    index = PlayerAttributeIndex.from_frame(df_player_attr)
+    match_date = pd.Timestamp(match_date)
+
+    expected = get_player_overall_rating_from_previous_N_last_(player_id, match_date, df_player_attr, n_previous=2)
+    result = get_player_overall_rating_from_previous_N_last_(player_id, match_date, index, n_previous=2)
+
+    np.testing.assert_array_equal(np.array(result), np.array(expected, dtype=float))
+
+
+def test_query_unknown_and_missing_players(df_player_attr):
+    index = PlayerAttributeIndex.from_frame(df_player_attr)
+
+    result = index.query([np.nan, 1, 1001], pd.to_datetime(['2011-01-01'] * 3), n_previous=10)
+
+    assert result.shape == (3, len(PlayerAttributeIndex.attributes))
+    assert np.isnan(result[:2]).all()
+    assert result[2, 0] == pytest.approx((60 + 65 + 68) / 3)
+
+
+def test_get_player_stats_with_index(df_player_attr):
+    df_matches = pd.DataFrame({
+        'match_api_id': [2001, 2002],
+        'date': pd.to_datetime(['2010-06-15', '2010-08-01']),
+        'home_team': [10, 20],
+        'away_team': [20, 10],
+        'home_player_1': [1001.0, 1002.0],
+        'away_player_1': [1002.0, np.nan],
+    })
+    players = ['home_player_1', 'away_player_1']
+
+    expected = get_player_stats(df_matches, df_player_attr, players)
+    result = get_player_stats(df_matches, PlayerAttributeIndex.from_frame(df_player_attr), players)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_save_load_and_pickle(df_player_attr, tmp_path):
+    index = PlayerAttributeIndex.from_frame(df_player_attr)
+    index.save(tmp_path / 'index')
+
+    loaded = PlayerAttributeIndex.load(tmp_path / 'index')
+    unpickled = pickle.loads(pickle.dumps(index))
+
+    assert isinstance(loaded.values, np.memmap)
+    assert loaded.values.dtype == np.float32
+    for other in [loaded, unpickled]:
+        np.testing.assert_array_equal(
+            other.query([1001, 1002], pd.to_datetime(['2010-06-15', '2010-06-15'])),
+            index.query([1001, 1002], pd.to_datetime(['2010-06-15', '2010-06-15']))
+        )
@@ -4,7 +4,11 @@ import pandas as pd
 from src.playerstats.player_stats import (
     get_player_overall_rating_from_previous_N_last_,
     get_player_id_for_team_,
-    get_player_stat
+    get_player_stat,
+    get_player_stats,
+    get_lineup_ratings,
+    impute_player_ids,
+    lineups_to_wide
 )
 
 
@@ -148,3 +152,113 @@ def test_calculate_player_stat_integration(df_matches, df_player_attr):
     assert result_dict['rating_home_player_1'] == 62.5
 
     assert result_dict['rating_away_player_1'] == 70
+
+
+def test_lineups_to_wide():
+    df_lineups = pd.DataFrame({
+        'match_api_id': [2001] * 22,
+        'side': ['home'] * 11 + ['away'] * 11,
+        'slot': list(range(1, 12)) * 2,
+        'player_api_id': [1001.0] + [np.nan] * 10 + [1002.0] + [np.nan] * 10,
+    })
+
+    wide = lineups_to_wide(df_lineups)
+
+    assert len(wide) == 1
+    assert wide.columns[0] == 'match_api_id'
+    assert list(wide.columns[1:]) == ['{}_player_{}'.format(team, i) for team in ['home', 'away'] for i in range(1, 12)]
+    assert wide.loc[0, 'home_player_1'] == 1001
+    assert wide.loc[0, 'away_player_1'] == 1002
+    assert np.isnan(wide.loc[0, 'home_player_2'])
+
+
+def test_get_player_stats_matches_get_player_stat(df_matches, df_player_attr):
+    players = ['home_player_1', 'away_player_1']
+    expected = pd.json_normalize(df_matches.apply(
+        lambda row: get_player_stat(row, df_matches, df_player_attr, players), axis=1
+    ))
+
+    result = get_player_stats(df_matches, df_player_attr, players)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_get_player_stats_matches_get_player_stat_random(seed):
+    df_matches = random_lineups(seed, n_matches=120)
+    rng = np.random.default_rng(seed)
+    n_snapshots = 60
+    df_player_attr = pd.DataFrame({
+        'player_api_id': rng.integers(100, 106, n_snapshots),
+        'date': pd.Timestamp('2009-10-01') + pd.to_timedelta(rng.integers(0, 200, n_snapshots), unit='D'),
+        **{column: rng.integers(40, 90, n_snapshots) for column in
+           ['overall_rating', 'acceleration', 'strength', 'aggression']},
+    })
+    players = ['home_player_1', 'home_player_2', 'away_player_1', 'away_player_2']
+    expected = pd.json_normalize(df_matches.apply(
+        lambda row: get_player_stat(row, df_matches, df_player_attr, players), axis=1
+    ))
+
+    result = get_player_stats(df_matches, df_player_attr, players)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_get_lineup_ratings_last_n_snapshots(df_player_attr):
+    df_lineups = pd.DataFrame({
+        'match_api_id': [2001, 2002, 2003],
+        'date': pd.to_datetime(['2010-06-15', '2010-08-01', '2010-01-01']),
+        'player_api_id': [1001, 1001, 1001],
+    })
+
+    result = get_lineup_ratings(df_lineups, df_player_attr, n_previous=2)
+
+    assert result['overall_rating'].iloc[0] == 62.5
+    assert result['overall_rating'].iloc[1] == 66.5
+    assert np.isnan(result['overall_rating'].iloc[2])
+
+
+def test_impute_player_ids_matches_get_player_id_for_team(df_matches):
+    players = ['home_player_1', 'away_player_1']
+
+    result, n_imputed = impute_player_ids(df_matches, players)
+
+    for player in players:
+        team_type = 'home' if 'home' in player else 'away'
+        expected = df_matches.apply(
+            lambda row: get_player_id_for_team_(row, player, team_type, df_matches), axis=1
+        )
+        np.testing.assert_array_equal(result[player].to_numpy(), expected.to_numpy(dtype=float))
+    assert n_imputed == 2
+
+
+def random_lineups(seed, n_matches=250, missing=0.3):
+    """Matches of 8 teams on distinct dates, ids drawn from a small pool so windows have ties."""
+    rng = np.random.default_rng(seed)
+    home_team = rng.integers(0, 8, n_matches)
+    df = pd.DataFrame({
+        'match_api_id': np.arange(n_matches),
+        'date': pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.permutation(n_matches), unit='D'),
+        'home_team': home_team,
+        'away_team': (home_team + rng.integers(1, 8, n_matches)) % 8,
+    })
+    for player in ['home_player_1', 'home_player_2', 'away_player_1', 'away_player_2']:
+        ids = rng.integers(100, 106, n_matches).astype(float)
+        ids[rng.random(n_matches) < missing] = np.nan
+        df[player] = ids
+    return df
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_impute_player_ids_matches_get_player_id_for_team_random(seed):
+    df_matches = random_lineups(seed)
+    players = ['home_player_1', 'home_player_2', 'away_player_1', 'away_player_2']
+
+    result, _ = impute_player_ids(df_matches, players)
+
+    for player in players:
+        team_type = 'home' if 'home' in player else 'away'
+        expected = df_matches.apply(
+            lambda row: get_player_id_for_team_(row, player, team_type, df_matches), axis=1
+        )
+        np.testing.assert_array_equal(result[player].to_numpy(), expected.to_numpy(dtype=float))
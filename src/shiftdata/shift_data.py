@@ -2,16 +2,62 @@ import pandas as pd
 import numpy as np
 import logging
 
+from src.helper.window_indexer import SegmentWindowIndexer
+
+
+def get_team_segments(teams):
+    """
+    Groups rows by team without reordering the rows of one team.
+
+    Parameters:
+    - teams: team of every row.
+
+    Returns:
+    - Tuple (order, is_segment_start, segment_starts): order sorts the rows by team (stable), and in
+      that order is_segment_start marks the first row of every team and segment_starts[i] is the
+      position of the first row of the team of row i.
+    """
+    team_codes = pd.factorize(np.asarray(teams))[0]
+    order = np.argsort(team_codes, kind='stable')
+    team_codes = team_codes[order]
+    is_segment_start = np.r_[True, team_codes[1:] != team_codes[:-1]][:len(order)]
+    segment_starts = np.maximum.accumulate(np.where(is_segment_start, np.arange(len(order)), 0))
+    return order, is_segment_start, segment_starts
+
+
 class ShiftDataPreprocessor:
-    def __init__(self, df):
+    # Per-team columns stored as float32 in low memory mode.
+    low_memory_float_columns = ['team_goal', 'opponent_goal', 'team_shoton', 'team_possession']
+
+    rename_shifted = {
+        'home_last_team_goal_shifted': 'home_last_team_goal',
+        'home_last_team_shoton_shifted': 'home_last_team_shoton',
+        'home_last_team_possession_shifted': 'home_last_team_possession',
+        'away_last_team_goal_shifted': 'away_last_team_goal',
+        'away_last_team_shoton_shifted': 'away_last_team_shoton',
+        'away_last_team_possession_shifted': 'away_last_team_possession',
+    }
+
+    original_home_features = ['home_shoton', 'home_team_goal', 'home_possession', 'home_last_team']
+    original_away_features = ['away_shoton', 'away_team_goal', 'away_possession', 'away_last_team']
+
+    def __init__(self, df, low_memory=False):
         """
         Initializes the ShiftDataPreprocessor with the original DataFrame.
 
         Parameters:
         - df: pandas DataFrame containing the original match data.
+        - low_memory: keep a reference to df instead of two copies, store team ids as categoricals
+          and the team features as float32, and merge the shifted features back by row position.
+          df must not be modified while the preprocessor uses it.
         """
-        self.df_original = df.copy()
-        self.df = df.copy()
+        self.low_memory = low_memory
+        if low_memory:
+            self.df_original = df
+            self.df = df
+        else:
+            self.df_original = df.copy()
+            self.df = df.copy()
         self.team_df = None
         self.df_final = None
         logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
@@ -41,6 +87,9 @@ class ShiftDataPreprocessor:
         else:
             raise ValueError("team_role must be either 'home_' or 'away_'")
 
+        if self.low_memory:
+            return self.select_team_columns_low_memory(team_role, team_columns)
+
         selected_df = self.df_original[team_columns].copy()
 
         rename_base = {
@@ -58,6 +107,39 @@ class ShiftDataPreprocessor:
 
         return selected_df
 
+    def select_team_columns_low_memory(self, team_role, team_columns):
+        """
+        Low memory form of select_and_rename_columns: builds the renamed frame column by column,
+        with 'team' as a categorical over all teams, the team features as float32 and a 'row'
+        column holding the position of the match in the original DataFrame.
+        """
+        opponent_role = "away_" if team_role == "home_" else "home_"
+        teams = pd.unique(self.df_original[['home_team', 'away_team']].to_numpy().ravel())
+        teams = pd.Series(teams).dropna().sort_values().to_numpy()
+
+        selected = {}
+        for column in team_columns:
+            name = {
+                f'{team_role}team': 'team',
+                f'{team_role}team_goal': 'team_goal',
+                f'{opponent_role}team_goal': 'opponent_goal',
+                f'{team_role}shoton': 'team_shoton',
+                f'{team_role}possession': 'team_possession'
+            }.get(column, column)
+
+            if name == 'team':
+                selected[name] = pd.Categorical(self.df_original[column], categories=teams)
+            elif name in self.low_memory_float_columns:
+                selected[name] = self.df_original[column].to_numpy(dtype=np.float32)
+            else:
+                selected[name] = self.df_original[column].to_numpy()
+
+        selected_df = pd.DataFrame(selected)
+        selected_df['is_home'] = np.int8(1 if team_role == 'home_' else 0)
+        selected_df['row'] = np.arange(len(selected_df), dtype=np.int32)
+
+        return selected_df
+
     def concatenate_teams(self, home_df, away_df):
         """
         Concatenates home and away DataFrames into a single team-centric DataFrame.
@@ -91,31 +173,137 @@ class ShiftDataPreprocessor:
 
         return series_filled
 
-    def shift_features(self, features_to_shift):
+    def shift_features(self, features_to_shift, window_size=5):
+        """
+        Adds the previous match value of every feature within the team as '<feature>_shifted'.
+
+        Shifted values that are NaN or 0 are filled like fill_na_and_zero_with_rolling_mean_ does
+        per team. All features are handled at once on team-sorted arrays, the team segments
+        bounding both the shift and the rolling window. Rows where any shifted feature is still
+        NaN or 0 are dropped.
+
+        Parameters:
+        - features_to_shift: columns of team_df to shift.
+        - window_size: rolling mean window used to fill NaN and 0 values.
+
+        Returns:
+        - Copy of team_df with the shifted columns, without the dropped rows. In low memory mode only
+          'match_api_id', 'team', 'is_home' and 'row' are copied next to the shifted columns.
+        """
         if self.team_df is None:
             raise ValueError("team_df is not defined.")
 
-        shifted_df = self.team_df.copy()
+        if self.low_memory:
+            shifted_df = self.team_df[['match_api_id', 'team', 'is_home', 'row']].copy()
+        else:
+            shifted_df = self.team_df.copy()
+        shifted_cols = [f"{feature}_shifted" for feature in features_to_shift]
+
+        order, is_segment_start, segment_starts = get_team_segments(shifted_df['team'])
+
+        values = self.team_df[features_to_shift].to_numpy(dtype=np.float64)[order]
+        shifted = np.full_like(values, np.nan)
+        shifted[1:] = values[:-1]
+        shifted[is_segment_start] = np.nan
+
+        mask = np.isnan(shifted) | (shifted == 0)
+        rolled = (
+            pd.DataFrame(np.where(mask, np.nan, shifted))
+            .rolling(SegmentWindowIndexer(window_size=window_size, segment_starts=segment_starts), min_periods=1)
+            .mean()
+            .to_numpy()
+        )
+        shifted = np.where(mask, rolled, shifted)
+
+        filled = np.empty_like(shifted)
+        filled[order] = shifted
+        for i, shifted_col in enumerate(shifted_cols):
+            shifted_df[shifted_col] = filled[:, i].astype(np.float32) if self.low_memory else filled[:, i]
 
-        for feature in features_to_shift:
-            shifted_col = f"{feature}_shifted"
-            shifted_df[shifted_col] = shifted_df.groupby('team')[feature].shift(1)
+        keep = ~(np.isnan(filled) | (filled == 0)).any(axis=1)
+        return shifted_df[keep]
+
+    def lag_features(self, lag_spec):
+        """
+        Builds lag and exponentially weighted features of previous matches for every row of team_df.
 
-        for feature in features_to_shift:
-            shifted_col = f"{feature}_shifted"
-            shifted_df[shifted_col] = (
-                shifted_df
-                .groupby('team')[shifted_col]
-                .apply(lambda grp: self.fill_na_and_zero_with_rolling_mean_(grp, window_size=5))
-                .reset_index(level=0, drop=True)
-            )
+        lag_spec maps a team_df column to its features, e.g.
+            {'team_goal': {'lags': 3, 'halflives': [2, 5], 'venues': ['all', 'home']}}
+        - lags: k adds '<feature>_lag_1' ... '<feature>_lag_k', the values of the team's previous k matches.
+        - halflives: adds '<feature>_ewm_<halflife>', the exponentially weighted mean of all previous
+          matches of the team in team_df order.
+        - venues: 'all' (default) uses every match of the team. 'home' and 'away' use only the team's
+          home or away matches, are named '<feature>_home_...' / '<feature>_away_...' and are NaN on
+          rows of the other venue.
 
-        for feature in features_to_shift:
-            shifted_col = f"{feature}_shifted"
-            shifted_df = shifted_df[shifted_df[shifted_col].notna()]  # drop rows that remain NaN
-            shifted_df = shifted_df[shifted_df[shifted_col] != 0]  # drop rows that remain 0
+        Unlike shift_features nothing is filled and no row is dropped. Features sharing a venue are
+        computed together on one team-sorted array, so every venue costs one sort however many
+        features, lags and half-lives the spec has.
 
-        return shifted_df
+        Parameters:
+        - lag_spec: dict as above.
+
+        Returns:
+        - DataFrame with the index and the 'match_api_id', 'team' and 'is_home' columns of team_df
+          and one column per generated feature.
+        """
+        if self.team_df is None:
+            raise ValueError("team_df is not defined.")
+
+        venue_masks = {
+            'all': np.ones(len(self.team_df), dtype=bool),
+            'home': self.team_df['is_home'].to_numpy() == 1,
+            'away': self.team_df['is_home'].to_numpy() == 0,
+        }
+        venues = {}
+        for feature, spec in lag_spec.items():
+            for venue in spec.get('venues', ['all']):
+                if venue not in venue_masks:
+                    raise ValueError("venues must be 'all', 'home' or 'away'")
+                venues.setdefault(venue, []).append(feature)
+
+        lag_df = self.team_df[['match_api_id', 'team', 'is_home']].copy()
+        generated = {}
+
+        for venue, features in venues.items():
+            rows = np.flatnonzero(venue_masks[venue])
+            order, is_segment_start, segment_starts = get_team_segments(self.team_df['team'].to_numpy()[rows])
+            rows = rows[order]
+            positions = np.arange(len(rows))
+            values = self.team_df[features].to_numpy(dtype=np.float64)[rows]
+            suffix = '' if venue == 'all' else f'_{venue}'
+
+            for lag in range(1, max(lag_spec[feature].get('lags', 0) for feature in features) + 1):
+                lag_positions = positions - lag
+                lagged = np.where((lag_positions >= segment_starts)[:, None], values[np.maximum(lag_positions, 0)], np.nan)
+                for i, feature in enumerate(features):
+                    if lag <= lag_spec[feature].get('lags', 0):
+                        generated[f"{feature}{suffix}_lag_{lag}"] = (rows, lagged[:, i])
+
+            halflives = sorted({halflife for feature in features for halflife in lag_spec[feature].get('halflives', [])})
+            if halflives:
+                shifted = np.full_like(values, np.nan)
+                shifted[1:] = values[:-1]
+                shifted[is_segment_start] = np.nan
+                grouped = pd.DataFrame(shifted).groupby(segment_starts, sort=False)
+                for halflife in halflives:
+                    ewm = grouped.ewm(halflife=halflife).mean().reset_index(level=0, drop=True).sort_index().to_numpy()
+                    for i, feature in enumerate(features):
+                        if halflife in lag_spec[feature].get('halflives', []):
+                            generated[f"{feature}{suffix}_ewm_{halflife}"] = (rows, ewm[:, i])
+
+        columns = {}
+        for feature, spec in lag_spec.items():
+            for venue in spec.get('venues', ['all']):
+                suffix = '' if venue == 'all' else f'_{venue}'
+                names = [f"{feature}{suffix}_lag_{lag}" for lag in range(1, spec.get('lags', 0) + 1)]
+                names += [f"{feature}{suffix}_ewm_{halflife}" for halflife in spec.get('halflives', [])]
+                for name in names:
+                    rows, column_values = generated[name]
+                    columns[name] = np.full(len(lag_df), np.nan)
+                    columns[name][rows] = column_values
+
+        return pd.concat([lag_df, pd.DataFrame(columns, index=lag_df.index)], axis=1)
 
     def merge_shifted_features(self, team_df_shifted):
         """
@@ -130,6 +318,9 @@ class ShiftDataPreprocessor:
         """
         logging.info("Merging shifted features back into the original DataFrame.")
 
+        if self.low_memory:
+            return self.assign_shifted_features(team_df_shifted)
+
         team_df_shifted = team_df_shifted.reset_index(drop=True)
 
         home_last = self.team_df[self.team_df['is_home'] == 1][['match_api_id', 'team']].copy()
@@ -161,21 +352,44 @@ class ShiftDataPreprocessor:
         self.df_original.dropna(subset=self.df_original.filter(like="_shifted").columns, inplace=True)
         self.df_original.dropna(subset=self.df_original.filter(like="rolling_average").columns, inplace=True)
 
-        rename_shifted = {
-            f'home_last_team_goal_shifted': 'home_last_team_goal',
-            f'home_last_team_shoton_shifted': 'home_last_team_shoton',
-            f'home_last_team_possession_shifted': 'home_last_team_possession',
-            f'away_last_team_goal_shifted': 'away_last_team_goal',
-            f'away_last_team_shoton_shifted': 'away_last_team_shoton',
-            f'away_last_team_possession_shifted': 'away_last_team_possession',
-        }
+        self.df_original.rename(columns=self.rename_shifted, inplace=True)
 
-        self.df_original.rename(columns=rename_shifted, inplace=True)
+        df_final = self.df_original.drop(columns=self.original_home_features + self.original_away_features)
 
-        original_home_features = ['home_shoton', 'home_team_goal', 'home_possession', 'home_last_team' ]
-        original_away_features = ['away_shoton', 'away_team_goal', 'away_possession', 'away_last_team' ]
+        return df_final
+
+    def assign_shifted_features(self, team_df_shifted):
+        """
+        Low memory form of merge_shifted_features: writes the shifted features of each side straight
+        into the rows given by the 'row' column instead of merging on (match_api_id, team).
 
-        df_final = self.df_original.drop(columns=original_home_features + original_away_features)
+        Returns the same rows and columns as merge_shifted_features, the shifted columns as float32.
+        """
+        shifted_cols = list(team_df_shifted.filter(like="_shifted").columns)
+        n_matches = len(self.df_original)
+        keep = np.ones(n_matches, dtype=bool)
+
+        assigned = {}
+        for team_role, is_home in [('home_last_', 1), ('away_last_', 0)]:
+            side = team_df_shifted[team_df_shifted['is_home'].to_numpy() == is_home]
+            rows = side['row'].to_numpy()
+            for shifted_col in shifted_cols:
+                values = np.full(n_matches, np.nan, dtype=np.float32)
+                values[rows] = side[shifted_col].to_numpy()
+                keep &= ~np.isnan(values)
+                name = team_role + shifted_col
+                assigned[self.rename_shifted.get(name, name)] = values
+
+        rolling_columns = self.df_original.filter(like="rolling_average").columns
+        if len(rolling_columns):
+            keep &= self.df_original[rolling_columns].notna().all(axis=1).to_numpy()
+
+        positions = np.flatnonzero(keep)
+        dropped = self.original_home_features + self.original_away_features
+        columns = [i for i, column in enumerate(self.df_original.columns) if column not in dropped]
+        df_final = self.df_original.iloc[positions, columns].set_axis(pd.RangeIndex(n_matches)[positions])
+        for name, values in assigned.items():
+            df_final[name] = values[positions]
 
         return df_final
 
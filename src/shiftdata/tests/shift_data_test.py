@@ -1,3 +1,5 @@
+import tracemalloc
+
 import pytest
 import pandas as pd
 import numpy as np
@@ -114,4 +116,128 @@ def test_merge_shifted_features(sample_data):
     for feature in features_to_shift:
         shifted_col = f"{feature}_shifted"
         assert not shifted_df[shifted_col].isna().any()
-        assert not (shifted_df[shifted_col] == 0).any()
\ No newline at end of file
+        assert not (shifted_df[shifted_col] == 0).any()
+
+
+def test_shift_features_matches_per_team_fill(sample_data):
+    """Test that the batched shift fills like fill_na_and_zero_with_rolling_mean_ applied per team."""
+    sample_data.loc[[2, 3], 'home_shoton'] = 0
+    preprocessor = ShiftDataPreprocessor(sample_data)
+    home_df = preprocessor.select_and_rename_columns('home_')
+    away_df = preprocessor.select_and_rename_columns('away_')
+    team_df = preprocessor.concatenate_teams(home_df, away_df)
+
+    shifted_df = preprocessor.shift_features(['team_shoton'])
+
+    expected = (
+        team_df.groupby('team')['team_shoton'].shift(1)
+        .groupby(team_df['team'])
+        .transform(lambda grp: preprocessor.fill_na_and_zero_with_rolling_mean_(grp, window_size=5))
+    )
+    expected = expected[expected.notna() & (expected != 0)]
+    pd.testing.assert_series_equal(shifted_df['team_shoton_shifted'], expected, check_names=False)
+
+
+def test_low_memory_matches_default(sample_data):
+    """Test that the low memory mode produces the rows and values of the default path."""
+    results = []
+    for low_memory in [False, True]:
+        preprocessor = ShiftDataPreprocessor(sample_data, low_memory=low_memory)
+        home_df = preprocessor.select_and_rename_columns('home_')
+        away_df = preprocessor.select_and_rename_columns('away_')
+        team_df = preprocessor.concatenate_teams(home_df, away_df)
+        shifted_df = preprocessor.shift_features(['team_shoton', 'team_possession'])
+        results.append(preprocessor.merge_shifted_features(shifted_df))
+
+    default, low_memory = results
+
+    assert isinstance(team_df['team'].dtype, pd.CategoricalDtype)
+    assert team_df['team_shoton'].dtype == np.float32
+    assert low_memory['home_last_team_shoton'].dtype == np.float32
+    assert 'home_shoton' in sample_data.columns
+    pd.testing.assert_frame_equal(low_memory, default, check_dtype=False)
+
+
+
+def get_peak_allocation(df, low_memory):
+    """Peak bytes allocated by the shift steps on df, measured with tracemalloc."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    preprocessor = ShiftDataPreprocessor(df, low_memory=low_memory)
+    home_df = preprocessor.select_and_rename_columns('home_')
+    away_df = preprocessor.select_and_rename_columns('away_')
+    preprocessor.concatenate_teams(home_df, away_df)
+    shifted_df = preprocessor.shift_features(['team_goal', 'team_shoton', 'team_possession'])
+    del home_df, away_df
+    preprocessor.merge_shifted_features(shifted_df)
+    peak = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return peak
+
+
+def test_low_memory_lowers_peak_allocation():
+    """Measure both modes on 20k matches with 50 extra float columns; low memory must peak far lower."""
+    rng = np.random.default_rng(0)
+    n_matches, n_teams = 20000, 20
+    home_team = rng.integers(0, n_teams, n_matches)
+    df = pd.DataFrame({
+        'match_api_id': np.arange(n_matches),
+        'season': np.repeat(['2014/2015', '2015/2016'], n_matches // 2),
+        'stage': np.arange(n_matches) // 10 % 38 + 1,
+        'date': pd.Timestamp('2015-08-01') + pd.to_timedelta(np.arange(n_matches) // 10, unit='D'),
+        'home_team': home_team,
+        'away_team': (home_team + rng.integers(1, n_teams, n_matches)) % n_teams,
+        'result_match': rng.choice(['H', 'D', 'A'], n_matches),
+        **{f"{side}_{column}": rng.integers(1, 10, n_matches).astype(float)
+           for side in ['home', 'away'] for column in ['team_goal', 'shoton', 'possession']},
+        **{f"feature_{i}": rng.random(n_matches) for i in range(50)},
+    })
+
+    default = get_peak_allocation(df, low_memory=False)
+    low_memory = get_peak_allocation(df, low_memory=True)
+
+    assert low_memory < 0.6 * default
+
+
+def test_lag_features(sample_data):
+    """Test lags, exponentially weighted means and venue variants against per-team pandas operations."""
+    preprocessor = ShiftDataPreprocessor(sample_data)
+    home_df = preprocessor.select_and_rename_columns('home_')
+    away_df = preprocessor.select_and_rename_columns('away_')
+    team_df = preprocessor.concatenate_teams(home_df, away_df)
+
+    lag_spec = {
+        'team_goal': {'lags': 2, 'halflives': [2], 'venues': ['all', 'home']},
+        'team_shoton': {'lags': 1},
+    }
+    lag_df = preprocessor.lag_features(lag_spec)
+
+    assert list(lag_df.columns) == [
+        'match_api_id', 'team', 'is_home',
+        'team_goal_lag_1', 'team_goal_lag_2', 'team_goal_ewm_2',
+        'team_goal_home_lag_1', 'team_goal_home_lag_2', 'team_goal_home_ewm_2',
+        'team_shoton_lag_1'
+    ]
+    by_team = team_df.groupby('team')
+    np.testing.assert_array_equal(lag_df['team_goal_lag_2'], by_team['team_goal'].shift(2))
+    np.testing.assert_array_equal(lag_df['team_shoton_lag_1'], by_team['team_shoton'].shift(1))
+    np.testing.assert_allclose(
+        lag_df['team_goal_ewm_2'],
+        by_team['team_goal'].shift(1).groupby(team_df['team']).transform(lambda grp: grp.ewm(halflife=2).mean())
+    )
+
+    home = team_df[team_df['is_home'] == 1]
+    expected_home = home.groupby('team')['team_goal'].shift(1).reindex(team_df.index)
+    np.testing.assert_array_equal(lag_df['team_goal_home_lag_1'], expected_home)
+    assert lag_df.loc[team_df['is_home'] == 0, 'team_goal_home_lag_1'].isna().all()
+
+
+def test_lag_features_unknown_venue(sample_data):
+    preprocessor = ShiftDataPreprocessor(sample_data)
+    preprocessor.concatenate_teams(
+        preprocessor.select_and_rename_columns('home_'), preprocessor.select_and_rename_columns('away_')
+    )
+
+    with pytest.raises(ValueError):
+        preprocessor.lag_features({'team_goal': {'lags': 1, 'venues': ['neutral']}})
@@ -0,0 +1,183 @@
+import json
+from collections import deque
+
+import pandas as pd
+
+from src.standings.standings import points_mapping, standing_columns
+
+
+class Standings:
+    """
+    League table of one season that is updated one match result at a time.
+
+    Every team keeps its running totals and the results of its last form_length matches. The
+    table is kept sorted by (points, goal difference, goals scored): a result only moves the two
+    teams involved past the teams they overtake. rank_starts maps every sort key held by a team to
+    the first table index of the teams tied on it, so reading any team's position is constant time,
+    also when all teams are tied, and an update costs the few places a team moves.
+    """
+
+    def __init__(self, season=None, teams=(), form_length=5):
+        self.season = season
+        self.form_length = form_length
+        self.teams = {}
+        self.table = []
+        self.table_index = {}
+        self.rank_starts = {}
+        for team in teams:
+            self.add_team(team)
+
+    def add_team(self, team):
+        """Adds a team without results at the bottom of the table, if it is not there yet."""
+        if team in self.teams:
+            return
+
+        self.teams[team] = {**{column: 0 for column in standing_columns}, 'form': deque(maxlen=self.form_length)}
+        self.table.append(team)
+        self.table_index[team] = len(self.table) - 1
+        self.move(team)
+
+    def sort_key(self, team):
+        state = self.teams[team]
+        return state['points'], state['goal_difference'], state['goals_for']
+
+    def swap(self, i, j):
+        self.table[i], self.table[j] = self.table[j], self.table[i]
+        self.table_index[self.table[i]] = i
+        self.table_index[self.table[j]] = j
+
+    def move(self, team):
+        """Moves team up or down the table until it is in order again."""
+        i = start = self.table_index[team]
+        while i > 0 and self.sort_key(self.table[i - 1]) < self.sort_key(team):
+            self.swap(i - 1, i)
+            i -= 1
+        while i < len(self.table) - 1 and self.sort_key(self.table[i + 1]) > self.sort_key(team):
+            self.swap(i, i + 1)
+            i += 1
+        self.update_rank_starts(min(i, start), max(i, start) + 1)
+
+    def update_rank_starts(self, first, last):
+        """
+        Records the tied groups starting between table indices first and last. Only rows between
+        the old and new index of a moved team shift, so the group right after them is the last one
+        whose start can change; the groups of keys no team holds any more are left behind unused.
+        """
+        for i in range(first, min(last, len(self.table) - 1) + 1):
+            key = self.sort_key(self.table[i])
+            if i == 0 or self.sort_key(self.table[i - 1]) != key:
+                self.rank_starts[key] = i
+
+    def update(self, home_team, away_team, home_team_goal, away_team_goal):
+        """
+        Applies one match result to the table.
+
+        Parameters:
+        - home_team, away_team: team ids, added to the table if they are new.
+        - home_team_goal, away_team_goal: final score.
+        """
+        if home_team_goal > away_team_goal:
+            result_match = 'H'
+        elif home_team_goal < away_team_goal:
+            result_match = 'A'
+        else:
+            result_match = 'D'
+
+        for team, team_type, goals_for, goals_against in [
+            (home_team, 'home', home_team_goal, away_team_goal),
+            (away_team, 'away', away_team_goal, home_team_goal)
+        ]:
+            self.add_team(team)
+            points = points_mapping[result_match][team_type]
+            state = self.teams[team]
+            state['points'] += points
+            state['goal_difference'] += goals_for - goals_against
+            state['games_played'] += 1
+            state['wins'] += points == 3
+            state['draws'] += points == 1
+            state['losses'] += points == 0
+            state['goals_for'] += goals_for
+            state['form'].append({3: 'W', 1: 'D', 0: 'L'}[points])
+            self.move(team)
+
+    def points(self, team):
+        return self.teams[team]['points']
+
+    def goal_difference(self, team):
+        return self.teams[team]['goal_difference']
+
+    def position(self, team):
+        """Table position, tied teams sharing the higher position."""
+        return self.rank_starts[self.sort_key(team)] + 1
+
+    def form(self, team):
+        """Results of the last form_length matches, oldest first, e.g. 'WDLWW'."""
+        return ''.join(self.teams[team]['form'])
+
+    def get_team_state(self, team):
+        """All table features of team, named like the columns of get_standings without the side suffix."""
+        state = {column: self.teams[team][column] for column in standing_columns[:-1]}
+        state['position'] = self.position(team)
+        state['form'] = self.form(team)
+        return state
+
+    def snapshot(self, path):
+        """Writes the table to a JSON file that restore reads back."""
+        with open(path, 'w') as f:
+            json.dump({
+                'season': self.season,
+                'form_length': self.form_length,
+                'table': [{'team': team, **self.teams[team], 'form': list(self.teams[team]['form'])} for team in self.table],
+            }, f, default=int)
+
+    @classmethod
+    def restore(cls, path):
+        """Standings saved by snapshot."""
+        with open(path) as f:
+            saved = json.load(f)
+
+        standings = cls(season=saved['season'], form_length=saved['form_length'])
+        for row in saved['table']:
+            team = row.pop('team')
+            standings.teams[team] = {**row, 'form': deque(row['form'], maxlen=standings.form_length)}
+            standings.table.append(team)
+            standings.table_index[team] = len(standings.table) - 1
+        standings.update_rank_starts(0, len(standings.table) - 1)
+
+        return standings
+
+
+def replay_standings(df):
+    """
+    Builds the get_standings columns by replaying every season through Standings.
+
+    All matches of a date read the table before any of that date's results is applied, the same
+    cut-off get_standings uses.
+
+    Parameters:
+    - df: match table with 'match_api_id', 'season', 'date', 'home_team', 'away_team',
+      'home_team_goal' and 'away_team_goal'.
+
+    Returns:
+    - DataFrame with the index of df and the columns of get_standings.
+    """
+    df = df.assign(date=pd.to_datetime(df['date']))
+    rows = {}
+
+    for season, season_matches in df.groupby('season', sort=True):
+        teams = pd.unique(season_matches[['home_team', 'away_team']].to_numpy().ravel())
+        standings = Standings(season=season, teams=teams)
+
+        for _, day_matches in season_matches.sort_values('date', kind='stable').groupby('date', sort=True):
+            for index, match in day_matches.iterrows():
+                rows[index] = {
+                    f"{column}_{team_type}": value
+                    for team_type in ['home', 'away']
+                    for column, value in standings.get_team_state(match[f"{team_type}_team"]).items()
+                    if column != 'form'
+                }
+            for _, match in day_matches.iterrows():
+                standings.update(match['home_team'], match['away_team'], match['home_team_goal'], match['away_team_goal'])
+
+    columns = [f"{column}_{team_type}" for team_type in ['home', 'away'] for column in standing_columns[:-1] + ['position']]
+    return pd.DataFrame.from_dict(rows, orient='index').reindex(index=df.index, columns=columns)
@@ -0,0 +1,115 @@
+import pandas as pd
+
+# result_match -> points of the home and the away team.
+points_mapping = {
+    'H': {'home': 3, 'away': 0},
+    'D': {'home': 1, 'away': 1},
+    'A': {'home': 0, 'away': 3}
+}
+
+standing_columns = ['points', 'goal_difference', 'games_played', 'wins', 'draws', 'losses', 'goals_for']
+
+
+def get_team_matches(df):
+    """
+    Reshapes the match table to one row per (match, team) with what the team got out of the match.
+
+    Parameters:
+    - df: DataFrame with 'match_api_id', 'season', 'date', 'home_team', 'away_team',
+      'home_team_goal', 'away_team_goal' and 'result_match'.
+
+    Returns:
+    - DataFrame with 'match_api_id', 'season', 'date', 'team', 'side' and the standing_columns
+      earned in that match, home rows first.
+    """
+    team_matches = []
+    for team_type, opponent_type in [('home', 'away'), ('away', 'home')]:
+        points = df['result_match'].map({result: points[team_type] for result, points in points_mapping.items()})
+        goals_for = df[f"{team_type}_team_goal"].to_numpy()
+        goals_against = df[f"{opponent_type}_team_goal"].to_numpy()
+
+        team_matches.append(pd.DataFrame({
+            'match_api_id': df['match_api_id'].to_numpy(),
+            'season': df['season'].to_numpy(),
+            'date': pd.to_datetime(df['date']).to_numpy(),
+            'team': df[f"{team_type}_team"].to_numpy(),
+            'side': team_type,
+            'points': points.to_numpy(),
+            'goal_difference': goals_for - goals_against,
+            'games_played': 1,
+            'wins': (points == 3).to_numpy().astype(int),
+            'draws': (points == 1).to_numpy().astype(int),
+            'losses': (points == 0).to_numpy().astype(int),
+            'goals_for': goals_for,
+        }))
+
+    return pd.concat(team_matches, ignore_index=True)
+
+
+def get_table_positions(team_matches, totals):
+    """
+    League position of every team in the match dates of its season, before kickoff.
+
+    The table holds every team of the season, ranked by points, goal difference and goals scored,
+    tied teams sharing the higher position.
+
+    Parameters:
+    - team_matches: output of get_team_matches.
+    - totals: standing_columns summed up to and including each row of team_matches.
+
+    Returns:
+    - DataFrame with 'season', 'date', 'team' and 'position'.
+    """
+    dates = team_matches[['season', 'date']].drop_duplicates()
+    teams = team_matches[['season', 'team']].drop_duplicates()
+    table = dates.merge(teams, on='season').sort_values('date', kind='stable')
+
+    after_match = pd.concat([team_matches[['season', 'date', 'team']], totals], axis=1).sort_values('date', kind='stable')
+    after_match = after_match.drop_duplicates(['season', 'team', 'date'], keep='last')
+
+    table = pd.merge_asof(table, after_match, on='date', by=['season', 'team'], allow_exact_matches=False)
+    table[standing_columns] = table[standing_columns].fillna(0)
+
+    score = (table['points'] * 1000 + table['goal_difference'] + 500) * 1000 + table['goals_for']
+    table['position'] = score.groupby([table['season'], table['date']]).rank(method='min', ascending=False).astype(int)
+
+    return table[['season', 'date', 'team', 'position']]
+
+
+def get_standings(df):
+    """
+    League table of both teams at kickoff of every match, from matches of the same season played
+    on earlier dates.
+
+    Cumulative sums over the team-long table give the standings after each match, shifted by one
+    match to get the standings before it. 'points_home'/'points_away' equal count_points of the
+    preprocessing notebook.
+
+    Parameters:
+    - df: match table, see get_team_matches.
+
+    Returns:
+    - DataFrame with the index of df and, for each standing column, '<column>_home' and
+      '<column>_away', plus 'position_home' and 'position_away'. 'goals_for' is only used to
+      break ties in the table.
+    """
+    team_matches = get_team_matches(df)
+    team_matches = team_matches.sort_values(['team', 'season', 'date'], kind='stable')
+
+    totals = team_matches.groupby(['team', 'season'])[standing_columns].cumsum()
+    before = totals.groupby([team_matches['team'], team_matches['season']]).shift().fillna(0).astype(int)
+    # Two matches of a team on one date both see the table of the day before.
+    before = before.groupby([team_matches['team'], team_matches['season'], team_matches['date']]).transform('first')
+
+    positions = get_table_positions(team_matches, totals)
+    team_matches = pd.concat([team_matches[['match_api_id', 'season', 'date', 'team', 'side']], before], axis=1)
+    team_matches = team_matches.merge(positions, on=['season', 'date', 'team'], how='left')
+
+    standings = pd.DataFrame(index=df.index)
+    for team_type in ['home', 'away']:
+        side = team_matches[team_matches['side'] == team_type].drop_duplicates('match_api_id').set_index('match_api_id')
+        side = side.reindex(df['match_api_id'].to_numpy())
+        for column in standing_columns[:-1] + ['position']:
+            standings[f"{column}_{team_type}"] = side[column].to_numpy()
+
+    return standings
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.standings.online_standings import Standings, replay_standings
+from src.standings.standings import get_standings
+
+
+@pytest.fixture
+def df_matches():
+    """Three seasons of a six team league, two rounds each, one team playing twice on a date."""
+    rng = np.random.default_rng(0)
+    teams = [11, 22, 33, 44, 55, 66]
+    rows = []
+    for year in [2010, 2011, 2012]:
+        date = pd.Timestamp(f"{year}-08-01")
+        for home_team in teams:
+            for away_team in teams:
+                if home_team != away_team:
+                    date += pd.Timedelta(days=int(rng.integers(0, 3)))
+                    rows.append({
+                        'match_api_id': len(rows) + 1,
+                        'season': f"{year}/{year + 1}",
+                        'date': date,
+                        'home_team': home_team,
+                        'away_team': away_team,
+                        'home_team_goal': int(rng.integers(0, 4)),
+                        'away_team_goal': int(rng.integers(0, 4)),
+                    })
+    df = pd.DataFrame(rows)
+    df['result_match'] = np.select(
+        [df['home_team_goal'] > df['away_team_goal'], df['home_team_goal'] < df['away_team_goal']], ['H', 'A'], 'D'
+    )
+    return df
+
+
+# get_points, process_points and count_points are copied unchanged from the original points cell
+# of preprocessing.ipynb.
+def get_points(row, team):
+    points_mapping = {
+        'H': {'home': 3, 'away': 0},
+        'D': {'home': 1, 'away': 1},
+        'A': {'home': 0, 'away': 3}
+    }
+    team_type = 'home' if row['home_team'] == team else 'away'
+    return int(points_mapping[row['result_match']][team_type])
+
+
+def process_points(team, df, match_date, match_season):
+    team_matches = df.query('(home_team == @team | away_team == @team) & (season == @match_season & date < @match_date)')
+    if len(team_matches) == 0:
+        return 0
+
+    return team_matches.apply(lambda row: get_points(row, team), axis=1).sum()
+
+
+def count_points(match_row, df):
+    match_date = match_row['date']
+    match_season = match_row['season']
+    home_team = match_row['home_team']
+    away_team = match_row['away_team']
+
+    home_team_points = process_points(home_team, df, match_date, match_season)
+    away_team_points = process_points(away_team, df, match_date, match_season)
+
+    return home_team_points, away_team_points
+
+
+def test_update_and_state():
+    standings = Standings(teams=[1, 2, 3])
+
+    standings.update(1, 2, 2, 0)
+    standings.update(3, 1, 1, 1)
+
+    assert standings.points(1) == 4
+    assert standings.goal_difference(2) == -2
+    assert [standings.position(team) for team in [1, 2, 3]] == [1, 3, 2]
+    assert standings.form(1) == 'WD'
+    assert standings.get_team_state(3) == {
+        'points': 1, 'goal_difference': 0, 'games_played': 1, 'wins': 0, 'draws': 1, 'losses': 0,
+        'position': 2, 'form': 'D'
+    }
+
+
+def test_tied_teams_share_position():
+    standings = Standings(teams=[1, 2, 3, 4])
+
+    standings.update(1, 2, 1, 0)
+    standings.update(3, 4, 1, 0)
+
+    assert [standings.position(team) for team in [1, 2, 3, 4]] == [1, 3, 1, 3]
+
+
+def test_position_matches_full_ranking():
+    rng = np.random.default_rng(0)
+    teams = list(range(20))
+    standings = Standings(teams=teams)
+
+    for _ in range(300):
+        home_team, away_team = rng.choice(teams, 2, replace=False)
+        standings.update(home_team, away_team, int(rng.integers(0, 3)), int(rng.integers(0, 3)))
+
+        keys = {team: standings.sort_key(team) for team in teams}
+        for team in teams:
+            assert standings.position(team) == 1 + sum(key > keys[team] for key in keys.values())
+
+
+def test_form_keeps_last_matches():
+    standings = Standings(form_length=3)
+
+    for home_team_goal in [1, 0, 1, 1]:
+        standings.update(1, 2, home_team_goal, 0 if home_team_goal else 1)
+
+    assert standings.form(1) == 'LWW'
+    assert standings.form(2) == 'WLL'
+
+
+def test_snapshot_and_restore(tmp_path):
+    standings = Standings(season='2010/2011', teams=[1, 2, 3])
+    standings.update(1, 2, 2, 0)
+    standings.snapshot(tmp_path / 'standings.json')
+
+    restored = Standings.restore(tmp_path / 'standings.json')
+    restored.update(2, 3, 3, 0)
+    standings.update(2, 3, 3, 0)
+
+    assert restored.season == '2010/2011'
+    for team in [1, 2, 3]:
+        assert restored.get_team_state(team) == standings.get_team_state(team)
+
+
+def test_replay_matches_batch_standings(df_matches):
+    expected = get_standings(df_matches)
+
+    result = replay_standings(df_matches)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    points = np.array(df_matches.apply(lambda row: count_points(row, df_matches), axis=1).tolist())
+    np.testing.assert_array_equal(result[['points_home', 'points_away']].to_numpy(), points)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.standings.standings import get_standings, get_team_matches
+
+
+@pytest.fixture
+def df_matches():
+    """Two rounds of a three team season and the first match of the next season."""
+    data = {
+        'match_api_id': [1, 2, 3, 4, 5],
+        'season': ['2010/2011'] * 4 + ['2011/2012'],
+        'date': pd.to_datetime(['2010-08-01', '2010-08-08', '2010-08-15', '2010-08-15', '2011-08-01']),
+        'home_team': [10, 20, 30, 10, 10],
+        'away_team': [20, 30, 10, 20, 30],
+        'home_team_goal': [2, 1, 0, 3, 0],
+        'away_team_goal': [0, 1, 1, 3, 2],
+    }
+    df = pd.DataFrame(data)
+    df['result_match'] = np.select(
+        [df['home_team_goal'] > df['away_team_goal'], df['home_team_goal'] < df['away_team_goal']], ['H', 'A'], 'D'
+    )
+    return df
+
+
+def test_get_team_matches(df_matches):
+    team_matches = get_team_matches(df_matches)
+
+    assert len(team_matches) == 2 * len(df_matches)
+    first = team_matches[team_matches['match_api_id'] == 1].set_index('side')
+    assert first.loc['home', 'points'] == 3
+    assert first.loc['away', 'points'] == 0
+    assert first.loc['away', 'goal_difference'] == -2
+
+
+def test_get_standings_points_before_kickoff(df_matches):
+    standings = get_standings(df_matches)
+
+    assert standings['points_home'].tolist() == [0, 0, 1, 3, 0]
+    assert standings['points_away'].tolist() == [0, 0, 3, 1, 0]
+    assert standings['goal_difference_home'].tolist() == [0, -2, 0, 2, 0]
+    assert standings['games_played_home'].tolist() == [0, 1, 1, 1, 0]
+
+
+def test_get_standings_same_day_matches_see_previous_day(df_matches):
+    standings = get_standings(df_matches)
+
+    # Team 10 plays matches 3 and 4 on 2010-08-15, both after one win.
+    assert standings.loc[2, 'wins_away'] == 1
+    assert standings.loc[3, 'wins_home'] == 1
+    assert standings.loc[3, 'games_played_home'] == 1
+
+
+def test_get_standings_positions(df_matches):
+    standings = get_standings(df_matches)
+
+    assert standings['position_home'].tolist() == [1, 3, 2, 1, 1]
+    assert standings['position_away'].tolist() == [1, 2, 1, 3, 1]
+
+
+def test_get_standings_keeps_index(df_matches):
+    shuffled = df_matches.sample(frac=1, random_state=0)
+
+    standings = get_standings(shuffled)
+
+    pd.testing.assert_frame_equal(standings.sort_index(), get_standings(df_matches))